@@ -4,6 +4,11 @@ from fastapi import FastAPI
 from routers.async_2_vector_api_merged import router as async_vector_router
 from routers.dialog_routers import router as dialog_routers
 from routers.search_api import router as search_router
+from routers.vector_api import router as vector_router
+import asyncio
+
+from task.es_fun.local_index import start_local_index, stop_local_index
+from task.es_fun.search_engine import init_filter_fields
 app = FastAPI()
 
 # @app.on_event("startup")
@@ -15,9 +20,25 @@ app = FastAPI()
 #     await close_pg_pool()
 
 
+@app.on_event("startup")
+async def startup_local_index():
+    start_local_index()
+
+
+@app.on_event("startup")
+async def startup_filter_fields():
+    await asyncio.to_thread(init_filter_fields)
+
+
+@app.on_event("shutdown")
+async def shutdown_local_index():
+    await stop_local_index()
+
+
 app.include_router(async_vector_router)
 app.include_router(dialog_routers)
 app.include_router(search_router)
+app.include_router(vector_router)
 
 if __name__ == "__main__":
     import uvicorn
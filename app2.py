@@ -8,6 +8,7 @@ from routers.admin_sensitive import router as admin_sensitive_router
 from routers.dialog_routers_2 import router as dialog_router
 from routers.search_api import router as search_router
 from routers.async_2_vector_api_merged import router as async_vector_router
+from routers.vector_api import router as vector_router
 
 
 
@@ -30,6 +31,7 @@ if settings.sensitive.enable_input_block:
 app.include_router(async_vector_router)
 app.include_router(dialog_router)
 app.include_router(search_router)
+app.include_router(vector_router)
 app.include_router(admin_sensitive_router)
 
 
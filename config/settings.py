@@ -26,6 +26,33 @@ class VectorConfig(BaseModel):
     port: int
     redis_broker: str
     redis_backend: str
+    # 进程内微批：收集窗口（毫秒）与单批最大条数
+    batch_max_size: int = 32
+    batch_window_ms: float = 10.0
+    # 批量编码前按 token 长度分桶，减少 padding
+    length_bucketing: bool = True
+    # 推理后端：torch / onnx；onnx_path 为空时放在模型目录 onnx/ 下；num_threads 为空时用框架默认
+    backend: str = "torch"
+    onnx_path: Optional[str] = None
+    onnx_quantize: bool = False
+    num_threads: Optional[int] = None
+    # worker 进程启动时预加载模型（API 进程始终懒加载）
+    preload_model: bool = True
+    # 专用向量 worker（WORKER_MODE=embedding）：进程数 / 每进程线程数，为空时按核数自动切分
+    embed_worker_processes: Optional[int] = None
+    embed_worker_threads: Optional[int] = None
+    # 向量任务专用队列；为空时与其他任务共用默认队列
+    embedding_queue: Optional[str] = None
+    # 同步编码接口 /vector/encode、/vector/encode_batch
+    encode_api_max_batch: int = 64
+    encode_api_max_concurrency: int = 4
+    encode_api_timeout: float = 10.0
+    # 向量缓存：model_id 为空时取模型目录名；dtype 为 float32 / float16
+    model_id: Optional[str] = None
+    embed_cache_enable: bool = True
+    embed_cache_ttl: int = 7 * 86400
+    embed_cache_dtype: str = "float32"
+    embed_cache_local_size: int = 10000
 
 class SessionCacheConfig(BaseModel):
     redis_url: str
@@ -46,6 +73,15 @@ class SensitiveCfg(BaseModel):
     check_fields: List[str] = ["question", "filename", "new_content", "new_question", "title"]
 
 
+# 入库侧批量写入（task/es_fun/writer.BulkIndexer）的刷新阈值与失败重试
+class ESBulkConfig(BaseModel):
+    max_docs: int = 500                    # 缓冲条数达到即 flush
+    max_bytes: int = 10 * 1024 * 1024      # 缓冲字节数（JSON 估算）达到即 flush
+    flush_interval_sec: float = 5.0        # 距第一条缓冲超过该秒数，下一次 add 时 flush
+    max_retries: int = 3                   # 仅重试失败的条目（429 / 5xx / 连接异常）
+    retry_backoff_sec: float = 1.0         # 指数退避初始间隔
+
+
 # ✅ Elasticsearch 主配置
 class ESConfig(BaseModel):
     host: str
@@ -54,12 +90,35 @@ class ESConfig(BaseModel):
     username: str = "elastic"
     password: str = "wlw123456"
     indexes: ESIndexConfig
+    # wmx_ques 建索引时是否把向量写入 _source（False 时仅用于 knn，见 es_projection.ques_index_mapping）
+    vectors_in_source: bool = True
+    bulk: ESBulkConfig = ESBulkConfig()
+
+
+# Celery worker 内的 psycopg2 连接池（task/pg_fun/pg_pool.py）
+class PGPoolConfig(BaseModel):
+    min_size: int = 1
+    max_size: Optional[int] = None        # 为空时按 worker 并发自动确定：prefork 每子进程 prefork_size，threads / gevent 为 concurrency
+    prefork_size: int = 2
+    acquire_timeout: float = 30.0         # 连接全部借出时的最长等待秒数
+    health_check_idle_sec: float = 30.0   # 空闲超过该秒数的连接借出前先 SELECT 1
+    connect_timeout: int = 10
 
 
 class TaskDefaults(BaseModel):
     store_flags: List[str] = ["pg", "es"]
     pg_enable: bool = True
     es_enable: bool = True
+    # 段落下游处理方式：chain（每段落 生成问题 → 编码入库 两个任务）/ batch（一批段落一个生成任务 + 一个编码入库任务，见 ingest.chunk_batch）
+    ingest_mode: str = "chain"
+    ingest_batch_size: int = 16        # batch 模式下每个任务的段落数
+    ingest_concurrency: int = 4        # batch 模式下任务内并发调用大模型的线程数
+    ingest_chunk_retries: int = 3      # 生成问题失败的段落单独重投的次数
+    ingest_retry_backoff: int = 10     # 重投延迟秒数（按次数线性增加）
+    # 流式解析：loader 逐页产出 → 增量分段 → 每 stream_batch_chunks 个段落写入一次并派发下游，内存有界、段落边解析边可检索
+    ingest_streaming: bool = False
+    stream_batch_chunks: int = 200
+    ocr_pages_per_request: int = 10    # 流式模式下 PDF 按页分段送 OCR，每次请求的页数
 
 
 class Deepseek(BaseModel):
@@ -70,6 +129,51 @@ class QwenConfig(BaseModel):
     api_key: str
     model: str = "qwen-plus"
 
+class SearchConfig(BaseModel):
+    # /es_hybrid_search 结果缓存（按索引代际失效，见 utils/search_cache.py）
+    result_cache_enable: bool = True
+    result_cache_ttl: int = 300  # 秒；worker 入库不强制 refresh，TTL 兜底新内容的可见延迟
+    # 召回深度：每次检索至少取 prefetch_depth 条融合结果并缓存，翻页直接切片；offset + top_k 不得超过 max_depth
+    prefetch_depth: int = 50
+    max_depth: int = 200
+    max_num_candidates: int = 10000  # ES knn num_candidates 上限
+    gen_bump_interval_sec: float = 5.0  # 入库写入后延迟递增索引代际的合并窗口（秒）
+    gen_bump_min_delay_sec: float = 2.0  # 写入到递增的最短间隔，须大于 ES 索引的 refresh_interval（默认 1s）
+
+
+class RerankConfig(BaseModel):
+    # 交叉编码器重排（CPU，见 task/es_fun/rerank.py）；model_id 为空时取模型目录名
+    model_path: str = "./bge-reranker-base"
+    model_id: Optional[str] = None
+    max_candidates: int = 30      # 每次查询最多打分条数
+    batch_size: int = 16
+    max_length: int = 512
+    num_threads: Optional[int] = None
+    max_concurrency: int = 2      # 同时推理的请求数
+    score_cache_ttl: int = 86400  # (查询, 段落) 打分缓存秒数，0 为不用 Redis 缓存
+    score_cache_local_size: int = 20000
+    # 对话检索（dialog_routers_2.es_hybrid_search）是否启用重排，以及送入 LLM 的段落数
+    dialog_enable: bool = False
+    dialog_top_k: int = 5
+
+
+class LocalIndexConfig(BaseModel):
+    # API 进程内的 wmx_ques 向量副本（见 task/es_fun/local_index.py）
+    enable: bool = False
+    backend: str = "numpy"           # numpy（暴力内积）/ hnsw（需安装 hnswlib）
+    dim: int = 1024
+    stream_key: str = "qvec:changes"  # 问题向量变更流
+    stream_maxlen: int = 200000      # 变更流近似保留条数
+    batch_size: int = 1000           # 单次 XREAD 条数
+    max_staleness_sec: float = 30.0  # 超过则 search_vector 回退 ES knn
+    snapshot_dir: Optional[str] = "./data/local_index"
+    snapshot_interval: int = 300     # 有变更时的快照间隔（秒）
+    hnsw_m: int = 16
+    hnsw_ef_construction: int = 200
+    hnsw_ef_search: int = 128
+    hnsw_capacity: int = 100000      # 初始容量，不足时自动翻倍
+
+
 class OCRServiceConfig(BaseModel):
     # 代码层兜底，若 yaml / 环境变量都没给，则用本地
     base_url: str = "http://127.0.0.1:8000"
@@ -87,6 +191,10 @@ class Settings(BaseModel):
     qwen: QwenConfig
     sensitive: SensitiveCfg = SensitiveCfg()
     ocr_service: OCRServiceConfig = OCRServiceConfig()
+    search: SearchConfig = SearchConfig()
+    rerank: RerankConfig = RerankConfig()
+    local_index: LocalIndexConfig = LocalIndexConfig()
+    pg_pool: PGPoolConfig = PGPoolConfig()
 # ✅ 配置加载函数
 def load_config() -> Settings:
     env = os.getenv("ENV", "dev")  # 默认环境为 dev
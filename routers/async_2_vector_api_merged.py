@@ -1,13 +1,18 @@
 import asyncio
 import os
 from typing import List
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 # from db_service.session import get_async_db
 # from db_service.db_search_service import async_query_similar_sentences, async_hybrid_search
 from elasticsearch import AsyncElasticsearch
 from elasticsearch.helpers import async_bulk
-from task.es_fun.search_engine import search_bm25, search_vector, merge_results
+from task.es_fun.search_engine import (
+    search_bm25, search_vector, search_hybrid, search_hybrid_batch, merge_results, build_filter_clauses,
+)
+from task.es_fun.rerank import rerank_results
+from task.es_fun.qvec_changes import apublish_deletes
+from task.es_fun.local_index import replica as local_replica
 from utils.logger_manager import get_logger
 from redis import Redis
 import json
@@ -29,7 +34,8 @@ from task.es_fun.es_updata import (
     encode_questions_to_vectors,
     bulk_insert_questions,
     encode_single_question,
-    update_question_in_es
+    update_question_in_es,
+    get_chunk_filter_meta,
 )
 
 from routers.schema import (
@@ -41,6 +47,7 @@ from routers.schema import (
     FileBatchRequest,
     WriteQuesBatch,
     SearchRequest,
+    BatchSearchRequest,
     SearchResult,
     ChunkUpdateRequest,
     QuestionUpdateRequest
@@ -49,6 +56,27 @@ import aiohttp
 import tempfile
 from task.file_parse_pipeline_new import parse_file_and_enqueue_chunks
 from utils.task_utils import submit_vector_task_with_option
+from utils.vector_result import wait_vector_result
+from utils.search_cache import (
+    abump_index_generation,
+    get_index_generation,
+    query_fingerprint,
+    result_cache_key,
+    get_cached_results,
+    set_cached_results,
+    covers,
+    encode_cursor,
+    decode_cursor,
+)
+from utils.metrics import (
+    IN_FLIGHT,
+    REQUEST_SECONDS,
+    stage,
+    record_cache,
+    start_timings,
+    format_timings,
+    render_metrics,
+)
 from task.es_fun.es_delete import delete_doc, delete_by_term, delete_by_terms
 from celery import chain
 from db_service.pg_pool import pg_conn
@@ -101,6 +129,19 @@ def submit_vector_task(item: VectorItem):
         return {"msg": "处理失败", "data": {"error": str(e)}}
 
 
+# ✅ 等待向量结果：worker 写入即返回（BLPOP 推送），无需客户端轮询
+@router.get("/search/gen_vector/{task_id}", response_model=ResponseModel)
+async def wait_vector_task(task_id: str, wait: float = Query(5.0, ge=0, le=30, description="最长等待秒数，0 为只查询不等待")):
+    try:
+        vec = await wait_vector_result(task_id, timeout=wait)
+        if vec is None:
+            return {"msg": "任务未完成", "data": {"task_id": task_id, "status": "PENDING"}}
+        return {"msg": "查询成功", "data": {"task_id": task_id, "status": "SUCCESS", "vector": vec}}
+    except Exception as e:
+        logger.exception("获取向量结果失败")
+        return {"msg": "处理失败", "data": {"error": str(e)}}
+
+
 
 
 
@@ -264,38 +305,172 @@ async def upload_and_dispatch_files(data: FileBatchRequest):
 #     return {"status": "ok", "inserted": len(data)}
 
 
+def _want_timings(flag: bool, http_request: Request) -> bool:
+    # 请求体 stage_timings=true 或请求头 X-Stage-Timings: 1 均可开启
+    return flag or http_request.headers.get("X-Stage-Timings", "").lower() in ("1", "true")
+
+
 @router.post("/es_hybrid_search", response_model=List[SearchResult])
-async def hybrid_search_api(request: SearchRequest):
+async def hybrid_search_api(request: SearchRequest, response: Response, http_request: Request):
     # ✅ 校验：至少要启用一种检索方式
     if not (request.use_bm25 or request.use_vector):
         raise HTTPException(status_code=400, detail="必须启用至少一种检索方式（use_bm25 或 use_vector）")
 
+    timings = start_timings()
+    with IN_FLIGHT.labels("hybrid").track_inprogress(), REQUEST_SECONDS.labels("hybrid").time():
+        results = await _hybrid_search_page(request, response)
+    if _want_timings(request.stage_timings, http_request):
+        response.headers["X-Stage-Timings"] = format_timings(timings)
+    return results
+
+
+async def _hybrid_search_page(request: SearchRequest, response: Response) -> List[SearchResult]:
+
+    search_cfg = settings.search
+    fingerprint = query_fingerprint(
+        request.query,
+        use_bm25=request.use_bm25,
+        use_vector=request.use_vector,
+        alpha=request.alpha,
+        candidate_multiplier=request.candidate_multiplier,
+        fusion=request.fusion,
+        rrf_k=request.rrf_k,
+        rerank=request.rerank,
+        filters=request.filters.model_dump(mode="json", exclude_none=True) if request.filters else None,
+    )
+
+    # ✅ 分页：cursor 优先于 offset
+    if request.cursor:
+        try:
+            offset = decode_cursor(request.cursor, fingerprint)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    else:
+        offset = request.offset
+    end = offset + request.top_k
+    if end > search_cfg.max_depth:
+        raise HTTPException(status_code=400, detail=f"offset + top_k 不能超过 {search_cfg.max_depth}")
+    # 召回深度：至少 prefetch_depth，后续翻页直接从缓存切片，不再重跑检索
+    depth = min(max(end, search_cfg.prefetch_depth), search_cfg.max_depth)
+
+    # ✅ 结果缓存：key 含索引代际，任何写入后旧 key 不再命中
+    cache_key, merged = None, None
+    if search_cfg.result_cache_enable:
+        try:
+            cache_key = result_cache_key(await get_index_generation(), fingerprint)
+            cached = await get_cached_results(cache_key)
+            if covers(cached, end):
+                merged, depth = cached["results"], cached["depth"]
+            record_cache("result", hits=int(merged is not None), misses=int(merged is None))
+        except Exception as e:
+            logger.warning(f"检索结果缓存读取失败，直接检索: {e}")
+            cache_key = None
+
+    if merged is None:
+        merged = await _hybrid_search(request, depth)
+        # ✅ 可选重排：结果随融合列表一起缓存，翻页 / 重复查询不再重复推理
+        if request.rerank:
+            merged, rerank_ms = await rerank_results(request.query, merged)
+            response.headers["X-Rerank-Ms"] = f"{rerank_ms:.1f}"
+        if cache_key is not None:
+            try:
+                await set_cached_results(cache_key, merged, depth)
+            except Exception as e:
+                logger.warning(f"检索结果缓存写入失败: {e}")
+
+    # 还有下一页：已融合的列表里还有剩余，或列表被深度截断且未到上限
+    if end < len(merged) or (len(merged) >= depth and end < search_cfg.max_depth):
+        response.headers["X-Next-Cursor"] = encode_cursor(fingerprint, end)
+    with stage("serialization"):
+        return [SearchResult(**item) for item in merged[offset:end]]  # ✅ 保证结构
+
+
+def _filter_clauses(filters) -> list:
+    return build_filter_clauses(**filters.model_dump()) if filters else []
+
+
+async def _hybrid_search(request: SearchRequest, depth: int) -> List[dict]:
+    filters = _filter_clauses(request.filters)
+    if request.retrieval_mode == "msearch":
+        return await search_hybrid(
+            request.query,
+            use_bm25=request.use_bm25,
+            use_vector=request.use_vector,
+            alpha=request.alpha,
+            top_k=depth,
+            candidate_multiplier=request.candidate_multiplier,
+            fusion=request.fusion,
+            rrf_k=request.rrf_k,
+            filters=filters,
+        )
+
     tasks = []
     if request.use_bm25:
-        tasks.append(search_bm25(request.query))
+        tasks.append(search_bm25(request.query, top_k=depth, filters=filters))
     else:
         tasks.append(asyncio.sleep(0, result=[]))
 
     if request.use_vector:
-        tasks.append(search_vector(request.query))
+        tasks.append(search_vector(
+            request.query, top_k=depth, candidate_multiplier=request.candidate_multiplier, filters=filters,
+        ))
     else:
         tasks.append(asyncio.sleep(0, result=[]))
 
     bm25_results, vector_results = await asyncio.gather(*tasks)
-    print("🎯 vector 原始得分:")
-    for r in vector_results:
-        print(f"{r['id']} -> {r['score']}")
-    merged = merge_results(bm25_results, vector_results, alpha=request.alpha)
-    # return merged
-    return [SearchResult(**item) for item in merged]  # ✅ 保证结构
+    return merge_results(
+        bm25_results, vector_results,
+        alpha=request.alpha, top_k=depth, strategy=request.fusion, rrf_k=request.rrf_k,
+    )
+
+
+
+# ✅ 批量混合检索：一次批量编码 + 一次 msearch + 一次 mget，返回与 queries 等长的结果列表
+@router.post("/es_hybrid_search/batch", response_model=List[List[SearchResult]])
+async def hybrid_search_batch_api(request: BatchSearchRequest, response: Response, http_request: Request):
+    if not (request.use_bm25 or request.use_vector):
+        raise HTTPException(status_code=400, detail="必须启用至少一种检索方式（use_bm25 或 use_vector）")
+
+    timings = start_timings()
+    with IN_FLIGHT.labels("hybrid_batch").track_inprogress(), REQUEST_SECONDS.labels("hybrid_batch").time():
+        results = await search_hybrid_batch(
+            request.queries,
+            use_bm25=request.use_bm25,
+            use_vector=request.use_vector,
+            alpha=request.alpha,
+            top_k=request.top_k,
+            candidate_multiplier=request.candidate_multiplier,
+            fusion=request.fusion,
+            rrf_k=request.rrf_k,
+            filters=_filter_clauses(request.filters),
+        )
+        with stage("serialization"):
+            out = [[SearchResult(**item) for item in merged] for merged in results]
+    if _want_timings(request.stage_timings, http_request):
+        response.headers["X-Stage-Timings"] = format_timings(timings)
+    return out
+
+
+# ✅ Prometheus 指标（多进程部署时设置 PROMETHEUS_MULTIPROC_DIR，见 utils/metrics.py）
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
 
 
+# ✅ 本地向量副本状态（规模 / 同步位置 / 落后秒数）
+@router.get("/search/local_index/status")
+async def local_index_status():
+    return local_replica.status()
+
 
 # ========== 删除问题 ==========
 @router.delete("/delete/question")
 async def delete_questions(question_ids: List[str]):
     for qid in question_ids:
         await delete_doc(QUES_INDEX, qid)
+    await apublish_deletes(ids=question_ids)
+    await abump_index_generation("delete/question")
     return {"deleted_questions": question_ids}
 
 
@@ -321,9 +496,11 @@ async def delete_chunks(chunk_ids: List[str]):
     # 删除问题（问题表中 ori_sent_id = chunk uu_id）
     if chunk_uuids:
         await delete_by_terms(QUES_INDEX, "ori_sent_id", chunk_uuids)
+        await apublish_deletes(chunk_ids=chunk_uuids)
 
     # 删除 chunk 本身（按 _id）
     await delete_by_terms(CHUNK_INDEX, "_id", chunk_ids)
+    await abump_index_generation("delete/chunk")
 
     return {
         "deleted_chunks": chunk_ids,
@@ -344,6 +521,7 @@ async def delete_files(zhisk_file_ids: List[str]):
         # 删除问题
         if chunk_uuids:
             await delete_by_terms(QUES_INDEX, "ori_sent_id", chunk_uuids)
+            await apublish_deletes(chunk_ids=chunk_uuids)
 
         # 删除 chunk
         await delete_by_term(CHUNK_INDEX, "zhisk_file_id", file_id)
@@ -351,6 +529,7 @@ async def delete_files(zhisk_file_ids: List[str]):
         # 删除文件元信息
         await delete_doc(FILE_INDEX, file_id)
 
+    await abump_index_generation("delete/file")
     return {"deleted_files": zhisk_file_ids}
 
 
@@ -372,12 +551,17 @@ async def update_chunk_and_questions(data: ChunkUpdateRequest):
         # 4. 向量化
         vectors = await encode_questions_to_vectors(questions)
 
-        # 5. 批量写入
-        await bulk_insert_questions(data.chunk_id, questions, vectors)
+        # 5. 批量写入（冗余段落的过滤字段）
+        meta = await get_chunk_filter_meta(data.chunk_id)
+        await bulk_insert_questions(data.chunk_id, questions, vectors, meta=meta)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    finally:
+        # 6. 递增索引代际（中途失败也要递增，已生效的部分写入同样会让旧缓存失效）
+        await abump_index_generation("update/chunk")
+
     return {"msg": "chunk 和问题更新成功"}
 
 
@@ -393,4 +577,7 @@ async def update_question_and_vector(data: QuestionUpdateRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    finally:
+        await abump_index_generation("update/question")
+
     return {"msg": "问题与向量更新成功"}
\ No newline at end of file
@@ -4,6 +4,7 @@ from fastapi.responses import StreamingResponse
 from typing import List, Dict, Any
 import json
 
+from config.settings import settings
 from routers.schema import (
     StartDialogRequest,
     AskRequest,
@@ -158,10 +159,14 @@ async def control_dialog(talk_id: int, req: ControlRequest):
 
 
 async def es_hybrid_search(question: str) -> List[str]:
+    payload: Dict[str, Any] = {"query": question}
+    if settings.rerank.dialog_enable:
+        # 重排后只取少量高相关段落，减少 prompt token
+        payload.update(rerank=True, top_k=settings.rerank.dialog_top_k)
     async with httpx.AsyncClient(timeout=10) as client:
         response = await client.post(
             "http://localhost:8000/es_hybrid_search",
-            json={"query": question}
+            json=payload
         )
         response.raise_for_status()
         return [r["content"] for r in response.json()]
\ No newline at end of file
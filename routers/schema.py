@@ -1,4 +1,5 @@
-from typing import Optional, List, Dict, Any
+from datetime import datetime
+from typing import Optional, List, Dict, Any, Literal, Annotated
 from pydantic import BaseModel,HttpUrl, Field
 from uuid import UUID
 
@@ -8,6 +9,17 @@ class VectorItem(BaseModel):
     text: str
 
 
+class EncodeRequest(BaseModel):
+    text: str = Field(..., min_length=1)
+    # 输出格式：float32（JSON 数组）/ float32_b64 / float16_b64（小端字节 base64，体积更小）
+    output: Literal["float32", "float32_b64", "float16_b64"] = "float32"
+
+
+class EncodeBatchRequest(BaseModel):
+    texts: List[Annotated[str, Field(min_length=1)]] = Field(..., min_length=1)
+    output: Literal["float32", "float32_b64", "float16_b64"] = "float32"
+
+
 class ResponseModel(BaseModel):
     msg: str
     data: Optional[dict] = None
@@ -65,11 +77,49 @@ class WriteQuesBatch(BaseModel):
 
 
 
+class SearchFilters(BaseModel):
+    # 过滤条件直接进入 BM25 bool.filter 与 knn.filter（先过滤后取 top-k），各字段之间为 AND
+    file_ids: Optional[List[str]] = Field(default=None, description="限定文件（zhisk_file_id）")
+    create_by: Optional[List[str]] = Field(default=None, description="限定创建人")
+    file_types: Optional[List[str]] = Field(default=None, description="限定文件类型，如 pdf / docx")
+    created_from: Optional[datetime] = None
+    created_to: Optional[datetime] = None
+
+
 class SearchRequest(BaseModel):
     query: str
     use_bm25: bool = True
     use_vector: bool = True
     alpha: float = 0.6  # 权重
+    # 检索方式：msearch（BM25 + knn 单次往返）/ split（分别请求，旧逻辑）
+    retrieval_mode: Literal["msearch", "split"] = "msearch"
+    # 召回深度 / 分页
+    top_k: int = Field(default=10, ge=1, le=100, description="每页返回条数")
+    candidate_multiplier: int = Field(default=10, ge=1, le=50, description="knn num_candidates = k × 该倍数")
+    offset: int = Field(default=0, ge=0, le=1000, description="起始位置；与 cursor 二选一")
+    cursor: Optional[str] = Field(default=None, description="上一页响应头 X-Next-Cursor 的值")
+    # 融合策略：legacy（BM25 min-max + 向量原始分）/ minmax / zscore / rrf，见 task/es_fun/fusion.py
+    fusion: Literal["legacy", "minmax", "zscore", "rrf"] = "legacy"
+    rrf_k: int = Field(default=60, ge=1, le=1000)
+    # 交叉编码器重排（对融合后的前 rerank.max_candidates 条重新打分），耗时见响应头 X-Rerank-Ms
+    rerank: bool = False
+    filters: Optional[SearchFilters] = None
+    # 在响应头 X-Stage-Timings 返回本次请求的分阶段耗时（毫秒），也可用请求头 X-Stage-Timings: 1 开启
+    stage_timings: bool = False
+
+
+class BatchSearchRequest(BaseModel):
+    queries: List[str] = Field(..., min_length=1, max_length=64, description="查询列表，单次最多 64 条")
+    use_bm25: bool = True
+    use_vector: bool = True
+    alpha: float = 0.6
+    top_k: int = Field(default=10, ge=1, le=100)
+    candidate_multiplier: int = Field(default=10, ge=1, le=50)
+    fusion: Literal["legacy", "minmax", "zscore", "rrf"] = "legacy"
+    rrf_k: int = Field(default=60, ge=1, le=1000)
+    # 对整批查询生效
+    filters: Optional[SearchFilters] = None
+    stage_timings: bool = False
 
 
 class ScoreDetail(BaseModel):
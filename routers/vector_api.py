@@ -0,0 +1,92 @@
+# routers/vector_api.py
+"""
+同步低延迟向量接口（响应中直接返回向量，无需 task_id 轮询）：
+- POST /vector/encode        单条
+- POST /vector/encode_batch  多条（上限 vector_service.encode_api_max_batch）
+
+由进程内共享的微批编码器提供服务（并发请求自动合批，模型首次调用时懒加载），
+信号量限制同时在推理的编码任务数（超时放弃等待的任务在后台结束前仍占名额），排队或推理超时返回 503。
+可选 float16 / base64 输出以减小响应体积。
+"""
+import asyncio
+import base64
+from typing import List
+
+import numpy as np
+from fastapi import APIRouter, HTTPException
+
+from config.settings import settings
+from routers.schema import EncodeRequest, EncodeBatchRequest
+from task.gen_vector_chain import aencode_texts
+from utils.logger_manager import get_logger
+
+router = APIRouter()
+logger = get_logger("router_vector_api")
+
+vector_cfg = settings.vector_service
+_semaphore = asyncio.Semaphore(vector_cfg.encode_api_max_concurrency)
+
+
+def _pack(vectors: List[list], output: str):
+    if output == "float32":
+        return {"vectors": vectors}
+    dtype = "<f2" if output == "float16_b64" else "<f4"
+    return {
+        "vectors_b64": [base64.b64encode(np.asarray(v, dtype=dtype).tobytes()).decode("ascii") for v in vectors],
+        "dtype": "float16" if output == "float16_b64" else "float32",
+    }
+
+
+def _release(task: asyncio.Future):
+    """编码任务结束（含请求已超时放弃等待的情况）才归还名额，并取走异常避免未检索告警"""
+    _semaphore.release()
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"后台向量编码失败: {task.exception()}")
+
+
+async def _encode(texts: List[str]) -> List[list]:
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + vector_cfg.encode_api_timeout
+    try:
+        # 排队等名额也计入超时：名额被超时后仍在推理的任务占满时直接 503，不无限排队
+        await asyncio.wait_for(_semaphore.acquire(), timeout=vector_cfg.encode_api_timeout)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="向量编码繁忙，请稍后重试")
+
+    try:
+        task = asyncio.ensure_future(aencode_texts(texts))
+    except BaseException:
+        _semaphore.release()
+        raise
+    # 名额随编码任务本身释放，而不是随请求释放：超时的请求不再占用名额，后台推理仍然计数
+    task.add_done_callback(_release)
+
+    try:
+        # 超时只放弃等待：编码在后台照常完成并写入缓存（首个请求常因模型懒加载超时，重试即可命中）
+        return await asyncio.wait_for(asyncio.shield(task), timeout=max(deadline - loop.time(), 0))
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="向量编码超时，请稍后重试")
+
+
+@router.post("/vector/encode")
+async def encode_one(item: EncodeRequest):
+    vectors = await _encode([item.text])
+    body = _pack(vectors, item.output)
+    # 单条接口：保持 {"vector": [...]} 结构，兼容 db_search_service.get_text_vector
+    if "vectors" in body:
+        return {"vector": body["vectors"][0], "dim": len(vectors[0])}
+    return {"vector_b64": body["vectors_b64"][0], "dtype": body["dtype"], "dim": len(vectors[0])}
+
+
+@router.post("/vector/encode_batch")
+async def encode_batch(item: EncodeBatchRequest):
+    if len(item.texts) > vector_cfg.encode_api_max_batch:
+        raise HTTPException(
+            status_code=400,
+            detail=f"单次最多 {vector_cfg.encode_api_max_batch} 条文本",
+        )
+    vectors = await _encode(item.texts)
+    body = _pack(vectors, item.output)
+    body["dim"] = len(vectors[0]) if vectors else 0
+    body["count"] = len(vectors)
+    return body
@@ -1,8 +1,11 @@
 # sensitive/bootstrap.py（只保留构建与注入）
+import asyncio
 from contextlib import asynccontextmanager
 from elasticsearch import AsyncElasticsearch
 from .sensitive_filter_ac import SensitiveFilterAC
 from config.settings import settings
+from task.es_fun.local_index import start_local_index, stop_local_index
+from task.es_fun.search_engine import init_filter_fields
 
 @asynccontextmanager
 async def lifespan(app):
@@ -28,7 +31,14 @@ async def lifespan(app):
     app.state.ignore_case = settings.sensitive.ignore_case
     app.state.sensitive_check_fields = settings.sensitive.check_fields
 
+    # 本地向量副本（local_index.enable=false 时不做任何事）
+    start_local_index()
+
+    # 过滤字段映射（与 app.py 的 startup 一致）
+    await asyncio.to_thread(init_filter_fields)
+
     try:
         yield
     finally:
+        await stop_local_index()
         await es.close()
\ No newline at end of file
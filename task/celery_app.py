@@ -38,16 +38,36 @@
 
 
 from celery import Celery
+import os
+from celery.signals import (
+    celeryd_after_setup,
+    worker_init,
+    worker_process_init,
+    worker_process_shutdown,
+    worker_shutdown,
+)
 from config.settings import load_config
+from task.embedding_worker import is_embedding_worker, init_parent, init_child, pool_plan
 import multiprocessing
 
 # ✅ macOS 下防止 CoreFoundation fork 报错
-multiprocessing.set_start_method("spawn", force=True)
+# 专用向量 worker 需要 fork 继承父进程已加载的权重，不能强制 spawn
+if not is_embedding_worker():
+    multiprocessing.set_start_method("spawn", force=True)
 
 # ✅ 加载配置
 config = load_config()
 vector_config = config.vector_service
 
+# 向量推理相关任务（可路由到专用队列）
+# ingest.chunk_batch 的耗时主要在调用大模型，留在默认队列，编码入库部分另派 encode_and_store.batch
+EMBEDDING_TASKS = [
+    "encode_text_task",
+    "encode_texts_task",
+    "encode_and_store",
+    "encode_and_store.batch",
+]
+
 # ✅ 创建 Celery 实例
 celery_app = Celery(
     "my_tasks",
@@ -70,6 +90,97 @@ celery_app.conf.update(
     enable_utc=False
 )
 
+# ✅ 配置了 embedding_queue 时，向量任务只投递到该队列（需有 worker 用 -Q 消费它）
+if vector_config.embedding_queue:
+    celery_app.conf.task_routes = {
+        name: {"queue": vector_config.embedding_queue} for name in EMBEDDING_TASKS
+    }
+
+# ✅ 专用向量 worker：进程数按核数切分（命令行 --concurrency 优先）
+if is_embedding_worker():
+    celery_app.conf.worker_concurrency = pool_plan(vector_config)[0]
+
+    @worker_init.connect
+    def load_shared_embedding_weights(**kwargs):
+        # 父进程在 fork 子进程之前加载权重，子进程写时复制共享
+        init_parent(vector_config)
+
+# ✅ 模型懒加载：只在 worker 子进程里预热，API 进程 import 任务签名时不会加载模型
+@worker_process_init.connect
+def preload_embedding_model(**kwargs):
+    if is_embedding_worker():
+        init_child(vector_config)
+    if vector_config.preload_model or is_embedding_worker():
+        from task.gen_vector_chain import warmup
+        warmup()
+
+
+# ✅ PG 连接池（task/pg_fun/pg_pool.py）：只在启用 PG 写入时预建，否则首次使用时懒加载
+def _pg_enabled() -> bool:
+    flags = config.task_defaults
+    return "pg" in flags.store_flags and flags.pg_enable
+
+
+@celeryd_after_setup.connect
+def init_pg_pool_in_process(sender, instance, **kwargs):
+    # threads / gevent / solo 等单进程池：任务都在 worker 主进程里跑，按 concurrency 建池
+    from task.pg_fun.pg_pool import pool_size_for, init_pool, IN_PROCESS_POOLS
+    pool_name = str(getattr(instance.pool_cls, "__module__", instance.pool_cls))
+    if _pg_enabled() and any(name in pool_name for name in IN_PROCESS_POOLS):
+        init_pool(pool_size_for(pool_name, instance.concurrency))
+
+
+@worker_process_init.connect
+def init_pg_pool_in_child(**kwargs):
+    # prefork 子进程：连接不能跨 fork 共享，每个子进程自建
+    if _pg_enabled():
+        from task.pg_fun.pg_pool import init_pool
+        init_pool()
+
+
+@worker_process_shutdown.connect
+def close_pg_pool_in_child(**kwargs):
+    from task.pg_fun.pg_pool import close_pool
+    from utils.metrics import mark_process_dead
+    close_pool()
+    mark_process_dead(os.getpid())
+
+
+@worker_shutdown.connect
+def close_pg_pool_in_process(**kwargs):
+    from task.pg_fun.pg_pool import close_pool
+    close_pool()
+
+
+# ✅ 写入前确保检索过滤字段的 mapping（否则首批文档会把 zhisk_file_id 等动态映射成 text）
+@worker_init.connect
+def ensure_es_filter_mappings(**kwargs):
+    flags = config.task_defaults
+    if not ("es" in flags.store_flags and flags.es_enable):
+        return
+    from utils.es_client import get_es_client
+    from utils.logger_manager import get_logger
+    from task.es_fun.es_projection import ensure_filter_field_mappings
+
+    client = get_es_client()
+    try:
+        es_cfg = config.elasticsearch
+        ensure_filter_field_mappings(client, [es_cfg.indexes.chunk_index, es_cfg.indexes.ques_index])
+    except Exception as e:
+        get_logger("celery_app").warning(f"ES 过滤字段 mapping 初始化失败: {e}")
+    finally:
+        client.close()
+
+
+# ✅ worker 指标导出（PG 连接池等）：设置 WORKER_METRICS_PORT 时在 worker 主进程起导出端口
+@worker_init.connect
+def start_worker_metrics(**kwargs):
+    port = os.getenv("WORKER_METRICS_PORT")
+    if port:
+        from utils.metrics import start_metrics_server
+        start_metrics_server(int(port))
+
+
 # # ✅ 推荐初始化 pg_fun 的方式：异步线程防止事件循环冲突
 # from db_service.pg_pool import init_pg_pool
 #
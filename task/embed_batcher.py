@@ -0,0 +1,175 @@
+# task/embed_batcher.py
+# -*- coding: utf-8 -*-
+"""
+进程内微批向量编码器
+
+同一进程里并发到达的 encode 请求（线程池 / gevent worker 下的多个 encode_text_task，
+或 API 进程内的多个协程）先进入队列，由后台线程在一个很短的时间窗口内（window_ms）
+或凑满 max_batch_size 条后合并，一次性交给模型做批量推理，再把结果按提交顺序拆回给
+各自的调用方。
+
+注意：prefork 模式下每个子进程同一时间只执行一个任务，合批只发生在单进程内部；
+想让合批真正生效，worker 需使用 --pool threads / gevent 并配合一定的并发数。
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Sequence
+
+from utils.logger_manager import get_logger
+
+logger = get_logger("embed_batcher")
+
+_STOP = object()
+
+
+class _Request:
+    __slots__ = ("texts", "future", "enqueued_at")
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.future: Future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class MicroBatchEncoder:
+    """
+    微批编码器：把多个小请求合并为一次 encode_fn(texts) 调用
+
+    :param encode_fn: 批量编码函数，入参为文本列表，返回与之等长的向量序列（ndarray 或 list）
+    :param max_batch_size: 单批最多合并的文本条数
+    :param window_ms: 首个请求到达后最多等待多久（毫秒）来凑批；0 表示不等待，队列里有多少合多少
+    """
+
+    def __init__(
+        self,
+        encode_fn: Callable[[List[str]], Sequence],
+        max_batch_size: int = 32,
+        window_ms: float = 10.0,
+        name: str = "embed-batcher",
+    ):
+        self._encode_fn = encode_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.window = max(0.0, float(window_ms)) / 1000.0
+        self._queue: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._name = name
+
+        # 统计信息
+        self.batches = 0
+        self.items = 0
+
+    # ===================== 对外接口 =====================
+
+    def submit(self, texts: List[str]) -> Future:
+        """提交一组文本，返回 Future，结果为与 texts 等长的向量列表"""
+        self._ensure_started()
+        req = _Request(list(texts))
+        if not req.texts:
+            req.future.set_result([])
+            return req.future
+        self._queue.put(req)
+        return req.future
+
+    def encode(self, text: str, timeout: Optional[float] = None) -> list:
+        """编码单条文本（阻塞直到所在批次完成）"""
+        return self.submit([text]).result(timeout=timeout)[0]
+
+    def encode_many(self, texts: List[str], timeout: Optional[float] = None) -> List[list]:
+        """编码多条文本，作为一个整体参与合批"""
+        return self.submit(texts).result(timeout=timeout)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "window_ms": self.window * 1000,
+        }
+
+    def close(self):
+        if self._thread and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout=5)
+        self._thread = None
+
+    # ===================== 内部实现 =====================
+
+    def _ensure_started(self):
+        # fork 之后子进程里的线程不存在，需要按需重新拉起
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self._name, daemon=True)
+                self._thread.start()
+
+    def _collect(self, first: _Request) -> List[_Request]:
+        """以 first 为起点，在时间窗口内继续收集请求，直到凑满或超时"""
+        batch = [first]
+        size = len(first.texts)
+        deadline = first.enqueued_at + self.window
+
+        while size < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining > 0:
+                    req = self._queue.get(timeout=remaining)
+                else:
+                    req = self._queue.get_nowait()
+            except queue.Empty:
+                break
+
+            if req is _STOP:
+                # 当前批次处理完再退出
+                self._queue.put(_STOP)
+                break
+            batch.append(req)
+            size += len(req.texts)
+
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            try:
+                self._process(self._collect(first))
+            except Exception as e:
+                # 兜底：任何异常都不能让后台线程退出，否则之后的请求永远等不到结果
+                logger.exception(f"微批处理异常: {e}")
+
+    def _process(self, batch: List[_Request]):
+        # 先认领 Future：调用方已取消（如 asyncio.wait_for 超时）的请求直接丢弃，不参与推理
+        batch = [req for req in batch if req.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        texts = [t for req in batch for t in req.texts]
+
+        try:
+            vectors = self._encode_fn(texts)
+        except Exception as e:
+            logger.exception(f"批量编码失败（{len(texts)} 条）: {e}")
+            for req in batch:
+                if not req.future.done():
+                    req.future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.items += len(texts)
+        logger.debug(f"微批编码完成：请求数={len(batch)}，文本数={len(texts)}")
+
+        offset = 0
+        for req in batch:
+            n = len(req.texts)
+            rows = vectors[offset:offset + n]
+            offset += n
+            try:
+                req.future.set_result([r.tolist() if hasattr(r, "tolist") else list(r) for r in rows])
+            except Exception as e:
+                logger.warning(f"微批结果回填失败（已忽略）: {e}")
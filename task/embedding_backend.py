@@ -0,0 +1,274 @@
+# task/embedding_backend.py
+# -*- coding: utf-8 -*-
+"""
+向量推理后端（通过 VectorConfig.backend 选择）：
+- torch：原有 SentenceTransformer（PyTorch fp32）路径
+- onnx ：导出的 ONNX 模型 + onnxruntime CPU 推理，可选动态 int8 量化
+
+两种后端统一接口：encode(texts, batch_size) -> 归一化后的 float32 ndarray，
+以及 tokenizer 属性（供按长度分桶等使用）。
+
+ONNX 模型不存在时会在首次加载时自动导出（需要 torch + transformers，只在导出时用到）。
+"""
+import json
+import os
+import threading
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from config.settings import VectorConfig
+from utils.logger_manager import get_logger
+
+logger = get_logger("embedding_backend")
+
+
+def resolve_model_path(cfg: VectorConfig) -> str:
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.normpath(os.path.join(base_dir, "..", cfg.model_path))
+
+
+def resolve_onnx_path(cfg: VectorConfig) -> str:
+    """ONNX 文件路径：未配置时放在模型目录下 onnx/model.onnx（量化版为 model_int8.onnx）"""
+    if cfg.onnx_path:
+        return cfg.onnx_path
+    name = "model_int8.onnx" if cfg.onnx_quantize else "model.onnx"
+    return os.path.join(resolve_model_path(cfg), "onnx", name)
+
+
+def _l2_normalize(x: np.ndarray) -> np.ndarray:
+    norm = np.linalg.norm(x, axis=1, keepdims=True)
+    return x / np.clip(norm, 1e-12, None)
+
+
+class TorchBackend:
+    name = "torch"
+
+    def __init__(self, model_path: str, num_threads: Optional[int] = None):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        self.model = SentenceTransformer(model_path, device="cpu")
+
+    @property
+    def tokenizer(self):
+        return self.model.tokenizer
+
+    @property
+    def max_seq_length(self) -> int:
+        return self.model.max_seq_length
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        return self.model.encode(
+            texts,
+            batch_size=batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+        ).astype(np.float32)
+
+
+class OnnxBackend:
+    name = "onnx"
+
+    def __init__(self, model_path: str, onnx_path: str, num_threads: Optional[int] = None):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path)
+        self.max_seq_length = _read_max_seq_length(model_path)
+        self.pooling = _read_pooling_mode(model_path)
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            opts.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(onnx_path, opts, providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        out = []
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            enc = self.tokenizer(
+                batch,
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np",
+            )
+            feeds = {k: v.astype(np.int64) for k, v in enc.items() if k in self._input_names}
+            hidden = self.session.run(None, feeds)[0]
+
+            if self.pooling == "mean":
+                mask = enc["attention_mask"][..., None].astype(np.float32)
+                pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            else:
+                pooled = hidden[:, 0]
+            out.append(_l2_normalize(pooled.astype(np.float32)))
+
+        return np.concatenate(out, axis=0) if out else np.zeros((0, 0), dtype=np.float32)
+
+
+def _read_pooling_mode(model_path: str) -> str:
+    """读取 sentence-transformers 的池化配置（bge 系列为 CLS 池化）"""
+    cfg_path = os.path.join(model_path, "1_Pooling", "config.json")
+    try:
+        with open(cfg_path, "r", encoding="utf-8") as f:
+            cfg = json.load(f)
+        if cfg.get("pooling_mode_mean_tokens"):
+            return "mean"
+    except FileNotFoundError:
+        pass
+    return "cls"
+
+
+def _read_max_seq_length(model_path: str) -> int:
+    cfg_path = os.path.join(model_path, "sentence_bert_config.json")
+    try:
+        with open(cfg_path, "r", encoding="utf-8") as f:
+            return int(json.load(f).get("max_seq_length", 512))
+    except FileNotFoundError:
+        return 512
+
+
+def export_onnx(model_path: str, onnx_path: str, quantize: bool = False, opset: int = 14) -> str:
+    """
+    导出 ONNX（输出 last_hidden_state，池化在后端里做），可选动态 int8 量化
+
+    :return: 最终可用的 ONNX 文件路径
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(os.path.dirname(onnx_path), exist_ok=True)
+    fp32_path = onnx_path
+    if quantize:
+        fp32_path = onnx_path.replace("_int8.onnx", ".onnx")
+        if fp32_path == onnx_path:
+            fp32_path = onnx_path[:-len(".onnx")] + "_fp32.onnx"
+
+    if not os.path.exists(fp32_path):
+        logger.info(f"导出 ONNX 模型: {fp32_path}")
+        tokenizer = AutoTokenizer.from_pretrained(model_path)
+        model = AutoModel.from_pretrained(model_path).eval()
+        dummy = tokenizer(["warmup"], return_tensors="pt")
+        names = [k for k in ("input_ids", "attention_mask", "token_type_ids") if k in dummy]
+        dynamic_axes = {k: {0: "batch", 1: "seq"} for k in names}
+        dynamic_axes["last_hidden_state"] = {0: "batch", 1: "seq"}
+
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                tuple(dummy[k] for k in names),
+                fp32_path,
+                input_names=names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes,
+                opset_version=opset,
+            )
+
+    if quantize and not os.path.exists(onnx_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        logger.info(f"动态 int8 量化: {fp32_path} -> {onnx_path}")
+        quantize_dynamic(fp32_path, onnx_path, weight_type=QuantType.QInt8)
+
+    return onnx_path
+
+
+# ===================== 按 token 长度分桶 =====================
+
+def token_lengths(backend, texts: List[str]) -> List[int]:
+    """分词后的真实长度（含特殊 token，按 max_seq_length 截断）"""
+    enc = backend.tokenizer(
+        texts,
+        add_special_tokens=True,
+        truncation=True,
+        max_length=backend.max_seq_length,
+    )
+    return [len(ids) for ids in enc["input_ids"]]
+
+
+def bucket_by_length(lengths: List[int], batch_size: int) -> List[List[int]]:
+    """按长度降序排列后切成批次，返回每批的原始下标"""
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+    return [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+
+
+def padding_ratio(lengths: List[int], batches: List[List[int]]) -> float:
+    """padding token 占全部计算 token 的比例（每批都补齐到批内最长）"""
+    real = sum(lengths)
+    padded = sum(max(lengths[i] for i in b) * len(b) for b in batches if b)
+    return 1 - real / padded if padded else 0.0
+
+
+class PaddingStats:
+    """累计分桶效果：真实 token 数 / 补齐后 token 数"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.real_tokens = 0
+        self.padded_tokens = 0
+        self.batches = 0
+
+    def add(self, lengths: List[int], batches: List[List[int]]):
+        with self._lock:
+            self.real_tokens += sum(lengths)
+            self.padded_tokens += sum(max(lengths[i] for i in b) * len(b) for b in batches if b)
+            self.batches += len(batches)
+
+    def snapshot(self) -> dict:
+        ratio = 1 - self.real_tokens / self.padded_tokens if self.padded_tokens else 0.0
+        return {
+            "batches": self.batches,
+            "real_tokens": self.real_tokens,
+            "padded_tokens": self.padded_tokens,
+            "padding_ratio": round(ratio, 4),
+        }
+
+
+padding_stats = PaddingStats()
+
+
+def encode_bucketed(backend, texts: List[str], batch_size: int = 32) -> Tuple[np.ndarray, float]:
+    """
+    按 token 长度分桶编码：同一批内长度接近，padding 最少；输出恢复为输入顺序
+
+    :return: (向量矩阵, 本次 padding 比例)
+    """
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32), 0.0
+
+    lengths = token_lengths(backend, texts)
+    batches = bucket_by_length(lengths, batch_size)
+    padding_stats.add(lengths, batches)
+
+    out: Optional[np.ndarray] = None
+    for idx in batches:
+        vecs = backend.encode([texts[i] for i in idx], batch_size=len(idx))
+        if out is None:
+            out = np.empty((len(texts), vecs.shape[1]), dtype=np.float32)
+        out[idx] = vecs
+
+    return out, padding_ratio(lengths, batches)
+
+
+def load_backend(cfg: VectorConfig):
+    """按配置构造推理后端"""
+    model_path = resolve_model_path(cfg)
+    backend = (cfg.backend or "torch").lower()
+
+    if backend == "onnx":
+        onnx_path = resolve_onnx_path(cfg)
+        if not os.path.exists(onnx_path):
+            export_onnx(model_path, onnx_path, quantize=cfg.onnx_quantize)
+        logger.info(f"加载 ONNX 向量模型: {onnx_path}")
+        return OnnxBackend(model_path, onnx_path, num_threads=cfg.num_threads)
+
+    if backend != "torch":
+        raise ValueError(f"未知的向量推理后端: {cfg.backend}")
+
+    logger.info(f"加载向量模型路径: {model_path}")
+    return TorchBackend(model_path, num_threads=cfg.num_threads)
@@ -0,0 +1,96 @@
+# task/embedding_worker.py
+# -*- coding: utf-8 -*-
+"""
+专用向量 worker 模式（WORKER_MODE=embedding）
+
+普通 worker 下每个 prefork 子进程各自加载一份模型，并发数 N 就是 N 份内存，
+且每个进程的 torch 都默认用满所有核，互相抢占。专用模式下：
+- 父进程在 fork 子进程之前加载模型权重（不做推理，避免 OpenMP 线程池带进 fork），
+  子进程通过写时复制共享同一份只读权重；
+- 进程数 × 每进程线程数 按机器核数切分，子进程启动时 torch.set_num_threads；
+- 向量相关任务可路由到独立队列（vector_service.embedding_queue）由该 worker 专门消费。
+
+启动示例：
+    WORKER_MODE=embedding celery -A task.celery_app worker -Q embedding --loglevel=info
+
+ONNX 后端的 InferenceSession 不适合跨 fork 共享，onnx 后端下仍在子进程内各自加载。
+"""
+import os
+from typing import Optional, Tuple
+
+from config.settings import VectorConfig
+from utils.logger_manager import get_logger
+
+logger = get_logger("embedding_worker")
+
+WORKER_MODE = os.getenv("WORKER_MODE", "").strip().lower()
+
+
+def is_embedding_worker() -> bool:
+    return WORKER_MODE == "embedding"
+
+
+def available_cores() -> int:
+    """当前进程可用的 CPU 数（考虑 taskset / cgroup 亲和性），优先物理核"""
+    try:
+        logical = len(os.sched_getaffinity(0))
+    except AttributeError:
+        logical = os.cpu_count() or 1
+    try:
+        import psutil
+        physical = psutil.cpu_count(logical=False) or logical
+        return max(1, min(logical, physical))
+    except ImportError:
+        return max(1, logical)
+
+
+def plan_pool(
+    cores: int,
+    processes: Optional[int] = None,
+    threads: Optional[int] = None,
+) -> Tuple[int, int]:
+    """
+    切分进程数与每进程线程数，保证 processes × threads ≤ cores
+
+    :return: (processes, threads_per_process)
+    """
+    if processes and threads:
+        return processes, threads
+    if processes:
+        return processes, max(1, cores // processes)
+    threads = threads or 2
+    return max(1, cores // threads), threads
+
+
+def pool_plan(cfg: VectorConfig) -> Tuple[int, int]:
+    return plan_pool(available_cores(), cfg.embed_worker_processes, cfg.embed_worker_threads)
+
+
+def init_parent(cfg: VectorConfig):
+    """
+    父进程（fork 之前）：限制线程并加载权重，子进程写时复制共享
+    """
+    processes, threads = pool_plan(cfg)
+    # 必须在 torch 首次 import 之前设置，否则 OpenMP 线程池已按全部核数建好
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["MKL_NUM_THREADS"] = str(threads)
+    logger.info(f"[embedding worker] cores={available_cores()} processes={processes} threads/process={threads}")
+
+    if (cfg.backend or "torch").lower() != "torch":
+        return processes, threads
+
+    import torch
+    torch.set_num_threads(1)
+
+    from task.gen_vector_chain import load_model_weights
+    load_model_weights()
+    return processes, threads
+
+
+def init_child(cfg: VectorConfig):
+    """子进程（fork 之后）：设定本进程推理线程数"""
+    _, threads = pool_plan(cfg)
+    if (cfg.backend or "torch").lower() == "torch":
+        import torch
+        torch.set_num_threads(threads)
+    logger.info(f"[embedding worker] pid={os.getpid()} torch threads={threads}")
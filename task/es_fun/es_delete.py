@@ -9,7 +9,7 @@ es = AsyncElasticsearch(
 # 单条删除
 async def delete_doc(index: str, doc_id: str):
     try:
-        await es.delete(index=index, id=doc_id, ignore=[404])
+        await es.delete(index=index, id=doc_id, ignore=[404], refresh="wait_for")
     except Exception as e:
         print(f"Delete failed: {e}")
 
@@ -0,0 +1,163 @@
+# task/es_fun/es_projection.py
+"""
+ES 读取侧字段投影（_source 过滤）
+
+所有读路径统一通过这里决定返回哪些字段：
+- 默认排除稠密向量字段（1024 维 float 数组，JSON 体积和解码耗时都远大于其余字段）
+- 各调用点按需声明 includes，只取用到的字段
+
+两种形式：
+- source_params(...)  → search / mget 等 API 的关键字参数（source_includes / source_excludes）
+- source_filter(...)  → 写进请求体（如 msearch 的每个子查询）的 "_source" 值
+
+另提供 wmx_ques 的索引 mapping 构造：vectors_in_source=False 时向量只进索引、不进 _source，
+响应体与磁盘占用都会明显下降。注意此时无法再从 _source 读回向量（重建索引需从 PG 取），
+局部更新（es.update）也必须带上完整的 ques_vector。
+
+问题文档冗余了所属文件 / 创建人 / 文件类型 / 创建时间（FILTER_FIELD_MAPPING），供 knn.filter 使用；
+API 与 Celery worker 启动时调用 ensure_filter_field_mappings：问题索引不存在则按 ques_index_mapping 新建，
+已有索引追加过滤字段。已被动态 mapping 成 text 的字段无法改类型，解析为其 .keyword 子字段
+（"yyyy-MM-dd HH:mm:ss" 按字典序比较即时间顺序，keyword 上的 range 同样成立）。
+旧文档需重新写入后才能被新加字段的过滤条件命中。
+"""
+from typing import Dict, List, Optional, Sequence
+
+from elasticsearch import BadRequestError
+
+from config.settings import settings
+from utils.logger_manager import get_logger
+
+logger = get_logger("es_projection")
+
+VECTOR_FIELDS = ("ques_vector",)
+
+# 各调用点的标准投影
+QUES_HIT_FIELDS = ["ori_sent_id"]
+CHUNK_CONTENT_FIELDS = ["content"]
+
+# 检索过滤字段（zhisk_results 与 wmx_ques 同名同类型）
+FILTER_FIELD_MAPPING = {
+    "zhisk_file_id": {"type": "keyword"},
+    "create_by": {"type": "keyword"},
+    "file_type": {"type": "keyword"},
+    "create_time": {"type": "date", "format": "yyyy-MM-dd HH:mm:ss||strict_date_optional_time||epoch_millis"},
+}
+
+
+def _excludes(excludes: Optional[Sequence[str]], with_vectors: bool) -> List[str]:
+    out = list(excludes or [])
+    if not with_vectors:
+        out += [f for f in VECTOR_FIELDS if f not in out]
+    return out
+
+
+def source_params(
+    includes: Optional[Sequence[str]] = None,
+    excludes: Optional[Sequence[str]] = None,
+    with_vectors: bool = False,
+) -> dict:
+    """search / mget 的 _source 过滤参数，可直接 **展开"""
+    params = {}
+    if includes:
+        params["source_includes"] = list(includes)
+    excl = _excludes(excludes, with_vectors)
+    if excl:
+        params["source_excludes"] = excl
+    return params
+
+
+def source_filter(
+    includes: Optional[Sequence[str]] = None,
+    excludes: Optional[Sequence[str]] = None,
+    with_vectors: bool = False,
+):
+    """请求体里的 "_source" 值"""
+    excl = _excludes(excludes, with_vectors)
+    if includes:
+        return {"includes": list(includes), "excludes": excl} if excl else list(includes)
+    return {"excludes": excl} if excl else True
+
+
+def ques_index_mapping(dims: int = 1024, vectors_in_source: Optional[bool] = None) -> dict:
+    """
+    wmx_ques 索引 mapping
+
+    :param dims: 向量维度（bge-large-zh 为 1024）
+    :param vectors_in_source: False 时 ques_vector 不写入 _source，仅用于 knn；默认取 elasticsearch.vectors_in_source
+    """
+    if vectors_in_source is None:
+        vectors_in_source = settings.elasticsearch.vectors_in_source
+    mapping = {
+        "properties": {
+            "id": {"type": "keyword"},
+            "ori_sent_id": {"type": "keyword"},
+            "ori_ques_sent": {"type": "text"},
+            "ques_vector": {
+                "type": "dense_vector",
+                "dims": dims,
+                "index": True,
+                "similarity": "cosine",
+            },
+            **FILTER_FIELD_MAPPING,
+        }
+    }
+    if not vectors_in_source:
+        mapping["_source"] = {"excludes": list(VECTOR_FIELDS)}
+    return mapping
+
+
+def create_ques_index(es, index_name: Optional[str] = None, dims: int = 1024) -> bool:
+    """按 ques_index_mapping 创建问题索引（同步客户端），已存在时跳过；返回是否新建"""
+    index_name = index_name or settings.elasticsearch.indexes.ques_index
+    if es.indices.exists(index=index_name):
+        return False
+    es.indices.create(index=index_name, mappings=ques_index_mapping(dims))
+    return True
+
+
+def put_filter_field_mappings(es, index_name: str) -> None:
+    """给已有索引追加过滤字段 mapping（同步客户端）；字段已存在且类型一致时为空操作"""
+    es.indices.put_mapping(index=index_name, properties=FILTER_FIELD_MAPPING)
+
+
+def _filter_field_name(props: dict, field: str) -> Optional[str]:
+    """按索引里该字段的实际 mapping 决定过滤用的字段名；无法精确过滤时返回 None"""
+    m = props.get(field)
+    if m is None or m.get("type") in (FILTER_FIELD_MAPPING[field]["type"], "keyword"):
+        return field  # 尚无此字段（之后按新 mapping 写入）或类型可直接过滤
+    sub = (m.get("fields") or {}).get("keyword")
+    if sub and sub.get("type") == "keyword":
+        return f"{field}.keyword"
+    return None
+
+
+def ensure_filter_field_mappings(es, index_names: Sequence[str]) -> Dict[str, Dict[str, str]]:
+    """
+    确保过滤字段 mapping 并解析各索引实际用于过滤的字段名（同步客户端，启动时调用一次）
+
+    :return: {字段: {具体索引名: 字段名}}，如 {"zhisk_file_id": {"zhisk_results": "zhisk_file_id.keyword", "wmx_ques": "zhisk_file_id"}}
+    """
+    ques_index = settings.elasticsearch.indexes.ques_index
+    resolved: Dict[str, Dict[str, str]] = {field: {} for field in FILTER_FIELD_MAPPING}
+    for index_name in index_names:
+        if not es.indices.exists(index=index_name):
+            if index_name == ques_index:
+                create_ques_index(es, index_name)
+            else:
+                continue
+        # 逐个字段追加：单个字段类型冲突不影响其余字段
+        for field, mapping in FILTER_FIELD_MAPPING.items():
+            try:
+                es.indices.put_mapping(index=index_name, properties={field: mapping})
+            except BadRequestError as e:
+                logger.warning(f"[ES] {index_name}.{field} 已有不同类型的 mapping，保留原类型: {e}")
+
+        for concrete, body in es.indices.get_mapping(index=index_name).body.items():
+            props = body.get("mappings", {}).get("properties", {})
+            for field in FILTER_FIELD_MAPPING:
+                name = _filter_field_name(props, field)
+                if name is None:
+                    logger.warning(f"[ES] {concrete}.{field} 为 text 且没有 keyword 子字段，过滤条件无法精确匹配，需重建索引")
+                    name = field
+                resolved[field][concrete] = name
+    return resolved
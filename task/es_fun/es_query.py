@@ -1,13 +1,17 @@
 from fastapi import HTTPException
 from elasticsearch import AsyncElasticsearch
-from typing import List, Optional 
+from typing import List, Optional
+from task.es_fun.es_projection import source_params
+
+
 async def query_es_index(
     es: AsyncElasticsearch,
     index_name: str,
     page: Optional[int] = None,
     page_size: Optional[int] = None,
     sort_field: str = "_doc",
-    sort_order: str = "asc"
+    sort_order: str = "asc",
+    with_vectors: bool = False
 ):
     """
     通用Elasticsearch分页查询函数
@@ -18,6 +22,7 @@ async def query_es_index(
     :param sort_field: 排序字段
     :param sort_order: 排序方向(asc/desc)
     :param query: 自定义查询条件，默认match_all
+    :param with_vectors: 是否返回向量字段（默认不返回）
     :return: 包含分页结果和元数据的字典
     :raises: HTTPException
     """
@@ -40,7 +45,8 @@ async def query_es_index(
         # 执行查询
         response = await es.search(
             index=index_name,
-            body=query_body
+            body=query_body,
+            **source_params(with_vectors=with_vectors)
         )
         
         # 解析结果
@@ -90,7 +96,8 @@ async def query_results_by_file_id(es: AsyncElasticsearch, file_id: str):
     
     response = await es.search(
         index="zhisk_results",
-        body=query_body
+        body=query_body,
+        **source_params()
     )
     return {
         "total": response["hits"]["total"]["value"],
@@ -120,7 +127,7 @@ async def query_by_uuids(es: AsyncElasticsearch, uuids: List[str]):
             "sort": [{"_doc": {"order": "asc"}}]
         }
         
-        response = await es.search(index="wmx_ques", body=query)
+        response = await es.search(index="wmx_ques", body=query, **source_params())
         hits = response["hits"]["hits"]
 
         results.append({
@@ -6,6 +6,7 @@ from config.settings import settings
 from task.gen_vector_chain import encode_text_task
 from task.gen_ques import generate_questions_task
 from celery import group
+from task.es_fun.qvec_changes import apublish_upserts, apublish_deletes
 
 
 es = AsyncElasticsearch(
@@ -23,15 +24,18 @@ async def update_chunk_in_es(chunk_id: str, new_content: str, update_by: str):
             "content": new_content,
             "update_by": update_by,
             "update_time": update_time
-        }}
+        }},
+        refresh="wait_for",
     )
 
 
 async def delete_questions_by_chunk(chunk_id: str):
     await es.delete_by_query(
         index=settings.elasticsearch.indexes.ques_index,
-        body={"query": {"term": {"ori_sent_id": chunk_id}}}
+        body={"query": {"term": {"ori_sent_id": chunk_id}}},
+        refresh=True,
     )
+    await apublish_deletes(chunk_ids=[chunk_id])
 
 
 async def generate_questions_by_llm(content: str) -> List[str]:
@@ -44,7 +48,20 @@ async def encode_questions_to_vectors(questions: List[str]) -> List[list]:
     return task_group.get(timeout=30)
 
 
-async def bulk_insert_questions(chunk_id: str, questions: List[str], vectors: List[list]):
+FILTER_FIELDS = ["zhisk_file_id", "create_by", "file_type", "create_time"]
+
+
+async def get_chunk_filter_meta(chunk_id: str) -> dict:
+    """读取段落上的过滤字段，重新生成问题时原样冗余到问题文档"""
+    resp = await es.get(
+        index=settings.elasticsearch.indexes.chunk_index,
+        id=chunk_id,
+        source_includes=FILTER_FIELDS,
+    )
+    return {k: v for k, v in (resp.get("_source") or {}).items() if v is not None}
+
+
+async def bulk_insert_questions(chunk_id: str, questions: List[str], vectors: List[list], meta: dict = None):
     actions = []
     for question, vector in zip(questions, vectors):
         qid = f"{chunk_id}_{abs(hash(question))}"
@@ -52,13 +69,18 @@ async def bulk_insert_questions(chunk_id: str, questions: List[str], vectors: Li
             "_index": settings.elasticsearch.indexes.ques_index,
             "_id": qid,
             "_source": {
+                **(meta or {}),
                 "ori_sent_id": chunk_id,
                 "ori_ques_sent": question,
                 "ques_vector": vector
             }
         })
 
-    await async_bulk(es, actions)
+    await async_bulk(es, actions, refresh="wait_for")
+    await apublish_upserts(
+        {"id": a["_id"], "ori_sent_id": chunk_id, "ques_vector": a["_source"]["ques_vector"]}
+        for a in actions
+    )
 
 
 async def encode_single_question(question: str) -> list:
@@ -73,5 +95,8 @@ async def update_question_in_es(question_id: str, new_question: str, vector: lis
         doc={
             "ori_ques_sent": new_question,
             "ques_vector": vector
-        }
-    )
\ No newline at end of file
+        },
+        refresh="wait_for",
+    )
+    # 不带 ori_sent_id：本地副本沿用该问题原有的段落归属
+    await apublish_upserts([{"id": question_id, "ques_vector": vector}])
\ No newline at end of file
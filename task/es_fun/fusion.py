@@ -0,0 +1,164 @@
+# task/es_fun/fusion.py
+"""
+BM25 + 向量 结果融合（NumPy 向量化）
+
+输入为 _bm25_hits_to_results / _vector_hits_to_results 的结果列表（[{"id", "score", "text"}]），
+同一 id 多次命中（一个段落下多个问题）取最大分；输出结构与 SearchResult 一致。
+
+融合策略：
+- legacy ：BM25 min-max 归一化（带 epsilon），向量分保持 ES 原始分（与旧 merge_results 完全一致）
+- minmax ：两路都做 min-max 归一化后加权
+- zscore ：两路各自标准化后加权；某一路缺失的文档取该路最低 z 分
+- rrf    ：倒数排名融合 1 / (rrf_k + rank)，按 alpha 加权（alpha=0.5 即标准 RRF 的 1/2）
+
+最终得分 = alpha * bm25 + (1 - alpha) * vector；top-k 用 argpartition 做部分选择，只对前 k 条排序。
+"""
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+STRATEGIES = ("legacy", "minmax", "zscore", "rrf")
+EPSILON = 1e-5
+
+
+def _max_by_pos(pos: np.ndarray, scores: np.ndarray, n: int) -> Tuple[np.ndarray, np.ndarray]:
+    """同 id 取最大分：返回按 id 对齐的分数列（缺失为 NaN）和该 id 的任一行下标（缺失为 -1，用于取文本）"""
+    col = np.full(n, -np.inf)
+    np.maximum.at(col, pos, scores)
+    col[np.isneginf(col)] = np.nan
+    row = np.full(n, -1, dtype=np.int64)
+    row[pos] = np.arange(pos.size)
+    return col, row
+
+
+def _collect(bm25_results: list, vector_results: list) -> Tuple[list, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """合并两路结果：返回 ids、按 id 对齐的两路分数（缺失为 NaN）、两路对应的行下标（缺失为 -1）"""
+    index: Dict[str, int] = {}
+    sides = []
+    for results in (bm25_results, vector_results):
+        pos = np.fromiter((index.setdefault(r["id"], len(index)) for r in results), np.int64, len(results))
+        scores = np.fromiter((r["score"] for r in results), np.float64, len(results))
+        sides.append((pos, scores))
+
+    n = len(index)
+    (bm25, b_row), (vector, v_row) = (_max_by_pos(pos, scores, n) for pos, scores in sides)
+    return list(index), bm25, vector, b_row, v_row
+
+
+def _minmax(col: np.ndarray, present: np.ndarray) -> np.ndarray:
+    out = np.zeros_like(col)
+    if not present.any():
+        return out
+    vals = col[present]
+    lo, hi = vals.min(), vals.max()
+    if hi == lo:
+        out[present] = 1.0
+    else:
+        out[present] = (vals - lo + EPSILON) / (hi - lo + EPSILON)
+    return out
+
+
+def _zscore(col: np.ndarray, present: np.ndarray) -> np.ndarray:
+    out = np.zeros_like(col)
+    if not present.any():
+        return out
+    vals = col[present]
+    std = vals.std()
+    z = (vals - vals.mean()) / std if std > 0 else np.zeros_like(vals)
+    out[:] = z.min()
+    out[present] = z
+    return out
+
+
+def _rrf(col: np.ndarray, present: np.ndarray, rrf_k: int) -> np.ndarray:
+    out = np.zeros_like(col)
+    idx = np.flatnonzero(present)
+    if idx.size == 0:
+        return out
+    order = idx[np.argsort(-col[idx], kind="stable")]
+    out[order] = 1.0 / (rrf_k + np.arange(1, order.size + 1))
+    return out
+
+
+def normalize(col: np.ndarray, present: np.ndarray, method: str, rrf_k: int = 60) -> np.ndarray:
+    if method == "raw":
+        return np.where(present, col, 0.0)
+    if method == "minmax":
+        return _minmax(col, present)
+    if method == "zscore":
+        return _zscore(col, present)
+    if method == "rrf":
+        return _rrf(col, present, rrf_k)
+    raise ValueError(f"未知的归一化方式: {method}")
+
+
+def top_k_indices(scores: np.ndarray, top_k: Optional[int]) -> np.ndarray:
+    """按分数降序取前 top_k 个下标；top_k < n 时先 argpartition 再只排序这 k 个"""
+    n = scores.size
+    if top_k is None or top_k >= n:
+        return np.argsort(-scores, kind="stable")
+    if top_k <= 0:
+        return np.empty(0, dtype=np.int64)
+    part = np.argpartition(-scores, top_k - 1)[:top_k]
+    return part[np.argsort(-scores[part], kind="stable")]
+
+
+def fuse(
+    bm25_results: list,
+    vector_results: list,
+    alpha: float = 0.6,
+    top_k: Optional[int] = 10,
+    strategy: str = "legacy",
+    rrf_k: int = 60,
+) -> List[dict]:
+    """
+    融合两路检索结果
+
+    :param alpha: BM25 权重，向量权重为 1 - alpha
+    :param top_k: 返回条数；None 表示全部
+    :param strategy: legacy / minmax / zscore / rrf
+    :param rrf_k: RRF 平滑常数
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"未知的融合策略: {strategy}")
+
+    ids, bm25, vector, b_row, v_row = _collect(bm25_results, vector_results)
+    if not ids:
+        return []
+
+    b_present, v_present = ~np.isnan(bm25), ~np.isnan(vector)
+    if strategy == "legacy":
+        b_norm = normalize(bm25, b_present, "minmax")
+        v_norm = normalize(vector, v_present, "raw")
+    else:
+        b_norm = normalize(bm25, b_present, strategy, rrf_k)
+        v_norm = normalize(vector, v_present, strategy, rrf_k)
+
+    # 与旧实现一致：按四舍五入到 4 位后的分数排序；排序键与输出分数共用同一个 np.round 结果，
+    # 保证输出顺序与分数一致（只有 top-k 行转成 Python float）
+    final = alpha * b_norm + (1 - alpha) * v_norm
+    rounded = np.round(final, 4)
+
+    # 只对 top-k 行转 Python 对象；同一 id 对应同一段落，文本取向量侧、缺失时取 BM25 侧（与旧实现一致）
+    merged = []
+    for i in top_k_indices(rounded, top_k).tolist():
+        _id = ids[i]
+        row = v_row[i]
+        text = vector_results[row]["text"] if row >= 0 else bm25_results[b_row[i]]["text"]
+        if b_present[i] and v_present[i]:
+            source = "hybrid"
+        elif b_present[i]:
+            source = "bm25"
+        else:
+            source = "vector"
+        merged.append({
+            "id": _id,
+            "content": text,
+            "score": float(rounded[i]),
+            "score_detail": {
+                "bm25": round(float(b_norm[i]), 4),
+                "vector": round(float(v_norm[i]), 4),
+            },
+            "source": source,
+        })
+    return merged
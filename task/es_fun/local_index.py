@@ -0,0 +1,581 @@
+# task/es_fun/local_index.py
+"""
+wmx_ques 的进程内向量只读副本（API 进程）
+
+向量检索原本每次都要 ES knn；问题库规模（数十万条 1024 维归一化向量）完全可以放进内存，
+在进程内直接算内积，省掉一次 ES 往返：
+- 后端：numpy（暴力内积 + argpartition，适合几万条以内）/ hnsw（hnswlib，可选依赖，适合更大规模）
+- 启动：优先加载本地快照（索引 + 元数据 + 对应的变更流位置），再从该位置回放变更流；
+  无快照或快照已落后于流的裁剪范围时，从 wmx_ques 全量 scroll 重建（需要 _source 中保留向量，
+  即 elasticsearch.vectors_in_source=true；否则只能依赖快照）
+- 增量：消费 qvec_changes 写入的 Redis Stream（upsert / delete / delete_chunk），与写路径解耦
+- 新鲜度：staleness = 距离最近一次确认“已追平变更流”的秒数；超过 local_index.max_staleness_sec
+  时 search_vector 自动回退到 ES knn
+- 读己之写：本进程 API 写入变更后（apublish_*）记下流位置，副本消费到该位置之前不参与检索；
+  写快照期间暂停消费变更流，同样不参与检索
+- 分数换算为 ES cosine 的 (1 + cos) / 2，与 ES knn 结果可以直接混用、融合
+
+每个 API 进程各自维护一份副本；快照按版本写入独立目录（索引 + 元数据在同一目录内），写完后整体 rename，
+再用 os.replace 切换 CURRENT 指针文件。多个进程同时写快照只会各自产生完整的版本，
+不会出现一个进程的向量配上另一个进程的 id 映射；旧版本只保留最近 _KEEP_SNAPSHOTS 个。
+"""
+import asyncio
+import json
+import os
+import shutil
+import threading
+import time
+from collections import defaultdict
+from typing import List, Optional, Tuple
+
+import numpy as np
+import redis.asyncio as aioredis
+from elasticsearch import AsyncElasticsearch
+from elasticsearch.helpers import async_scan
+
+from config.settings import settings, LocalIndexConfig
+from utils.logger_manager import get_logger
+
+logger = get_logger("local_index")
+
+cfg: LocalIndexConfig = settings.local_index
+
+# 超过该条数时 numpy 暴力检索放到线程池，避免阻塞事件循环
+_INLINE_SEARCH_MAX = 20000
+
+# 保留的快照版本数（其他进程可能正在加载稍旧的版本，不立即删除）
+_KEEP_SNAPSHOTS = 3
+
+
+def _parse_id(stream_id) -> Tuple[int, int]:
+    if isinstance(stream_id, bytes):
+        stream_id = stream_id.decode()
+    ms, _, seq = str(stream_id).partition("-")
+    return int(ms), int(seq or 0)
+
+
+def _l2_normalize(x: np.ndarray) -> np.ndarray:
+    norm = np.linalg.norm(x, axis=-1, keepdims=True)
+    return (x / np.clip(norm, 1e-12, None)).astype(np.float32)
+
+
+# ===================== 索引后端 =====================
+
+class NumpyIndex:
+    """连续 float32 矩阵 + id → 行号；删除时用最后一行填补空位"""
+    name = "numpy"
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self._vecs = np.empty((0, dim), dtype=np.float32)
+        self._n = 0
+        self.ids: List[str] = []
+        self.chunks: List[str] = []
+        self._row = {}
+        self._by_chunk = defaultdict(set)
+
+    def __len__(self):
+        return self._n
+
+    def __contains__(self, qid: str):
+        return qid in self._row
+
+    def _grow(self, need: int):
+        cap = self._vecs.shape[0]
+        if need <= cap:
+            return
+        vecs = np.empty((max(need, cap * 2, 1024), self.dim), dtype=np.float32)
+        vecs[:self._n] = self._vecs[:self._n]
+        self._vecs = vecs
+
+    def upsert(self, qid: str, chunk: str, vec: np.ndarray):
+        row = self._row.get(qid)
+        if row is None:
+            self._grow(self._n + 1)
+            row = self._row[qid] = self._n
+            self._n += 1
+            self.ids.append(qid)
+            self.chunks.append(chunk)
+        elif chunk and chunk != self.chunks[row]:
+            self._drop_chunk_ref(self.chunks[row], qid)
+            self.chunks[row] = chunk
+        self._by_chunk[self.chunks[row]].add(qid)
+        self._vecs[row] = vec
+
+    def _drop_chunk_ref(self, chunk: str, qid: str):
+        refs = self._by_chunk.get(chunk)
+        if refs is not None:
+            refs.discard(qid)
+            if not refs:
+                del self._by_chunk[chunk]
+
+    def delete(self, qid: str):
+        row = self._row.pop(qid, None)
+        if row is None:
+            return
+        self._drop_chunk_ref(self.chunks[row], qid)
+        last = self._n - 1
+        if row != last:
+            self._vecs[row] = self._vecs[last]
+            self.ids[row] = self.ids[last]
+            self.chunks[row] = self.chunks[last]
+            self._row[self.ids[row]] = row
+        self.ids.pop()
+        self.chunks.pop()
+        self._n -= 1
+
+    def delete_chunk(self, chunk: str):
+        for qid in list(self._by_chunk.get(chunk, ())):
+            self.delete(qid)
+
+    def search(self, q: np.ndarray, k: int) -> List[Tuple[str, str, float]]:
+        if self._n == 0 or k <= 0:
+            return []
+        sims = self._vecs[:self._n] @ q
+        k = min(k, self._n)
+        part = np.argpartition(-sims, k - 1)[:k]
+        order = part[np.argsort(-sims[part])]
+        return [(self.ids[i], self.chunks[i], float(sims[i])) for i in order]
+
+    def save(self, prefix: str) -> dict:
+        with open(prefix + ".npy", "wb") as f:
+            np.save(f, self._vecs[:self._n])
+        return {"ids": self.ids, "chunks": self.chunks}
+
+    @classmethod
+    def build(cls, ids: List[str], chunks: List[str], vecs: np.ndarray, dim: int) -> "NumpyIndex":
+        """一次性从数组构建（vecs 须已归一化，行与 ids 一一对应）"""
+        index = cls(dim)
+        index._vecs = np.ascontiguousarray(vecs, dtype=np.float32).reshape(-1, dim)
+        index._n = len(ids)
+        index.ids = list(ids)
+        index.chunks = list(chunks)
+        index._row = {qid: i for i, qid in enumerate(index.ids)}
+        for qid, chunk in zip(index.ids, index.chunks):
+            index._by_chunk[chunk].add(qid)
+        return index
+
+    @classmethod
+    def load(cls, prefix: str, meta: dict, dim: int) -> "NumpyIndex":
+        return cls.build(meta["ids"], meta["chunks"], np.load(prefix + ".npy"), dim)
+
+
+class HnswIndex:
+    """hnswlib 内积索引；整数 label 与问题 id 互相映射，删除为 mark_deleted，新增复用已删除槽位"""
+    name = "hnsw"
+
+    def __init__(self, dim: int, capacity: int = 10000, _index=None):
+        import hnswlib
+
+        self.dim = dim
+        if _index is None:
+            _index = hnswlib.Index(space="ip", dim=dim)
+            _index.init_index(
+                max_elements=capacity,
+                M=cfg.hnsw_m,
+                ef_construction=cfg.hnsw_ef_construction,
+                allow_replace_deleted=True,
+            )
+        _index.set_ef(cfg.hnsw_ef_search)
+        self._index = _index
+        self._label = {}      # qid → label
+        self._qid = {}        # label → qid
+        self._chunk = {}      # label → chunk
+        self._by_chunk = defaultdict(set)
+        self._next = 0
+
+    def __len__(self):
+        return len(self._label)
+
+    def __contains__(self, qid: str):
+        return qid in self._label
+
+    def upsert(self, qid: str, chunk: str, vec: np.ndarray):
+        label = self._label.get(qid)
+        if label is None:
+            if self._index.get_current_count() >= self._index.get_max_elements():
+                self._index.resize_index(max(1024, self._index.get_max_elements() * 2))
+            label = self._next
+            self._next += 1
+            self._label[qid], self._qid[label], self._chunk[label] = label, qid, chunk
+            self._index.add_items(vec[None, :], [label], replace_deleted=True)
+        else:
+            if chunk and chunk != self._chunk[label]:
+                self._drop_chunk_ref(self._chunk[label], qid)
+                self._chunk[label] = chunk
+            self._index.add_items(vec[None, :], [label])  # 已存在的 label 原地更新
+        self._by_chunk[self._chunk[label]].add(qid)
+
+    def _drop_chunk_ref(self, chunk: str, qid: str):
+        refs = self._by_chunk.get(chunk)
+        if refs is not None:
+            refs.discard(qid)
+            if not refs:
+                del self._by_chunk[chunk]
+
+    def delete(self, qid: str):
+        label = self._label.pop(qid, None)
+        if label is None:
+            return
+        self._drop_chunk_ref(self._chunk.pop(label), qid)
+        del self._qid[label]
+        self._index.mark_deleted(label)
+
+    def delete_chunk(self, chunk: str):
+        for qid in list(self._by_chunk.get(chunk, ())):
+            self.delete(qid)
+
+    def search(self, q: np.ndarray, k: int) -> List[Tuple[str, str, float]]:
+        k = min(k, len(self))
+        if k <= 0:
+            return []
+        labels, distances = self._index.knn_query(q[None, :], k=k)
+        # ip 空间的距离为 1 - 内积
+        return [
+            (self._qid[int(label)], self._chunk[int(label)], 1.0 - float(d))
+            for label, d in zip(labels[0], distances[0])
+        ]
+
+    def save(self, prefix: str) -> dict:
+        self._index.save_index(prefix + ".hnsw")
+        return {
+            "labels": {qid: label for qid, label in self._label.items()},
+            "chunks": {str(label): chunk for label, chunk in self._chunk.items()},
+            "next": self._next,
+        }
+
+    @classmethod
+    def build(cls, ids: List[str], chunks: List[str], vecs: np.ndarray, dim: int) -> "HnswIndex":
+        """一次性从数组构建：整批 add_items（hnswlib 内部多线程），比逐条 upsert 快得多"""
+        index = cls(dim, capacity=max(cfg.hnsw_capacity, len(ids)))
+        if ids:
+            index._index.add_items(vecs, np.arange(len(ids)))
+        for label, (qid, chunk) in enumerate(zip(ids, chunks)):
+            index._label[qid], index._qid[label], index._chunk[label] = label, qid, chunk
+            index._by_chunk[chunk].add(qid)
+        index._next = len(ids)
+        return index
+
+    @classmethod
+    def load(cls, prefix: str, meta: dict, dim: int) -> "HnswIndex":
+        import hnswlib
+
+        raw = hnswlib.Index(space="ip", dim=dim)
+        raw.load_index(prefix + ".hnsw", allow_replace_deleted=True)
+        index = cls(dim, _index=raw)
+        index._label = dict(meta["labels"])
+        index._qid = {label: qid for qid, label in index._label.items()}
+        index._chunk = {int(label): chunk for label, chunk in meta["chunks"].items()}
+        for label, chunk in index._chunk.items():
+            index._by_chunk[chunk].add(index._qid[label])
+        index._next = meta["next"]
+        return index
+
+
+_BACKENDS = {"numpy": NumpyIndex, "hnsw": HnswIndex}
+
+
+# ===================== 副本：快照 / 重建 / 增量 =====================
+
+class LocalVectorReplica:
+    def __init__(self):
+        self.index = None
+        self.ready = False
+        self.last_id = "0-0"            # 已应用到的变更流位置
+        self.synced_at: Optional[float] = None  # 最近一次确认已追平变更流的时间
+        self.source: Optional[str] = None       # snapshot / es
+        self.error: Optional[str] = None
+        self._lock = threading.Lock()
+        self._min_id = "0-0"            # 本进程已写入、副本须先消费到的流位置
+        self._snapshotting = False
+        self._dirty = False
+        self._snapshot_at = time.time()
+        self._redis: Optional[aioredis.Redis] = None
+
+    @property
+    def backend(self) -> str:
+        if cfg.backend == "hnsw":
+            try:
+                import hnswlib  # noqa: F401
+                return "hnsw"
+            except ImportError:
+                logger.warning("未安装 hnswlib，本地向量副本回退为 numpy 暴力检索")
+        return "numpy"
+
+    # ---------- 查询 ----------
+
+    def staleness(self) -> Optional[float]:
+        return None if self.synced_at is None else time.time() - self.synced_at
+
+    def usable(self) -> bool:
+        lag = self.staleness()
+        return (
+            self.ready and lag is not None and lag <= cfg.max_staleness_sec
+            and not self._snapshotting
+            and _parse_id(self.last_id) >= _parse_id(self._min_id)
+        )
+
+    def require(self, stream_id):
+        """本进程刚写入变更流：消费到 stream_id 之前副本不参与检索，避免代际递增后把旧结果写进缓存"""
+        if isinstance(stream_id, bytes):
+            stream_id = stream_id.decode()
+        if _parse_id(stream_id) > _parse_id(self._min_id):
+            self._min_id = stream_id
+
+    def _search(self, q: np.ndarray, k: int):
+        with self._lock:
+            return self.index.search(q, k)
+
+    async def knn_hits(self, vec: list, k: int) -> List[dict]:
+        """返回与 ES knn 命中相同结构的列表（_id / _score / _source.ori_sent_id）"""
+        q = _l2_normalize(np.asarray(vec, dtype=np.float32))
+        if self.index.name == "numpy" and len(self.index) > _INLINE_SEARCH_MAX:
+            found = await asyncio.to_thread(self._search, q, k)
+        else:
+            found = self._search(q, k)
+        return [
+            {"_id": qid, "_score": (1.0 + sim) / 2.0, "_source": {"ori_sent_id": chunk}}
+            for qid, chunk, sim in found
+        ]
+
+    def status(self) -> dict:
+        lag = self.staleness()
+        return {
+            "enabled": cfg.enable,
+            "ready": self.ready,
+            "usable": self.usable(),
+            "backend": self.index.name if self.index is not None else self.backend,
+            "size": len(self.index) if self.index is not None else 0,
+            "source": self.source,
+            "last_id": self.last_id,
+            "min_id": self._min_id,
+            "snapshotting": self._snapshotting,
+            "staleness_sec": round(lag, 3) if lag is not None else None,
+            "max_staleness_sec": cfg.max_staleness_sec,
+            "error": self.error,
+        }
+
+    # ---------- 变更应用 ----------
+
+    def apply(self, entries):
+        with self._lock:
+            for stream_id, fields in entries:
+                op = fields.get(b"op", b"").decode()
+                if op == "upsert":
+                    qid, chunk = fields[b"id"].decode(), fields.get(b"chunk", b"").decode()
+                    # 没有所属段落的问题无法回查 chunk，不进副本（已存在的只更新向量）
+                    if chunk or qid in self.index:
+                        vec = _l2_normalize(np.frombuffer(fields[b"vec"], dtype="<f4"))
+                        self.index.upsert(qid, chunk, vec)
+                elif op == "delete":
+                    for qid in json.loads(fields[b"ids"]):
+                        self.index.delete(qid)
+                elif op == "delete_chunk":
+                    for chunk in json.loads(fields[b"chunks"]):
+                        self.index.delete_chunk(chunk)
+                self.last_id = stream_id.decode() if isinstance(stream_id, bytes) else stream_id
+            self._dirty = self._dirty or bool(entries)
+
+    # ---------- 快照 ----------
+
+    def _backend_name(self) -> str:
+        return self.index.name if self.index else self.backend
+
+    def _current_file(self) -> str:
+        return os.path.join(cfg.snapshot_dir, f"wmx_ques.{self._backend_name()}.CURRENT")
+
+    def save_snapshot(self):
+        """
+        写入一个新版本：<snapshot_dir>/wmx_ques.<backend>.<毫秒时间戳>.<pid>/{index.*, meta.json}
+        先写到本进程独占的 .tmp 目录，完整后 rename 为正式目录，最后原子切换 CURRENT
+
+        只在变更流消费暂停时调用（run 循环内 / 停止后），此时没有写入方，写盘不持有 _lock，
+        事件循环上的检索不会被整段写盘阻塞；写盘期间副本不参与检索（见 usable）
+        """
+        if self.index is None or not cfg.snapshot_dir:
+            return
+        os.makedirs(cfg.snapshot_dir, exist_ok=True)
+        name = f"wmx_ques.{self._backend_name()}.{int(time.time() * 1000)}.{os.getpid()}"
+        final_dir = os.path.join(cfg.snapshot_dir, name)
+        tmp_dir = final_dir + ".tmp"
+        os.makedirs(tmp_dir)
+        self._snapshotting = True
+        try:
+            meta = self.index.save(os.path.join(tmp_dir, "index"))
+            meta.update(backend=self.index.name, dim=self.index.dim, last_id=self.last_id, saved_at=time.time())
+            with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False)
+            self._dirty = False
+            os.rename(tmp_dir, final_dir)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        finally:
+            self._snapshotting = False
+
+        pointer_tmp = f"{self._current_file()}.{os.getpid()}.tmp"
+        with open(pointer_tmp, "w", encoding="utf-8") as f:
+            f.write(name)
+        os.replace(pointer_tmp, self._current_file())
+        self._prune_snapshots(keep=name)
+
+        self._snapshot_at = time.time()
+        logger.info(f"本地向量副本快照已保存：{len(self.index)} 条，位置 {self.last_id}（{name}）")
+
+    def _prune_snapshots(self, keep: str):
+        prefix = f"wmx_ques.{self._backend_name()}."
+        versions = sorted(
+            (n for n in os.listdir(cfg.snapshot_dir)
+             if n.startswith(prefix) and not n.endswith((".tmp", ".CURRENT"))
+             and os.path.isdir(os.path.join(cfg.snapshot_dir, n))),
+            key=lambda n: int(n.split(".")[2]),
+        )
+        for old in versions[:-_KEEP_SNAPSHOTS]:
+            if old != keep:
+                shutil.rmtree(os.path.join(cfg.snapshot_dir, old), ignore_errors=True)
+
+    def load_snapshot(self) -> bool:
+        if not cfg.snapshot_dir or not os.path.exists(self._current_file()):
+            return False
+        try:
+            with open(self._current_file(), "r", encoding="utf-8") as f:
+                snap_dir = os.path.join(cfg.snapshot_dir, f.read().strip())
+            with open(os.path.join(snap_dir, "meta.json"), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            self.index = _BACKENDS[meta["backend"]].load(os.path.join(snap_dir, "index"), meta, meta["dim"])
+            self.last_id = meta["last_id"]
+            self.source = "snapshot"
+            logger.info(f"已加载本地向量副本快照：{len(self.index)} 条，位置 {self.last_id}")
+            return True
+        except Exception as e:
+            logger.warning(f"本地向量副本快照加载失败，改为全量重建: {e}")
+            return False
+
+    # ---------- 启动 / 消费 ----------
+
+    def _client(self) -> aioredis.Redis:
+        if self._redis is None:
+            self._redis = aioredis.Redis.from_url(settings.vector_service.redis_backend)
+        return self._redis
+
+    async def _stream_info(self) -> Optional[dict]:
+        try:
+            return await self._client().xinfo_stream(cfg.stream_key)
+        except aioredis.ResponseError:
+            return None  # 流尚不存在
+
+    async def _rebuild_from_es(self):
+        if not settings.elasticsearch.vectors_in_source:
+            raise RuntimeError("wmx_ques 的 _source 不含向量（vectors_in_source=false），且没有可用快照，无法全量重建")
+
+        info = await self._stream_info()
+        start_id = info["last-generated-id"] if info else "0-0"  # 先记位置再扫描，扫描期间的变更随后回放
+
+        es = AsyncElasticsearch(
+            hosts=[settings.elasticsearch.host],
+            basic_auth=(settings.elasticsearch.username, settings.elasticsearch.password),
+        )
+        ids, chunks, vecs = [], [], []
+        skipped = 0
+        t0 = time.perf_counter()
+        try:
+            async for hit in async_scan(
+                es,
+                index=settings.elasticsearch.indexes.ques_index,
+                query={"query": {"match_all": {}}, "_source": ["ori_sent_id", "ques_vector"]},
+                size=1000,
+            ):
+                src = hit["_source"]
+                if not src.get("ques_vector") or not src.get("ori_sent_id"):
+                    skipped += 1
+                    continue
+                ids.append(hit["_id"])
+                chunks.append(src["ori_sent_id"])
+                vecs.append(np.asarray(src["ques_vector"], dtype=np.float32))
+        finally:
+            await es.close()
+        if skipped:
+            logger.warning(f"重建时跳过 {skipped} 条缺少向量或 ori_sent_id 的问题文档")
+
+        # 归一化与建索引放到线程里整批完成，不阻塞事件循环上的其他请求
+        backend = _BACKENDS[self.backend]
+
+        def _build():
+            matrix = _l2_normalize(np.stack(vecs)) if vecs else np.empty((0, cfg.dim), dtype=np.float32)
+            return backend.build(ids, chunks, matrix, cfg.dim)
+
+        index = await asyncio.to_thread(_build)
+
+        with self._lock:
+            self.index = index
+            self.last_id = start_id.decode() if isinstance(start_id, bytes) else start_id
+            self._dirty = True
+        self.source = "es"
+        logger.info(f"本地向量副本已从 ES 重建：{len(index)} 条，耗时 {time.perf_counter() - t0:.1f}s")
+
+    async def bootstrap(self):
+        if self.load_snapshot():
+            # 快照位置之后的变更若已被裁剪，回放会漏数据，只能重建
+            info = await self._stream_info()
+            trimmed = info and _parse_id(info.get("max-deleted-entry-id", "0-0")) > _parse_id(self.last_id)
+            if not trimmed:
+                return
+            logger.warning("快照位置之后的变更已被裁剪，改为全量重建")
+        await self._rebuild_from_es()
+
+    async def run(self):
+        while True:
+            try:
+                if self.index is None:
+                    await self.bootstrap()
+                    self.ready = True
+                    self.error = None
+
+                resp = await self._client().xread({cfg.stream_key: self.last_id}, count=cfg.batch_size, block=1000)
+                entries = resp[0][1] if resp else []
+                if entries:
+                    self.apply(entries)
+                if len(entries) < cfg.batch_size:
+                    self.synced_at = time.time()
+
+                if self._dirty and time.time() - self._snapshot_at >= cfg.snapshot_interval:
+                    await asyncio.to_thread(self.save_snapshot)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.error = str(e)
+                logger.exception(f"本地向量副本同步失败，10 秒后重试: {e}")
+                await asyncio.sleep(10)
+
+
+replica = LocalVectorReplica()
+_task: Optional[asyncio.Task] = None
+
+
+def get_local_replica() -> Optional[LocalVectorReplica]:
+    """可用（已就绪且足够新）时返回副本，否则返回 None，由调用方回退到 ES knn"""
+    if cfg.enable and replica.usable():
+        return replica
+    return None
+
+
+def start_local_index():
+    """应用启动时调用：后台加载快照 / 重建并持续消费变更流（未启用时不做任何事）"""
+    global _task
+    if cfg.enable and _task is None:
+        _task = asyncio.get_running_loop().create_task(replica.run())
+
+
+async def stop_local_index():
+    global _task
+    if _task is None:
+        return
+    _task.cancel()
+    try:
+        await _task
+    except asyncio.CancelledError:
+        pass
+    _task = None
+    if replica.ready and replica._dirty:
+        await asyncio.to_thread(replica.save_snapshot)
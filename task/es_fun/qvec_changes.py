@@ -0,0 +1,122 @@
+# task/es_fun/qvec_changes.py
+"""
+问题向量变更流（Redis Stream），供 API 进程内的本地向量副本（local_index.py）增量同步
+
+所有写 wmx_ques 的路径在写入成功后追加事件：
+- upsert       ：id / chunk（ori_sent_id，可空，空表示沿用原段落）/ vec（小端 float32 字节）
+- delete       ：ids（JSON 列表，问题文档 _id）
+- delete_chunk ：chunks（JSON 列表，按段落删除其下全部问题）
+
+仅在 local_index.enable 时写入；写流失败只记录日志，不影响主写入（副本会在 staleness 上体现）。
+API 端写入后把最后一条的流位置交给本进程副本（replica.require），副本消费到该位置前不参与检索，
+保证随后的 abump_index_generation 之后不会从副本读到旧内容。
+流长度按 local_index.stream_maxlen 近似裁剪，副本落后超过裁剪范围时会整体重建。
+"""
+import json
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+from redis import Redis
+import redis.asyncio as aioredis
+
+from config.settings import settings
+from task.es_fun.local_index import replica
+from utils.logger_manager import get_logger
+
+logger = get_logger("qvec_changes")
+
+cfg = settings.local_index
+
+_sync_client: Optional[Redis] = None
+_async_client: Optional[aioredis.Redis] = None
+
+
+def _sync() -> Redis:
+    global _sync_client
+    if _sync_client is None:
+        _sync_client = Redis.from_url(settings.vector_service.redis_backend)
+    return _sync_client
+
+
+def _async() -> aioredis.Redis:
+    global _async_client
+    if _async_client is None:
+        _async_client = aioredis.Redis.from_url(settings.vector_service.redis_backend)
+    return _async_client
+
+
+def _upsert_events(docs: Iterable[dict]) -> list:
+    """docs 为 build_question_vector_doc 结构：id / ori_sent_id / ques_vector"""
+    return [
+        {
+            "op": "upsert",
+            "id": doc["id"],
+            "chunk": doc.get("ori_sent_id") or "",
+            "vec": np.asarray(doc["ques_vector"], dtype="<f4").tobytes(),
+        }
+        for doc in docs
+    ]
+
+
+def _delete_events(ids: Optional[Sequence[str]], chunk_ids: Optional[Sequence[str]]) -> list:
+    events = []
+    if ids:
+        events.append({"op": "delete", "ids": json.dumps(list(ids))})
+    if chunk_ids:
+        events.append({"op": "delete_chunk", "chunks": json.dumps(list(chunk_ids))})
+    return events
+
+
+def _append(pipe, events: list):
+    for e in events:
+        pipe.xadd(cfg.stream_key, e, maxlen=cfg.stream_maxlen, approximate=True)
+
+
+# ===================== worker 端（同步） =====================
+
+def publish_upserts(docs: Iterable[dict]):
+    if not cfg.enable:
+        return
+    try:
+        pipe = _sync().pipeline(transaction=False)
+        _append(pipe, _upsert_events(docs))
+        pipe.execute()
+    except Exception as e:
+        logger.error(f"问题向量变更写入失败（upsert）: {e}")
+
+
+def publish_deletes(ids: Optional[Sequence[str]] = None, chunk_ids: Optional[Sequence[str]] = None):
+    if not cfg.enable:
+        return
+    try:
+        pipe = _sync().pipeline(transaction=False)
+        _append(pipe, _delete_events(ids, chunk_ids))
+        pipe.execute()
+    except Exception as e:
+        logger.error(f"问题向量变更写入失败（delete）: {e}")
+
+
+# ===================== API 端（异步） =====================
+
+async def _apublish(events: list, kind: str):
+    if not events:
+        return
+    try:
+        pipe = _async().pipeline(transaction=False)
+        _append(pipe, events)
+        stream_ids = await pipe.execute()
+        replica.require(stream_ids[-1])
+    except Exception as e:
+        logger.error(f"问题向量变更写入失败（{kind}）: {e}")
+
+
+async def apublish_upserts(docs: Iterable[dict]):
+    if not cfg.enable:
+        return
+    await _apublish(_upsert_events(docs), "upsert")
+
+
+async def apublish_deletes(ids: Optional[Sequence[str]] = None, chunk_ids: Optional[Sequence[str]] = None):
+    if not cfg.enable:
+        return
+    await _apublish(_delete_events(ids, chunk_ids), "delete")
@@ -0,0 +1,178 @@
+# task/es_fun/rerank.py
+"""
+交叉编码器重排（CPU）
+
+在融合结果之后，对 (query, 段落) 逐对打分并重新排序，只把真正相关的少量段落送进 LLM：
+- 模型懒加载（sentence_transformers.CrossEncoder，默认 bge-reranker-base），仅在首次重排时加载
+- 每次最多对前 rerank.max_candidates 条打分，按 batch_size 批量推理；
+  推理放到线程池执行，信号量限制同时推理的请求数，不阻塞事件循环
+- 打分缓存：key = rr:{model_id}:{sha1(规范化查询)}:{sha1(段落内容)}，进程内 LRU + Redis TTL；
+  段落内容变化即换 key，无需额外失效
+- 重排后 score 为交叉编码器分数（0~1），原融合分保留在 score_detail["fused"]，
+  交叉编码器分同时写入 score_detail["rerank"]；超出候选上限的条目按原顺序排在后面
+"""
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import redis.asyncio as aioredis
+
+from config.settings import settings, RerankConfig
+from utils.embedding_cache import normalize_text
+from utils.logger_manager import get_logger
+from utils.metrics import record_cache, record_stage
+
+logger = get_logger("rerank")
+
+cfg: RerankConfig = settings.rerank
+
+_model = None
+_model_lock = threading.Lock()
+_semaphore: Optional[asyncio.Semaphore] = None
+_redis: Optional[aioredis.Redis] = None
+
+_local: "OrderedDict[str, float]" = OrderedDict()
+_local_lock = threading.Lock()
+
+
+def rerank_model_id() -> str:
+    return cfg.model_id or os.path.basename(os.path.normpath(cfg.model_path))
+
+
+def resolve_rerank_model_path() -> str:
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.normpath(os.path.join(base_dir, "..", "..", cfg.model_path))
+
+
+def get_reranker():
+    """懒加载交叉编码器（线程安全，只加载一次）"""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                import torch
+                from sentence_transformers import CrossEncoder
+
+                if cfg.num_threads:
+                    torch.set_num_threads(cfg.num_threads)
+                t0 = time.perf_counter()
+                _model = CrossEncoder(resolve_rerank_model_path(), max_length=cfg.max_length, device="cpu")
+                logger.info(f"重排模型已加载: {rerank_model_id()}（{time.perf_counter() - t0:.1f}s）")
+    return _model
+
+
+def _predict(pairs: List[Tuple[str, str]]) -> List[float]:
+    scores = get_reranker().predict(pairs, batch_size=cfg.batch_size, convert_to_numpy=True, show_progress_bar=False)
+    return [float(s) for s in scores]
+
+
+# ===================== 打分缓存 =====================
+
+def _cache_key(query_digest: str, content: str) -> str:
+    digest = hashlib.sha1(content.encode("utf-8")).hexdigest()
+    return f"rr:{rerank_model_id()}:{query_digest}:{digest}"
+
+
+def _redis_client() -> aioredis.Redis:
+    global _redis
+    if _redis is None:
+        _redis = aioredis.Redis.from_url(settings.vector_service.redis_backend)
+    return _redis
+
+
+def _local_get(key: str) -> Optional[float]:
+    with _local_lock:
+        score = _local.get(key)
+        if score is not None:
+            _local.move_to_end(key)
+        return score
+
+
+def _local_set(key: str, score: float):
+    with _local_lock:
+        _local[key] = score
+        _local.move_to_end(key)
+        while len(_local) > cfg.score_cache_local_size:
+            _local.popitem(last=False)
+
+
+async def _cached_scores(keys: Sequence[str]) -> List[Optional[float]]:
+    scores = [_local_get(k) for k in keys]
+    missing = [i for i, s in enumerate(scores) if s is None]
+    if missing and cfg.score_cache_ttl > 0:
+        try:
+            raws = await _redis_client().mget([keys[i] for i in missing])
+            for i, raw in zip(missing, raws):
+                if raw is not None:
+                    scores[i] = float(raw)
+                    _local_set(keys[i], scores[i])
+        except Exception as e:
+            logger.warning(f"重排缓存读取失败: {e}")
+    return scores
+
+
+async def _store_scores(items: Dict[str, float]):
+    for k, s in items.items():
+        _local_set(k, s)
+    if not items or cfg.score_cache_ttl <= 0:
+        return
+    try:
+        pipe = _redis_client().pipeline(transaction=False)
+        for k, s in items.items():
+            pipe.set(k, repr(s), ex=cfg.score_cache_ttl)
+        await pipe.execute()
+    except Exception as e:
+        logger.warning(f"重排缓存写入失败: {e}")
+
+
+# ===================== 重排 =====================
+
+async def rerank_results(query: str, results: List[dict], max_candidates: Optional[int] = None) -> Tuple[List[dict], float]:
+    """
+    对融合结果重排
+
+    :param results: merge_results 的输出（含 content / score / score_detail）
+    :param max_candidates: 参与打分的条数上限，默认 rerank.max_candidates
+    :return: (重排后的结果, 耗时毫秒)
+    """
+    global _semaphore
+    t0 = time.perf_counter()
+    limit = max_candidates or cfg.max_candidates
+    head, tail = results[:limit], results[limit:]
+    if not head:
+        return results, 0.0
+
+    query_digest = hashlib.sha1(normalize_text(query).encode("utf-8")).hexdigest()
+    keys = [_cache_key(query_digest, r["content"]) for r in head]
+    scores = await _cached_scores(keys)
+
+    todo = [i for i, s in enumerate(scores) if s is None]
+    if todo:
+        if _semaphore is None:
+            _semaphore = asyncio.Semaphore(cfg.max_concurrency)
+        async with _semaphore:
+            computed = await asyncio.to_thread(_predict, [(query, head[i]["content"]) for i in todo])
+        fresh = {}
+        for i, s in zip(todo, computed):
+            scores[i] = s
+            fresh[keys[i]] = s
+        await _store_scores(fresh)
+
+    reranked = []
+    for r, s in zip(head, scores):
+        reranked.append({
+            **r,
+            "score": round(s, 4),
+            "score_detail": {**r["score_detail"], "fused": r["score"], "rerank": round(s, 4)},
+        })
+    reranked.sort(key=lambda x: x["score"], reverse=True)
+
+    elapsed_ms = (time.perf_counter() - t0) * 1000
+    record_stage("rerank", elapsed_ms / 1000)
+    record_cache("rerank", hits=len(head) - len(todo), misses=len(todo))
+    logger.info(f"重排 {len(head)} 条（模型推理 {len(todo)} 条，缓存命中 {len(head) - len(todo)} 条）耗时 {elapsed_ms:.1f}ms")
+    return reranked + tail, elapsed_ms
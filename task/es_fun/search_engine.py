@@ -1,167 +1,411 @@
 # search_engine.py
 from collections import defaultdict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
 from elasticsearch import AsyncElasticsearch
 from config.settings import settings
-from task.gen_vector_chain import encode_text_task
-from redis import Redis
-import asyncio
-import json
+from task.gen_vector_chain import encode_text_task, encode_texts_task
+from utils.vector_result import wait_vector_result
+from utils.embedding_cache import get_embedding_cache
+from utils.logger_manager import get_logger
+from utils.metrics import stage, es_call, record_stage, record_cache, ES_ERRORS
+from task.es_fun.fusion import fuse
+from task.es_fun.local_index import get_local_replica
+from task.es_fun.es_projection import (
+    source_params,
+    source_filter,
+    QUES_HIT_FIELDS,
+    CHUNK_CONTENT_FIELDS,
+    ensure_filter_field_mappings,
+)
+
+logger = get_logger("search_engine")
 
-# 初始化 ES 客户端 & Redis 客户端
+# 初始化 ES 客户端
 es = AsyncElasticsearch(
     hosts=[settings.elasticsearch.host],
     http_auth=(settings.elasticsearch.username, settings.elasticsearch.password)
 )
-redis_client = Redis.from_url(settings.vector_service.redis_backend)
 
 KNOWLEDGE_BASE = settings.elasticsearch.knowledge_base
 QUESTION_BASE = settings.elasticsearch.question_base
 
-async def search_vector(query: str, top_k: int = 10, timeout_sec: int = 5):
-    cache_key = f"vec_cache:{query}"
-    vec = None
+_TIME_FMT = "%Y-%m-%d %H:%M:%S"
 
-    # ✅ Step 1: Redis 缓存
-    raw = redis_client.get(cache_key)
-    if raw:
-        vec = json.loads(raw)
-    else:
-        # ✅ Step 2: Celery 异步生成向量
+async def _encode_one(query: str, timeout_sec: int):
+    # Celery 异步生成向量，BLPOP 等待 worker 推送结果（worker 端负责回写缓存）
+    with stage("embed_wait"):
         task = encode_text_task.apply_async((query,), kwargs={"use_redis": True})
-        redis_key = f"vec_result:{task.id}"
+        vec = await wait_vector_result(task.id, timeout=timeout_sec)
+    if vec is None:
+        logger.warning(f"向量获取超时: {query}")
+    return vec
+
 
-        for _ in range(timeout_sec * 10):
-            raw = redis_client.get(redis_key)
-            if raw:
-                vec = json.loads(raw)
-                redis_client.set(cache_key, json.dumps(vec), ex=3600)
-                break
-            await asyncio.sleep(0.1)
+async def get_query_vector(query: str, timeout_sec: int = 5):
+    """查询向量：先查共享缓存，未命中再派发 Celery 编码任务并等待推送结果；超时返回 None"""
+    vec = None
+
+    # ✅ Step 1: 共享向量缓存（规范化文本 + 模型标识）
+    if settings.vector_service.embed_cache_enable:
+        vec = (await get_embedding_cache().aget_many([query]))[0]
+        record_cache("embed", hits=int(vec is not None), misses=int(vec is None))
 
+    # ✅ Step 2: 未命中则现编
     if vec is None:
-        print(f"❌ 向量获取超时: {query}")
-        return []
+        vec = await _encode_one(query, timeout_sec)
 
-    # ✅ 向量搜索（在 wmx_ques 中用 ques_vector）
-    vector_resp = await es.search(
-        index=QUESTION_BASE,
-        knn={
-            "field": "ques_vector",
-            "k": top_k,
-            "num_candidates": top_k * 10,
-            "query_vector": vec
-        }
-    )
+    return vec
 
-    # ✅ 提取 ori_sent_id 作为 ID，后续去 zhisk_results 反查内容
-    content_ids = list({
-        hit["_source"]["ori_sent_id"]
-        for hit in vector_resp["hits"]["hits"]
-        if "ori_sent_id" in hit["_source"]
-    })
 
-    if not content_ids:
-        return []
+# 过滤字段在各索引里的实际字段名：{字段: {具体索引名: 字段名}}，由 init_filter_fields 在启动时解析；
+# 未解析时直接用原字段名
+_filter_fields: Dict[str, Dict[str, str]] = {}
 
-    kb_resp = await es.mget(index=KNOWLEDGE_BASE, ids=content_ids)
 
-    uuid_to_content = {
-        doc["_id"]: doc["_source"]["content"]
-        for doc in kb_resp["docs"]
-        if doc["found"]
-    }
+def init_filter_fields():
+    """API 启动时调用（同步，放在线程里跑）：确保段落 / 问题索引的过滤字段 mapping，并解析实际字段名"""
+    from utils.es_client import get_es_client
 
-    return [
-        {
-            "id": hit["_source"]["ori_sent_id"],
-            "score": hit["_score"],
-            "text": uuid_to_content.get(hit["_source"]["ori_sent_id"], "[未找到原文]")
+    client = get_es_client()
+    try:
+        _filter_fields.clear()
+        _filter_fields.update(ensure_filter_field_mappings(client, [KNOWLEDGE_BASE, QUESTION_BASE]))
+        logger.info(f"检索过滤字段: {_filter_fields}")
+    except Exception as e:
+        logger.exception(f"过滤字段 mapping 初始化失败，过滤按原字段名进行: {e}")
+    finally:
+        client.close()
+
+
+def _on_field(field: str, make: Callable[[str], dict]) -> dict:
+    names = _filter_fields.get(field)
+    if not names or len(set(names.values())) == 1:
+        return make(next(iter(names.values())) if names else field)
+    # 各索引字段名不同（如旧索引里是 text + .keyword 子字段）：按 _index 分支，避免在 text 字段上误命中
+    return {
+        "bool": {
+            "should": [
+                {"bool": {"filter": [{"term": {"_index": index}}, make(name)]}}
+                for index, name in names.items()
+            ],
+            "minimum_should_match": 1,
         }
-        for hit in vector_resp["hits"]["hits"]
-        if hit["_source"]["ori_sent_id"] in uuid_to_content
-    ]
+    }
+
 
+def build_filter_clauses(
+    file_ids: Optional[List[str]] = None,
+    create_by: Optional[List[str]] = None,
+    file_types: Optional[List[str]] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+) -> list:
+    """
+    检索过滤条件 → ES filter 子句（段落与问题文档使用相同的字段名，两路共用）
+    create_time 存为 "yyyy-MM-dd HH:mm:ss"，范围边界按同一格式传入
+    字段名按 init_filter_fields 的解析结果替换（如 zhisk_file_id.keyword）
+    """
+    clauses = []
+    if file_ids:
+        clauses.append(_on_field("zhisk_file_id", lambda f: {"terms": {f: list(file_ids)}}))
+    if create_by:
+        clauses.append(_on_field("create_by", lambda f: {"terms": {f: list(create_by)}}))
+    if file_types:
+        types = [t.lower().strip(".") for t in file_types]
+        clauses.append(_on_field("file_type", lambda f: {"terms": {f: types}}))
+    if created_from or created_to:
+        rng = {}
+        if created_from:
+            rng["gte"] = created_from.strftime(_TIME_FMT)
+        if created_to:
+            rng["lte"] = created_to.strftime(_TIME_FMT)
+        clauses.append(_on_field("create_time", lambda f: {"range": {f: rng}}))
+    return clauses
 
 
+def _knn_clause(vec: list, top_k: int, candidate_multiplier: int = 10, filters: Optional[list] = None) -> dict:
+    knn = {
+        "field": "ques_vector",
+        "k": top_k,
+        "num_candidates": max(top_k, min(top_k * candidate_multiplier, settings.search.max_num_candidates)),
+        "query_vector": vec
+    }
+    if filters:
+        # 过滤在 HNSW 遍历过程中生效（先过滤后取 top-k），不会像后置过滤那样损失召回
+        knn["filter"] = {"bool": {"filter": filters}}
+    return knn
+
 
-async def search_bm25(query: str, top_k: int = 10):
-    resp = await es.search(
-        index=KNOWLEDGE_BASE,
-        size=top_k,
-        query={
-            "match": {
-                "content": {
-                    "query": query,
-                    "operator": "and"
-                }
+def _bm25_query(query: str, filters: Optional[list] = None) -> dict:
+    match = {
+        "match": {
+            "content": {
+                "query": query,
+                "operator": "and"
             }
         }
-    )
+    }
+    if not filters:
+        return match
+    return {"bool": {"must": match, "filter": filters}}
+
 
+def _bm25_hits_to_results(hits: list) -> list:
     return [
         {
             "id": hit["_id"],  # 实际为 zhisk_results 的 uuid
             "score": hit["_score"],
             "text": hit["_source"]["content"]
         }
-        for hit in resp["hits"]["hits"]
+        for hit in hits
     ]
 
 
-def merge_results(bm25_results, vector_results, alpha: float = 0.6):
-    def normalize(results, epsilon=1e-5):
-        if not results: return {}
-        scores = [r["score"] for r in results]
-        min_s, max_s = min(scores), max(scores)
-        if max_s == min_s:
-            return {r["id"]: 1.0 for r in results}
-        return {
-            r["id"]: (r["score"] - min_s + epsilon) / (max_s - min_s + epsilon)
-            for r in results
+def _vector_hits_to_results(hits: list, uuid_to_content: dict) -> list:
+    return [
+        {
+            "id": hit["_source"]["ori_sent_id"],
+            "score": hit["_score"],
+            "text": uuid_to_content.get(hit["_source"]["ori_sent_id"], "[未找到原文]")
         }
+        for hit in hits
+        if hit["_source"].get("ori_sent_id") in uuid_to_content
+    ]
 
-    bm25_results = aggregate_max_by_id(bm25_results)
-    vector_results = aggregate_max_by_id(vector_results)
-
-    bm25_norm = normalize(bm25_results)
-    vector_raw = {r["id"]: r["score"] for r in vector_results}
-    all_ids = set(bm25_norm) | set(vector_raw)
 
-    id_to_text = {
-        **{r["id"]: r["text"] for r in bm25_results},
-        **{r["id"]: r["text"] for r in vector_results}
+async def _fetch_chunk_contents(chunk_ids: list) -> dict:
+    """按 uu_id 批量反查段落内容（zhisk_results）"""
+    if not chunk_ids:
+        return {}
+    with es_call("mget"):
+        kb_resp = await es.mget(index=KNOWLEDGE_BASE, ids=chunk_ids, **source_params(CHUNK_CONTENT_FIELDS))
+    return {
+        doc["_id"]: doc["_source"]["content"]
+        for doc in kb_resp["docs"]
+        if doc["found"]
     }
 
-    merged = []
-    for _id in all_ids:
-        b_score = bm25_norm.get(_id, 0.0)
-        v_score = vector_raw.get(_id, 0.0)
-        final_score = alpha * b_score + (1 - alpha) * v_score
 
-        if b_score > 0 and v_score > 0:
-            source = "hybrid"
-        elif b_score > 0:
-            source = "bm25"
+async def search_vector(
+    query: str,
+    top_k: int = 10,
+    timeout_sec: int = 5,
+    candidate_multiplier: int = 10,
+    filters: Optional[list] = None,
+):
+    vec = await get_query_vector(query, timeout_sec)
+    if vec is None:
+        return []
+
+    # ✅ 向量搜索：本地副本可用时进程内检索，否则 ES knn（在 wmx_ques 中用 ques_vector）
+    # 本地副本不带过滤字段，有过滤条件时一律走 ES
+    replica = get_local_replica() if not filters else None
+    if replica is not None:
+        with stage("knn"):
+            hits = await replica.knn_hits(vec, top_k)
+    else:
+        with es_call("knn"):
+            vector_resp = await es.search(
+                index=QUESTION_BASE,
+                knn=_knn_clause(vec, top_k, candidate_multiplier, filters),
+                size=top_k,
+                **source_params(QUES_HIT_FIELDS)
+            )
+        hits = vector_resp["hits"]["hits"]
+
+    # ✅ 提取 ori_sent_id 作为 ID，后续去 zhisk_results 反查内容
+    content_ids = list({
+        hit["_source"]["ori_sent_id"]
+        for hit in hits
+        if "ori_sent_id" in hit["_source"]
+    })
+
+    if not content_ids:
+        return []
+
+    uuid_to_content = await _fetch_chunk_contents(content_ids)
+    return _vector_hits_to_results(hits, uuid_to_content)
+
+
+
+
+async def search_bm25(query: str, top_k: int = 10, filters: Optional[list] = None):
+    with es_call("bm25"):
+        resp = await es.search(
+            index=KNOWLEDGE_BASE,
+            size=top_k,
+            query=_bm25_query(query, filters),
+            **source_params(CHUNK_CONTENT_FIELDS)
+        )
+    return _bm25_hits_to_results(resp["hits"]["hits"])
+
+
+async def get_query_vectors(queries: List[str], timeout_sec: int = 5) -> List[Optional[list]]:
+    """
+    批量查询向量：共享缓存一次 MGET，未命中的合成一个编码任务（单条仍走 encode_text_task）
+    超时的条目为 None
+    """
+    vectors: List[Optional[list]] = [None] * len(queries)
+    if settings.vector_service.embed_cache_enable:
+        vectors = await get_embedding_cache().aget_many(queries)
+
+    miss_idx = [i for i, v in enumerate(vectors) if v is None]
+    if settings.vector_service.embed_cache_enable:
+        record_cache("embed", hits=len(queries) - len(miss_idx), misses=len(miss_idx))
+    if len(miss_idx) == 1:
+        vectors[miss_idx[0]] = await _encode_one(queries[miss_idx[0]], timeout_sec)
+    elif miss_idx:
+        with stage("embed_wait"):
+            task = encode_texts_task.apply_async(([queries[i] for i in miss_idx],), kwargs={"use_redis": True})
+            fresh = await wait_vector_result(task.id, timeout=timeout_sec)
+        if fresh is not None:
+            for i, vec in zip(miss_idx, fresh):
+                vectors[i] = vec
+        else:
+            logger.warning(f"批量向量获取超时: {len(miss_idx)} 条")
+    return vectors
+
+
+def _hits(resp: dict, label: str, stage_name: str) -> list:
+    if "error" in resp:
+        ES_ERRORS.labels(stage_name).inc()
+        raise RuntimeError(f"{label}检索失败: {resp['error']}")
+    # 同一个 msearch 里两路并行执行，分阶段耗时取 ES 自报的 took
+    if "took" in resp:
+        record_stage(stage_name, resp["took"] / 1000)
+    return resp["hits"]["hits"]
+
+
+async def search_hybrid(
+    query: str,
+    use_bm25: bool = True,
+    use_vector: bool = True,
+    alpha: float = 0.6,
+    top_k: int = 10,
+    timeout_sec: int = 5,
+    candidate_multiplier: int = 10,
+    fusion: str = "legacy",
+    rrf_k: int = 60,
+    filters: Optional[list] = None,
+):
+    """
+    单次往返的混合检索：
+    - BM25（zhisk_results）与 knn（wmx_ques）放进同一个 _msearch 请求；本地向量副本可用时 knn 改为进程内检索
+    - knn 命中的段落内容优先复用 BM25 命中里已有的 content，只有缺失的才补一次 mget
+    - 融合逻辑与 merge_results 相同，返回结构与 SearchResult 一致
+    - top_k 同时作为 BM25 size、knn k 与融合后的截断条数（翻页时由调用方传入召回深度）
+    - filters 为 build_filter_clauses 的结果，同时进入 BM25 的 bool.filter 与 knn.filter
+
+    BM25 与向量分属两个索引（向量在问题索引上，内容在段落索引上），
+    无法用单索引的 query + knn / RRF 原生融合，因此采用 msearch。
+    """
+    results = await search_hybrid_batch(
+        [query],
+        use_bm25=use_bm25,
+        use_vector=use_vector,
+        alpha=alpha,
+        top_k=top_k,
+        timeout_sec=timeout_sec,
+        candidate_multiplier=candidate_multiplier,
+        fusion=fusion,
+        rrf_k=rrf_k,
+        filters=filters,
+    )
+    return results[0]
+
+
+async def search_hybrid_batch(
+    queries: List[str],
+    use_bm25: bool = True,
+    use_vector: bool = True,
+    alpha: float = 0.6,
+    top_k: int = 10,
+    timeout_sec: int = 5,
+    candidate_multiplier: int = 10,
+    fusion: str = "legacy",
+    rrf_k: int = 60,
+    filters: Optional[list] = None,
+) -> List[list]:
+    """
+    多条查询的混合检索，固定开销与查询条数无关：
+    - 向量：一次缓存 MGET + 一个批量编码任务
+    - 检索：所有查询的 BM25 与 knn 放进同一个 _msearch
+    - 内容：所有 knn 命中里缺失的段落合并为一次 mget
+    返回与 queries 等长的列表，每项为该查询的融合结果
+    """
+    vectors = await get_query_vectors(queries, timeout_sec) if use_vector else [None] * len(queries)
+
+    # 本地向量副本可用时 knn 在进程内完成，msearch 里只剩 BM25（副本不带过滤字段，有过滤条件时不用）
+    replica = get_local_replica() if use_vector and not filters else None
+    with stage("knn"):
+        local_knn = [
+            await replica.knn_hits(vec, top_k) if replica is not None and vec is not None else None
+            for vec in vectors
+        ] if replica is not None else [None] * len(vectors)
+
+    searches = []
+    for q, vec, local in zip(queries, vectors, local_knn):
+        if use_bm25:
+            searches += [{"index": KNOWLEDGE_BASE}, {
+                "size": top_k,
+                "query": _bm25_query(q, filters),
+                "_source": source_filter(CHUNK_CONTENT_FIELDS),
+            }]
+        if vec is not None and local is None:
+            searches += [{"index": QUESTION_BASE}, {
+                "size": top_k,
+                "knn": _knn_clause(vec, top_k, candidate_multiplier, filters),
+                "_source": source_filter(QUES_HIT_FIELDS),
+            }]
+
+    msearch_resp = {"responses": []}
+    if searches:
+        with es_call("msearch"):
+            msearch_resp = await es.msearch(searches=searches)
+    responses = iter(msearch_resp["responses"])
+
+    per_query = []
+    uuid_to_content = {}
+    for vec, local in zip(vectors, local_knn):
+        bm25_hits = _hits(next(responses), "BM25 ", "bm25") if use_bm25 else []
+        if local is not None:
+            knn_hits = local
+        elif vec is not None:
+            knn_hits = _hits(next(responses), "向量", "knn")
         else:
-            source = "vector"
-
-        merged.append({
-            "id": _id,
-            "content": id_to_text.get(_id, ""),
-            "score": round(final_score, 4),
-            "score_detail": {
-                "bm25": round(b_score, 4),
-                "vector": round(v_score, 4)
-            },
-            "source": source
-        })
-
-    return sorted(merged, key=lambda x: x["score"], reverse=True)[:10]
-
-
-def aggregate_max_by_id(results):
-    merged = {}
-    for r in results:
-        if r["id"] not in merged or r["score"] > merged[r["id"]]["score"]:
-            merged[r["id"]] = r
-    return list(merged.values())
\ No newline at end of file
+            knn_hits = []
+        bm25_results = _bm25_hits_to_results(bm25_hits)
+        uuid_to_content.update((r["id"], r["text"]) for r in bm25_results)
+        per_query.append((bm25_results, knn_hits))
+
+    missing = list({
+        hit["_source"]["ori_sent_id"]
+        for _, knn_hits in per_query
+        for hit in knn_hits
+        if hit["_source"].get("ori_sent_id") and hit["_source"]["ori_sent_id"] not in uuid_to_content
+    })
+    if missing:
+        uuid_to_content.update(await _fetch_chunk_contents(missing))
+
+    return [
+        merge_results(
+            bm25_results,
+            _vector_hits_to_results(knn_hits, uuid_to_content),
+            alpha=alpha, top_k=top_k, strategy=fusion, rrf_k=rrf_k,
+        )
+        for bm25_results, knn_hits in per_query
+    ]
+
+
+def merge_results(
+    bm25_results,
+    vector_results,
+    alpha: float = 0.6,
+    top_k: Optional[int] = 10,
+    strategy: str = "legacy",
+    rrf_k: int = 60,
+):
+    """融合两路结果，见 task/es_fun/fusion.py；strategy="legacy" 与原先的实现结果一致"""
+    with stage("fusion"):
+        return fuse(bm25_results, vector_results, alpha=alpha, top_k=top_k, strategy=strategy, rrf_k=rrf_k)
@@ -1,7 +1,154 @@
+import json
+import time
+from typing import List, Optional
+
+from elastic_transport import TransportError
+from elasticsearch.helpers import BulkIndexError, streaming_bulk
+from config.settings import settings
 from utils.es_client import get_es_client
 from utils.logger_manager import get_logger
 es = get_es_client()
 
+
+# 可重试的单条失败：限流 / 服务端暂不可用；连接断开、超时等传输层异常整块重试
+_RETRYABLE_STATUS = {429, 502, 503, 504}
+
+
+class BulkIndexer:
+    """
+    缓冲式 _bulk 写入器：
+
+        with BulkIndexer() as bi:
+            bi.add(index_chunk, doc, doc_id=doc["uu_id"])
+        # 退出时 flush 剩余文档；仍有失败条目则抛 BulkIndexError（errors 为逐条失败信息）
+
+    - 缓冲条数 / 估算字节数 / 距第一条缓冲的时间，任一达到阈值即 flush（时间阈值在下一次 add 时检查）
+    - 单条失败逐条记录；只有可重试的条目（429 / 5xx / 连接异常）按指数退避重发，映射错误等直接记为失败
+    - 不同索引的文档可以混在同一个写入器里
+    阈值默认取 elasticsearch.bulk
+    """
+
+    def __init__(
+        self,
+        client=None,
+        max_docs: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        flush_interval_sec: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        refresh=False,
+        raise_on_error: bool = True,
+    ):
+        cfg = settings.elasticsearch.bulk
+        self.client = client or es
+        self.max_docs = max_docs or cfg.max_docs
+        self.max_bytes = max_bytes or cfg.max_bytes
+        self.flush_interval_sec = cfg.flush_interval_sec if flush_interval_sec is None else flush_interval_sec
+        self.max_retries = cfg.max_retries if max_retries is None else max_retries
+        self.retry_backoff_sec = cfg.retry_backoff_sec
+        self.refresh = refresh
+        self.raise_on_error = raise_on_error
+
+        self._buffer: List[dict] = []
+        self._bytes = 0
+        self._first_at: Optional[float] = None
+
+        self.indexed = 0
+        self.errors: List[dict] = []
+        self._logger = get_logger("bulk_indexer")
+
+    def add(self, index_name: str, doc: dict, doc_id: Optional[str] = None):
+        action = {"_index": index_name, "_source": doc}
+        if doc_id is not None:
+            action["_id"] = doc_id
+        self._buffer.append(action)
+        self._bytes += len(json.dumps(doc, ensure_ascii=False, default=str).encode("utf-8"))
+        if self._first_at is None:
+            self._first_at = time.monotonic()
+
+        if (
+            len(self._buffer) >= self.max_docs
+            or self._bytes >= self.max_bytes
+            or time.monotonic() - self._first_at >= self.flush_interval_sec
+        ):
+            self.flush()
+
+    def flush(self) -> int:
+        """写出缓冲区，返回本次成功条数；失败条目累积到 self.errors"""
+        actions, self._buffer, self._bytes, self._first_at = self._buffer, [], 0, None
+        indexed = 0
+        attempt = 0
+        while actions:
+            retry = []
+            results = []
+            transport_error = None
+            try:
+                for result in self._send(actions):
+                    results.append(result)
+            except TransportError as e:
+                # 尚未拿到结果的条目按“连接异常”处理
+                transport_error = e
+            results += [(False, {"index": {"status": None, "error": str(transport_error)}})] * (len(actions) - len(results))
+
+            for action, (ok, item) in zip(actions, results):
+                if ok:
+                    indexed += 1
+                    continue
+                info = next(iter(item.values()))
+                status = info.get("status")
+                if (status is None or status in _RETRYABLE_STATUS) and attempt < self.max_retries:
+                    retry.append(action)
+                else:
+                    self.errors.append({
+                        "index": action["_index"],
+                        "id": action.get("_id"),
+                        "status": status,
+                        "error": info.get("error"),
+                    })
+            if retry:
+                attempt += 1
+                wait = self.retry_backoff_sec * (2 ** (attempt - 1))
+                self._logger.warning(f"[ES] _bulk {len(retry)} 条写入失败，{wait:.1f}s 后重试（第 {attempt} 次）")
+                time.sleep(wait)
+            actions = retry
+
+        self.indexed += indexed
+        return indexed
+
+    def _send(self, actions: List[dict]):
+        # streaming_bulk 内置的 429 重试会打乱返回顺序，这里关掉，由 flush 按原顺序对齐后自行重试
+        return streaming_bulk(
+            self.client,
+            actions,
+            chunk_size=len(actions),
+            max_chunk_bytes=self.max_bytes + 1024 * 1024,
+            raise_on_error=False,
+            raise_on_exception=False,
+            max_retries=0,
+            refresh=self.refresh,
+        )
+
+    def close(self):
+        self.flush()
+        if self.errors:
+            self._logger.error(f"[ES] _bulk 共 {len(self.errors)} 条写入失败，首条: {self.errors[0]}")
+            if self.raise_on_error:
+                raise BulkIndexError(f"{len(self.errors)} document(s) failed to index.", self.errors)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        elif self._buffer:
+            # 已经在抛异常：尽量写出已缓冲的文档，但不掩盖原异常
+            try:
+                self.flush()
+            except Exception as e:
+                self._logger.warning(f"[ES] 异常退出时 flush 失败: {e}")
+        return False
+
+
 def insert_file_meta_to_es(index_name: str, file_meta: dict):
     logger = get_logger("insert_file_meta_to_es")
     logger.info(f"[ES] PUT {index_name} doc_id={file_meta.get('zhisk_file_id')}")
@@ -30,14 +177,81 @@ def insert_chunk_to_es(index_name: str, chunk_doc: dict):
 
     es.index(index=index_name, id=chunk_doc["uu_id"], document=chunk_doc)
 
-def insert_question_vector_to_es(index_name: str, doc: dict):
+def insert_question_vector_to_es(index_name: str, doc: dict, refresh=False):
     """
     向 ES 写入一条符合 wmx_ques 的问题向量文档
 
     :param index_name: 索引名，如 "wmx_ques"
     :param doc: 字段需包含 id、ori_sent_id、ori_ques_sent、ques_vector
+    :param refresh: 透传给 index；"wait_for" 表示写入对检索可见后再返回
     """
     if "id" not in doc:
         raise ValueError("doc must contain 'id'")
 
-    es.index(index=index_name, id=doc["id"], document=doc)
\ No newline at end of file
+    es.index(index=index_name, id=doc["id"], document=doc, refresh=refresh)
+
+
+def bulk_insert_question_vectors_to_es(index_name: str, docs: list, refresh=False) -> int:
+    """
+    批量写入问题向量文档（一次 _bulk 请求）
+
+    :param index_name: 索引名，如 "wmx_ques"
+    :param docs: build_question_vector_doc 构造的文档列表，每条需包含 id
+    :param refresh: 透传给 _bulk；"wait_for" 表示等到下一次 refresh 后再返回（写入对检索可见）
+    :return: 成功写入条数
+    """
+    if not docs:
+        return 0
+    for doc in docs:
+        if "id" not in doc:
+            raise ValueError("doc must contain 'id'")
+
+    with BulkIndexer(refresh=refresh) as indexer:
+        for doc in docs:
+            indexer.add(index_name, doc, doc_id=doc["id"])
+    return indexer.indexed
+
+
+def delete_stale_question_docs(index_name: str, chunk_ids: list, keep_ids: list) -> int:
+    """
+    删除这些段落下、不在 keep_ids 中的问题文档（重新生成问题后旧问题的 ID 不同，按 ID 覆盖不掉）
+
+    :param index_name: 索引名，如 "wmx_ques"
+    :param chunk_ids: 段落 uu_id 列表（问题文档的 ori_sent_id）
+    :param keep_ids: 本次将要写入的问题文档 ID，不删除
+    :return: 删除条数
+    """
+    if not chunk_ids:
+        return 0
+    resp = es.delete_by_query(
+        index=index_name,
+        query={"bool": {
+            "filter": [{"terms": {"ori_sent_id": list(chunk_ids)}}],
+            "must_not": [{"ids": {"values": list(keep_ids)}}],
+        }},
+        conflicts="proceed",
+    )
+    return resp.get("deleted", 0)
+
+
+def delete_docs_by_ids(index_name: str, doc_ids: list) -> int:
+    """
+    按 _id 批量删除文档（不存在的忽略）
+
+    :param index_name: 索引名
+    :param doc_ids: 文档 _id 列表
+    :return: 删除条数
+    """
+    if not doc_ids:
+        return 0
+    resp = es.delete_by_query(
+        index=index_name,
+        query={"ids": {"values": list(doc_ids)}},
+        conflicts="proceed",
+    )
+    return resp.get("deleted", 0)
+
+
+def refresh_index(index_name: str):
+    """显式 refresh，使此前写入的文档立即对检索可见"""
+    es.indices.refresh(index=index_name)
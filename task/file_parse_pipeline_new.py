@@ -1,28 +1,44 @@
 # task/file_parse_pipeline_new.py
 # -*- coding: utf-8 -*-
 
+import io
+import itertools
 import os
 import uuid
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Iterator, List, Optional
 from celery import chain
+from elasticsearch.helpers import BulkIndexError
 
 from config.settings import settings
 from task.celery_app import celery_app
-from task.splitter_loader import LOADER_MAP, SPLITTER_MAP
-from task.gen_ques import generate_questions_task
-from task.gen_vector_chain import encode_text_task
+from task.splitter_loader import LOADER_MAP, SPLITTER_MAP, ITER_LOADER_MAP, iter_split
+from task.gen_ques import generate_questions_task, generate_questions
+from task.gen_vector_chain import encode_text_task, encode_texts
 from utils.logger_manager import get_logger
 from task.pg_fun.file_writer import insert_file_info, update_zhisk_rows
-from task.pg_fun.chunk_writer import insert_chunk_to_pg
-from task.pg_fun.vector_writer import insert_ques_batch_task
+from task.pg_fun.chunk_writer import insert_chunks_to_pg, delete_chunks_from_pg
+from task.pg_fun.vector_writer import insert_ques_batch_task, replace_ques_rows
 from task.common.wrap_utils import wrap_vector_as_list
+from utils.task_utils import NonRetryableLoaderError
 
 # ES 写入函数
 from task.es_fun.writer import (
+    BulkIndexer,
     insert_file_meta_to_es,
-    insert_chunk_to_es,
     insert_question_vector_to_es,
+    bulk_insert_question_vectors_to_es,
+    delete_stale_question_docs,
+    delete_docs_by_ids,
+    refresh_index,
 )
+from utils.search_cache import (
+    bump_index_generation,
+    request_index_generation_bump,
+    flush_pending_generation_bump,
+)
+from task.es_fun.qvec_changes import publish_upserts, publish_deletes
 
 # ES 文档构建
 from utils.es_meta_build import (
@@ -80,6 +96,7 @@ def _default_split_text(text: str, chunk_size: int = 800, overlap: int = 120) ->
     bind=True,
     max_retries=3,
     autoretry_for=(Exception,),
+    dont_autoretry_for=(NonRetryableLoaderError,),
 )
 def parse_file_and_enqueue_chunks(
     self,
@@ -121,6 +138,21 @@ def parse_file_and_enqueue_chunks(
         used_pdf_ocr = False
         ext_l = (ext or "").lower().strip(".")
 
+        # ===== 流式模式：逐页加载 → 增量分段 → 分批写入并派发 =====
+        if settings.task_defaults.ingest_streaming:
+            return _parse_file_streaming(
+                file_path,
+                ext_l,
+                create_by,
+                original_name,
+                zhisk_file_id,
+                use_pg=use_pg,
+                use_es=use_es,
+                enable_pdf_ocr=enable_pdf_ocr,
+                ocr_lang=ocr_lang,
+                ocr_dpi=ocr_dpi,
+            )
+
         if enable_pdf_ocr and ext_l in ({"pdf"} | _IMAGE_EXTS):
             try:
                 with open(file_path, "rb") as f:
@@ -190,6 +222,9 @@ def parse_file_and_enqueue_chunks(
             _log.warning(msg)
             return {"status": "skipped", "reason": msg}
 
+        # 文件元信息与段落共用一个批量写入器（条数 / 字节 / 时间阈值见 elasticsearch.bulk）
+        indexer = BulkIndexer() if use_es else None
+
         # ===== D) 写文件级元信息到 ES（可审计 used_pdf_ocr）=====
         if use_es:
             _log.info(f"[ES] 写入文件元信息: {index_file}")
@@ -202,48 +237,75 @@ def parse_file_and_enqueue_chunks(
                 original_name,
             )
             file_meta["used_pdf_ocr"] = used_pdf_ocr  # 标注是否用了 OCR
-            insert_file_meta_to_es(index_file, file_meta)
+            indexer.add(index_file, file_meta, doc_id=zhisk_file_id)
 
-        # ===== E) 逐 chunk 入库 + 下游链路 =====
+        # ===== E) 逐 chunk 入库；段落全部写入 ES 后再派发下游链路 =====
+        # 段落与其问题文档共用同一个 create_time（按时间过滤时两者一致）
+        create_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        chunk_ids = []
         for c in chunks:
             uu_id = str(uuid.uuid4())
 
-            if use_pg:
-                insert_chunk_to_pg(
-                    zhisk_file_id,
-                    uu_id,
-                    c.page_content,
-                    ori_json=getattr(c, "metadata", {}) or {},
-                )
-
             if use_es:
-                _log.info(f"[ES] 写入段落: {index_chunk}")
                 chunk_doc = build_chunk_doc(
                     zhisk_file_id,
                     c.page_content,
                     uu_id=uu_id,
                     create_by=create_by,
+                    file_type=ext_l,
+                    create_time=create_time,
                 )
                 chunk_doc["used_pdf_ocr"] = used_pdf_ocr
-                insert_chunk_to_es(index_chunk, chunk_doc)
+                indexer.add(index_chunk, chunk_doc, doc_id=uu_id)
 
-            build_chunk_chain(
-                c.page_content,
-                uu_id,
-                zhisk_file_id,
-                use_pg=use_pg,
-                use_es=use_es,
-            ).apply_async()
+            chunk_ids.append(uu_id)
+
+        # PG：整个文件的段落一次 COPY、一个事务
+        if use_pg:
+            insert_chunks_to_pg(zhisk_file_id, [
+                (uu_id, c.page_content, getattr(c, "metadata", {}) or {})
+                for c, uu_id in zip(chunks, chunk_ids)
+            ])
+
+        # 剩余缓冲写出；仍有失败条目时抛 BulkIndexError，不为未入库的段落生成问题
+        if use_es:
+            indexer.close()
+            _log.info(f"[ES] 写入文件元信息 + 段落 {indexer.indexed} 条: {index_file} / {index_chunk}")
+
+        # ===== F) 下游：问题生成 + 向量入库 =====
+        dispatch_downstream(
+            [
+                {
+                    "file_id": zhisk_file_id,
+                    "chunk_id": uu_id,
+                    "text": c.page_content,
+                    "create_by": create_by,
+                    "file_type": ext_l,
+                    "create_time": create_time,
+                }
+                for c, uu_id in zip(chunks, chunk_ids)
+            ],
+            use_pg=use_pg,
+            use_es=use_es,
+        )
 
         if use_pg:
             update_zhisk_rows(zhisk_file_id, len(chunks))
 
+        # 段落已可检索后再递增索引代际，使 /es_hybrid_search 的旧缓存失效
+        if use_es:
+            refresh_index(index_chunk)
+            bump_index_generation(f"parse.file {zhisk_file_id}")
+
         return {
             "status": "dispatched",
             "chunks": len(chunks),
             "used_pdf_ocr": used_pdf_ocr,
         }
 
+    except NonRetryableLoaderError:
+        raise
+
     except Exception as e:
         _log.exception(f"文档处理异常: {e}")
         raise self.retry(exc=e)
@@ -257,8 +319,298 @@ def parse_file_and_enqueue_chunks(
             logger.warning(f"临时文件删除失败: {e}")
 
 
-def build_chunk_chain(text: str, uu_id: str, file_id: str, use_pg: bool = False, use_es: bool = True):
-    """保持你现有的问题生成 → 向量编码 → 入库链路不变"""
+def _make_doc(text: str, metadata: dict):
+    if Document is None:
+        class _Doc:
+            def __init__(self, page_content: str, metadata=None):
+                self.page_content = page_content
+                self.metadata = metadata or {}
+        return _Doc(text, metadata)
+    return Document(page_content=text, metadata=metadata)
+
+
+def _iter_ocr_docs(file_path: str, ext_l: str, original_name: str, ocr_lang: str, ocr_dpi: int) -> Iterator:
+    """
+    流式 OCR：PDF 按 ocr_pages_per_request 页切成小 PDF 逐段请求，每段结果产出一个 Document；
+    图片只有一页，整张送一次。空结果的段不产出
+    首段失败直接抛出（由 _peek 回退到 loader）；之后某段 OCR 失败时，该段及其后各页改用 pypdf 文本提取，
+    不再请求 OCR 服务（避免服务故障时每段都等满超时）
+    """
+    if ext_l != "pdf":
+        with open(file_path, "rb") as f:
+            raw = f.read()
+        text = ocr_image_bytes(
+            _OCR_BASE,
+            raw,
+            lang=ocr_lang,
+            timeout=120,
+            filename_hint=f"image.{ext_l}",
+            mime_hint="application/octet-stream",
+        )
+        if text and text.strip():
+            yield _make_doc(text, {"source": original_name})
+        return
+
+    from pypdf import PdfReader, PdfWriter
+
+    reader = PdfReader(file_path)
+    total = len(reader.pages)
+    step = max(settings.task_defaults.ocr_pages_per_request, 1)
+    ocr_ok, first = True, True
+    for start in range(0, total, step):
+        pages = range(start, min(start + step, total))
+        text = None
+        if ocr_ok:
+            writer = PdfWriter()
+            for i in pages:
+                writer.add_page(reader.pages[i])
+            buf = io.BytesIO()
+            writer.write(buf)
+            try:
+                text = ocr_pdf_bytes(
+                    _OCR_BASE,
+                    buf.getvalue(),
+                    lang=ocr_lang,
+                    dpi=int(ocr_dpi or 200),
+                    timeout=120,
+                )
+            except OCRClientError as e:
+                if first:
+                    raise
+                get_logger("parse_file_and_enqueue_chunks").error(
+                    f"[OCR] 第 {start + 1} 页起 OCR 失败，剩余页改用文本提取：{e}"
+                )
+                ocr_ok = False
+        if not ocr_ok:
+            text = "\n".join(reader.pages[i].extract_text() or "" for i in pages)
+        first = False
+        if text and text.strip():
+            yield _make_doc(text, {"source": original_name, "page": start})
+
+
+def _peek(docs: Iterator) -> Optional[Iterator]:
+    """取到第一个 Document 才算 OCR 可用；首段就失败 / 全部为空时返回 None，由调用方回退 loader"""
+    _log = get_logger("parse_file_and_enqueue_chunks")
+    try:
+        first = next(docs)
+    except StopIteration:
+        _log.warning("[OCR] 结果为空，回退原逻辑")
+        return None
+    except OCRClientError as e:
+        _log.error(f"[OCR] 外部服务调用失败：{e}")
+        return None
+    except Exception as e:
+        _log.exception(f"[OCR] 未知异常：{e}")
+        return None
+    return itertools.chain([first], docs)
+
+
+def _parse_file_streaming(
+    file_path: str,
+    ext_l: str,
+    create_by: str,
+    original_name: str,
+    zhisk_file_id: str,
+    *,
+    use_pg: bool,
+    use_es: bool,
+    enable_pdf_ocr: bool = False,
+    ocr_lang: str = "ch",
+    ocr_dpi: int = 200,
+) -> dict:
+    """
+    parse.file 的流式版本（task_defaults.ingest_streaming）：
+    loader 逐页 / 逐块产出 → iter_split 增量分段 → 每 stream_batch_chunks 个段落一批：
+    PG 一次 COPY、ES 一次 _bulk、递增索引代际、派发下游。
+    内存只与单页和单批段落相关；前面的批次在后面的页还在解析时就已可检索。
+
+    文件元信息先以 status=processing 写入，全部段落写完后更新为 done 与最终段落数；
+    中途失败（后续页解析 / OCR / 写入异常）时已提交的批次无法撤回（下游任务已派发），
+    文件标记为 failed 并记录已写入的段落数，然后以 NonRetryableLoaderError 结束，
+    不重试（临时文件随后删除，且重跑会以新的 zhisk_file_id 重复写入）。
+    """
+    _log = get_logger("parse_file_and_enqueue_chunks")
+    defaults = settings.task_defaults
+
+    docs, used_pdf_ocr = None, False
+    if enable_pdf_ocr and ext_l in ({"pdf"} | _IMAGE_EXTS):
+        docs = _peek(_iter_ocr_docs(file_path, ext_l, original_name, ocr_lang, ocr_dpi))
+        used_pdf_ocr = docs is not None
+
+    if docs is None:
+        if ext_l not in ITER_LOADER_MAP:
+            msg = f"暂不支持的文件类型: .{ext_l}"
+            _log.warning(msg)
+            return {"status": "skipped", "reason": msg}
+        docs = ITER_LOADER_MAP[ext_l](file_path)
+
+    indexer = BulkIndexer() if use_es else None
+    file_meta = None
+    if use_es:
+        file_meta = build_file_meta(zhisk_file_id, file_path, ext_l, 0, create_by, original_name)
+        file_meta["used_pdf_ocr"] = used_pdf_ocr
+        file_meta["status"] = "processing"
+        insert_file_meta_to_es(index_file, file_meta)
+
+    total, batches = 0, 0
+
+    def _flush(batch: list):
+        create_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        if use_pg:
+            insert_chunks_to_pg(zhisk_file_id, [
+                (uu_id, c.page_content, getattr(c, "metadata", {}) or {})
+                for uu_id, c in batch
+            ])
+        if use_es:
+            try:
+                for uu_id, c in batch:
+                    chunk_doc = build_chunk_doc(
+                        zhisk_file_id,
+                        c.page_content,
+                        uu_id=uu_id,
+                        create_by=create_by,
+                        file_type=ext_l,
+                        create_time=create_time,
+                    )
+                    chunk_doc["used_pdf_ocr"] = used_pdf_ocr
+                    indexer.add(index_chunk, chunk_doc, doc_id=uu_id)
+                indexer.flush()
+                if indexer.errors:
+                    raise BulkIndexError(f"{len(indexer.errors)} document(s) failed to index.", indexer.errors)
+            except Exception:
+                _rollback(batch)
+                raise
+            bump_generation_debounced(f"parse.file {zhisk_file_id} batch")
+
+        dispatch_downstream(
+            [
+                {
+                    "file_id": zhisk_file_id,
+                    "chunk_id": uu_id,
+                    "text": c.page_content,
+                    "create_by": create_by,
+                    "file_type": ext_l,
+                    "create_time": create_time,
+                }
+                for uu_id, c in batch
+            ],
+            use_pg=use_pg,
+            use_es=use_es,
+        )
+
+    def _rollback(batch: list):
+        # 该批 ES 写入失败：撤销已提交的 PG 段落和 ES 中已写入的部分，使 total 与两侧实际段落数一致
+        uu_ids = [uu_id for uu_id, _ in batch]
+        try:
+            if use_pg:
+                delete_chunks_from_pg(uu_ids)
+            delete_docs_by_ids(index_chunk, uu_ids)
+        except Exception as e:
+            _log.exception(f"[{zhisk_file_id}] 撤销失败批次的段落出错，以下段落可能残留: {uu_ids}: {e}")
+
+    def _finish(status: str, error: str = None):
+        # 文件级状态与段落数；段落为空时同样记录，避免留下 processing 状态的元信息
+        if use_es:
+            file_meta.update(zhisk_rows=total, status=status)
+            if error:
+                file_meta["error"] = error[:500]
+            insert_file_meta_to_es(index_file, file_meta)
+        if use_pg:
+            update_zhisk_rows(zhisk_file_id, total)
+
+    batch = []
+    try:
+        for c in iter_split("pdf" if used_pdf_ocr else ext_l, docs):
+            batch.append((str(uuid.uuid4()), c))
+            if len(batch) >= defaults.stream_batch_chunks:
+                _flush(batch)
+                total += len(batch)
+                batches += 1
+                _log.info(f"[{zhisk_file_id}] 已写入 {total} 个段落（第 {batches} 批）")
+                batch = []
+        if batch:
+            _flush(batch)
+            total += len(batch)
+            batches += 1
+    except Exception as e:
+        _log.exception(f"[{zhisk_file_id}] 流式解析在第 {batches + 1} 批失败，已写入 {total} 个段落: {e}")
+        try:
+            _finish("failed", str(e))
+            if use_es and total:
+                refresh_index(index_chunk)
+                bump_index_generation(f"parse.file {zhisk_file_id} failed")
+        except Exception as mark_err:
+            _log.exception(f"[{zhisk_file_id}] 标记失败状态出错: {mark_err}")
+        raise NonRetryableLoaderError(f"流式解析失败（已写入 {total} 个段落）: {e}") from e
+
+    if not total:
+        _finish("empty")
+        msg = "文档分段为空，跳过处理"
+        _log.warning(msg)
+        return {"status": "skipped", "reason": msg}
+
+    _finish("done")
+
+    if use_es:
+        refresh_index(index_chunk)
+        bump_index_generation(f"parse.file {zhisk_file_id}")
+
+    return {
+        "status": "dispatched",
+        "chunks": total,
+        "batches": batches,
+        "used_pdf_ocr": used_pdf_ocr,
+        "streaming": True,
+    }
+
+
+def dispatch_downstream(items: list, use_pg: bool = True, use_es: bool = True):
+    """
+    段落下游（问题生成 + 向量入库）：ingest_mode=batch 时一批段落一个任务，否则每段落一条链
+    items: [{"file_id", "chunk_id", "text", "create_by"?, "file_type"?, "create_time"?}, ...]
+    """
+    if settings.task_defaults.ingest_mode == "batch":
+        dispatch_chunk_batches(items, use_pg=use_pg, use_es=use_es)
+        return
+    for item in items:
+        build_chunk_chain(
+            item["text"],
+            item["chunk_id"],
+            item["file_id"],
+            use_pg=use_pg,
+            use_es=use_es,
+            create_by=item.get("create_by"),
+            file_type=item.get("file_type"),
+            create_time=item.get("create_time"),
+        ).apply_async()
+
+
+def bump_generation_debounced(reason: str):
+    """入库高频写入后的索引代际递增（延迟 + 合并，见 utils/search_cache.request_index_generation_bump）"""
+    delay = request_index_generation_bump(reason)
+    if delay is not None:
+        flush_generation_bump.apply_async((reason,), countdown=delay)
+
+
+@celery_app.task(name="index.bump_generation")
+def flush_generation_bump(reason: str = ""):
+    delay = flush_pending_generation_bump(f"{reason} (debounced)")
+    if delay is not None:
+        # 递增前的最后一段时间内仍有写入：refresh 之后再补一次
+        flush_generation_bump.apply_async((reason,), countdown=delay)
+
+
+def build_chunk_chain(
+    text: str,
+    uu_id: str,
+    file_id: str,
+    use_pg: bool = False,
+    use_es: bool = True,
+    create_by: str = None,
+    file_type: str = None,
+    create_time: str = None,
+):
+    """保持你现有的问题生成 → 向量编码 → 入库链路不变（create_by / file_type / create_time 冗余写入问题文档，供检索过滤）"""
     return chain(
         generate_questions_task.s(text),
         encode_questions_and_store.s(
@@ -266,46 +618,198 @@ def build_chunk_chain(text: str, uu_id: str, file_id: str, use_pg: bool = False,
             chunk_id=uu_id,
             use_pg=use_pg,
             use_es=use_es,
+            create_by=create_by,
+            file_type=file_type,
+            create_time=create_time,
         ),
     )
 
 
+def _encode_and_store(items: list, use_pg: bool = True, use_es: bool = True) -> int:
+    """
+    批量“编码 + 入库”：
+    - items: [{"file_id": ..., "chunk_id": ..., "questions": [...], "create_by"?, "file_type"?, "create_time"?}, ...]
+    - 所有问题一次性送入模型编码；PG / ES 各一次批量写入
+    - 每条问题都保留 (chunk_id, question, vector) 的对应关系
+    - 幂等：ES 文档 ID 由 (chunk_id, question) 确定性生成，PG 按段落先删后写，任务重试不会产生重复问题；
+      ES 中这些段落下不在本次结果里的旧问题（如 ingest.chunk_batch 整体重试后重新生成）在写入前删除
+    :return: 写入的问题条数
+    """
+    # 同一段落内重复的问题只保留一条（ES 按 ID 会合并，PG 也保持一致）
+    pairs = list(dict.fromkeys(
+        (item["chunk_id"], q)
+        for item in items
+        for q in (item.get("questions") or [])
+        if q and q.strip()
+    ))
+    meta = {
+        item["chunk_id"]: {
+            "zhisk_file_id": item.get("file_id"),
+            "create_by": item.get("create_by"),
+            "file_type": item.get("file_type"),
+            "create_time": item.get("create_time"),
+        }
+        for item in items
+    }
+    if not pairs:
+        return 0
+
+    vectors = encode_texts([q for _, q in pairs])
+
+    if use_pg:
+        replace_ques_rows([
+            (chunk_id, q, vec)
+            for (chunk_id, q), vec in zip(pairs, vectors)
+        ])
+
+    if use_es:
+        docs = [
+            build_question_vector_doc(ori_sent_id=chunk_id, ori_ques_sent=q, vector=vec, **meta[chunk_id])
+            for (chunk_id, q), vec in zip(pairs, vectors)
+        ]
+        # 与 PG 的按段落替换一致：本次要写入的 ID 保留（随后覆盖），其余旧问题删除
+        chunk_ids = list(dict.fromkeys(chunk_id for chunk_id, _ in pairs))
+        if delete_stale_question_docs(index_ques, chunk_ids, [d["id"] for d in docs]):
+            publish_deletes(chunk_ids=chunk_ids)  # 副本按段落清空，随后的 upsert 重新写入本次问题
+        # 不逐批等待 refresh：代际递增经防抖后延迟执行，届时这些文档已随周期 refresh 可检索
+        bulk_insert_question_vectors_to_es(index_ques, docs)
+        publish_upserts(docs)
+        bump_generation_debounced("encode_and_store")
+
+    return len(pairs)
+
+
 @celery_app.task(name="encode_and_store", bind=True, autoretry_for=(Exception,), max_retries=3)
-def encode_questions_and_store(self, questions: list, file_id: str, chunk_id: str, use_pg: bool = True, use_es: bool = True):
+def encode_questions_and_store(
+    self,
+    questions: list,
+    file_id: str,
+    chunk_id: str,
+    use_pg: bool = True,
+    use_es: bool = True,
+    create_by: str = None,
+    file_type: str = None,
+    create_time: str = None,
+):
+    """单个 chunk 的问题：一次编码 + 批量入库（不再为每个问题派发子任务链）"""
     _log = get_logger("encode_and_store")
     try:
         if not questions:
             _log.warning(f"[{file_id}] 无问题生成，跳过编码与入库")
             return "skipped"
 
-        for question in questions:
-            q_id = str(uuid.uuid4())
-
-            task_chain = chain(
-                encode_text_task.s(question),
-                wrap_vector_as_list.s()
-            )
-
-            if use_pg:
-                task_chain |= insert_ques_batch_task.s(questions=[question], uu_id=file_id)
+        n = _encode_and_store(
+            [{
+                "file_id": file_id,
+                "chunk_id": chunk_id,
+                "questions": questions,
+                "create_by": create_by,
+                "file_type": file_type,
+                "create_time": create_time,
+            }],
+            use_pg=use_pg,
+            use_es=use_es,
+        )
+        _log.info(f"[{file_id}] ✅ chunk={chunk_id} 共写入 {n} 条问题向量")
+        return f"stored {n} questions"
 
-            if use_es:
-                task_chain |= insert_question_vector_to_es_task.s(
-                    chunk_id=chunk_id,
-                    question=question,
-                    q_id=q_id,
-                )
+    except Exception as e:
+        _log.exception(f"[{file_id}] encode+insert 失败: {e}")
+        raise self.retry(exc=e)
 
-            task_chain.apply_async()
 
-        _log.info(f"[{file_id}] ✅ 共调度 {len(questions)} 条 encode→insert 子任务链")
-        return f"dispatched {len(questions)} tasks"
+@celery_app.task(name="encode_and_store.batch", bind=True, autoretry_for=(Exception,), max_retries=3)
+def encode_questions_batch_and_store(self, items: list, use_pg: bool = True, use_es: bool = True):
+    """
+    多个 chunk 的问题合并处理：
+    items = [{"file_id": ..., "chunk_id": ..., "questions": [...]}, ...]
+    """
+    _log = get_logger("encode_and_store")
+    try:
+        n = _encode_and_store(items, use_pg=use_pg, use_es=use_es)
+        _log.info(f"✅ 批量写入 {n} 条问题向量（chunks={len(items)}）")
+        return {"chunks": len(items), "questions": n}
 
     except Exception as e:
-        _log.exception(f"[{file_id}] encode+insert 任务链调度失败: {e}")
+        _log.exception(f"批量 encode+insert 失败: {e}")
         raise self.retry(exc=e)
 
 
+def dispatch_chunk_batches(items: list, use_pg: bool = True, use_es: bool = True) -> int:
+    """
+    按 task_defaults.ingest_batch_size 切分段落，每批派发一个 ingest.chunk_batch
+    items: [{"file_id", "chunk_id", "text", "create_by"?, "file_type"?, "create_time"?}, ...]
+    :return: 派发的任务数
+    """
+    size = max(settings.task_defaults.ingest_batch_size, 1)
+    batches = [items[i:i + size] for i in range(0, len(items), size)]
+    for batch in batches:
+        ingest_chunk_batch.apply_async((batch,), kwargs={"use_pg": use_pg, "use_es": use_es})
+    return len(batches)
+
+
+@celery_app.task(name="ingest.chunk_batch", bind=True, autoretry_for=(Exception,), max_retries=3)
+def ingest_chunk_batch(self, items: list, use_pg: bool = True, use_es: bool = True, attempt: int = 0):
+    """
+    一批段落的问题生成（替代每段落一条 生成问题 → 编码入库 链）：
+    1) 任务内线程池并发调用大模型生成问题（task_defaults.ingest_concurrency）
+    2) 生成成功的段落连同生成好的问题派发一个 encode_and_store.batch（可路由到向量队列）：
+       一次编码 + PG / ES 各一次批量写入；入库失败时由该任务带着同一批问题重试，不会重新调用大模型
+    3) 生成失败的段落互不影响，只把这些段落重新投递一个 ingest.chunk_batch（最多 ingest_chunk_retries 次）
+    本任务耗时主要在大模型调用，运行在默认队列，不占用向量 worker
+    """
+    _log = get_logger("ingest_chunk_batch")
+    defaults = settings.task_defaults
+
+    def _gen(item):
+        try:
+            return item, generate_questions(item["text"]), None
+        except Exception as e:
+            return item, None, e
+
+    workers = max(1, min(defaults.ingest_concurrency, len(items)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        outcomes = list(pool.map(_gen, items))
+
+    ready, failed = [], []
+    for item, questions, err in outcomes:
+        if err is not None:
+            _log.warning(f"[{item['file_id']}] chunk={item['chunk_id']} 生成问题失败: {err}")
+            failed.append(item)
+        elif not questions:
+            _log.warning(f"[{item['file_id']}] chunk={item['chunk_id']} 无问题生成，跳过编码与入库")
+        else:
+            ready.append({**item, "questions": questions})
+
+    if ready:
+        # 段落原文下游用不到，不再随消息传递
+        encode_questions_batch_and_store.apply_async(
+            ([{k: v for k, v in item.items() if k != "text"} for item in ready],),
+            kwargs={"use_pg": use_pg, "use_es": use_es},
+        )
+
+    retried = False
+    if failed:
+        if attempt < defaults.ingest_chunk_retries:
+            ingest_chunk_batch.apply_async(
+                (failed,),
+                kwargs={"use_pg": use_pg, "use_es": use_es, "attempt": attempt + 1},
+                countdown=defaults.ingest_retry_backoff * (attempt + 1),
+            )
+            retried = True
+        else:
+            _log.error(f"❌ {len(failed)} 个段落重试 {attempt} 次后仍生成问题失败: {[i['chunk_id'] for i in failed]}")
+
+    _log.info(f"✅ 批量生成问题完成（chunks={len(items)}，成功 {len(ready)}，失败 {len(failed)}）")
+    return {
+        "chunks": len(items),
+        "dispatched_chunks": len(ready),
+        "questions": sum(len(i["questions"]) for i in ready),
+        "failed_chunks": [i["chunk_id"] for i in failed],
+        "retried": retried,
+    }
+
+
 @celery_app.task(name="insert.qvec.to.es")
 def insert_question_vector_to_es_task(vector: list, chunk_id: str, question: str, q_id: str = None):
     _log = get_logger("insert_question_vector_to_es_task")
@@ -326,6 +830,8 @@ def insert_question_vector_to_es_task(vector: list, chunk_id: str, question: str
         _log.warning(f"[DEBUG] vector preview: {vector[:5] if isinstance(vector, list) else 'N/A'}")
 
         insert_question_vector_to_es(index_ques, doc)
+        publish_upserts([doc])
+        bump_generation_debounced("insert.qvec.to.es")
 
     except Exception as e:
         _log.exception(f"向量写入失败: {e}")
@@ -21,29 +21,34 @@ def split_questions(text):
     questions = [q.strip() for q in questions if q.strip()]
     return questions
 
+def generate_questions(text: str) -> list:
+    """调用大模型为段落生成问题；失败直接抛异常（由调用方决定重试 / 降级）"""
+    prompt = "根据内容给我形成针对该段落内容生成五个问题返回给我，其余什么多余信息都不要"
+    completion = ali_client.chat.completions.create(
+        model="qwen-long",
+        messages=[
+            {'role': 'system', 'content': 'You are a helpful assistant.'},
+            {'role': 'user', 'content': text},
+            {'role': 'user', 'content': prompt}
+        ],
+        stream=True,
+        stream_options={"include_usage": True}
+    )
+
+    full_content = ""
+    for chunk in completion:
+        if chunk.choices and chunk.choices[0].delta.content:
+            full_content += chunk.choices[0].delta.content
+
+    logger.info(f"大模型返回内容：{full_content}")
+    return split_questions(full_content)
+
+
 @celery_app.task(name="generate.questions", bind=True, autoretry_for=(Exception,), max_retries=3)
 def generate_questions_task(self, text: str) -> list:
     logger.info(f"⏱️ 任务入参: self={self}, args={text}")
     try:
-        prompt = "根据内容给我形成针对该段落内容生成五个问题返回给我，其余什么多余信息都不要"
-        completion = ali_client.chat.completions.create(
-            model="qwen-long",
-            messages=[
-                {'role': 'system', 'content': 'You are a helpful assistant.'},
-                {'role': 'user', 'content': text},
-                {'role': 'user', 'content': prompt}
-            ],
-            stream=True,
-            stream_options={"include_usage": True}
-        )
-
-        full_content = ""
-        for chunk in completion:
-            if chunk.choices and chunk.choices[0].delta.content:
-                full_content += chunk.choices[0].delta.content
-
-        logger.info(f"大模型返回内容：{full_content}")
-        return split_questions(full_content)
+        return generate_questions(text)
 
     except Exception as e:
         logger.exception(f"生成问题失败：{e}")
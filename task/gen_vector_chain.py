@@ -1,27 +1,110 @@
 
 from .celery_app import celery_app
+from .embed_batcher import MicroBatchEncoder
 # from celery import shared_task
 from config.settings import load_config
 from utils.logger_manager import get_logger
-from sentence_transformers import SentenceTransformer
+from utils.vector_result import publish_vector_result
+from utils.embedding_cache import get_embedding_cache
+from .embedding_backend import load_backend, encode_bucketed
 from redis import Redis
+import asyncio
 import os
-import json
+import threading
 
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 logger = get_logger("gen_vector")
 config = load_config()
 vector_config = config.vector_service
 
-# ✅ 初始化 Redis 和模型
+# ✅ 初始化 Redis；模型改为懒加载：只有真正执行推理的进程才会加载（API 进程只派发任务，不加载）
 redis_client = Redis.from_url(vector_config.redis_backend)
-base_dir = os.path.dirname(os.path.abspath(__file__))
-model_path = os.path.join(base_dir, "..", vector_config.model_path)
-logger.info(f"加载向量模型路径: {model_path}")
-model = SentenceTransformer(model_path, device="cpu")
-model.encode("warmup", normalize_embeddings=True)
+_model = None
+_warmed = False
+_model_lock = threading.Lock()
 
 
+def load_model_weights():
+    """只加载权重不做推理（专用向量 worker 的父进程在 fork 前调用，子进程共享）"""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _model = load_backend(vector_config)
+    return _model
+
+
+def get_model():
+    """获取向量模型（首次调用时加载并预热，torch / onnx 见 VectorConfig.backend）"""
+    global _warmed
+    model = load_model_weights()
+    if not _warmed:
+        model.encode(["warmup"])
+        _warmed = True
+    return model
+
+
+def warmup():
+    """预加载模型（worker 进程启动时调用，避免首个任务承担加载耗时）"""
+    get_model()
+
+
+def _encode_batch(texts: list):
+    model = get_model()
+    if not vector_config.length_bucketing or len(texts) <= 1:
+        return model.encode(texts, batch_size=vector_config.batch_max_size)
+
+    # 按 token 长度分桶，避免 5 字的问题被补齐到 500 字段落的长度
+    vecs, ratio = encode_bucketed(model, texts, batch_size=vector_config.batch_max_size)
+    logger.debug(f"分桶编码 {len(texts)} 条，padding 比例 {ratio:.2%}")
+    return vecs
+
+
+# ✅ 进程内微批编码器：并发的 encode 请求在窗口内合并为一次 model.encode
+encoder = MicroBatchEncoder(
+    _encode_batch,
+    max_batch_size=vector_config.batch_max_size,
+    window_ms=vector_config.batch_window_ms,
+)
+
+def encode_texts(texts: list) -> list:
+    """
+    批量编码（同进程直接调用，参与微批合并），返回与 texts 等长的向量列表
+    - 先查共享向量缓存，只对未命中的文本做推理，推理结果回写缓存
+    """
+    if not vector_config.embed_cache_enable:
+        return encoder.encode_many(texts)
+
+    cache = get_embedding_cache()
+    vectors = cache.get_many(texts)
+    miss_idx = [i for i, v in enumerate(vectors) if v is None]
+    if miss_idx:
+        miss_texts = [texts[i] for i in miss_idx]
+        fresh = encoder.encode_many(miss_texts)
+        cache.set_many(miss_texts, fresh)
+        for i, vec in zip(miss_idx, fresh):
+            vectors[i] = vec
+    return vectors
+
+
+async def aencode_texts(texts: list) -> list:
+    """
+    encode_texts 的协程版本（API 进程内直接推理）：缓存读写走异步 Redis，推理在微批线程中进行
+    等待微批结果时用 shield 包住：调用方超时 / 取消只放弃等待，不会取消已提交给微批线程的 Future
+    """
+    if not vector_config.embed_cache_enable:
+        return await asyncio.shield(asyncio.wrap_future(encoder.submit(texts)))
+
+    cache = get_embedding_cache()
+    vectors = await cache.aget_many(texts)
+    miss_idx = [i for i, v in enumerate(vectors) if v is None]
+    if miss_idx:
+        miss_texts = [texts[i] for i in miss_idx]
+        fresh = await asyncio.shield(asyncio.wrap_future(encoder.submit(miss_texts)))
+        await cache.aset_many(miss_texts, fresh)
+        for i, vec in zip(miss_idx, fresh):
+            vectors[i] = vec
+    return vectors
 
 
 @celery_app.task(bind=True, name="encode_text_task")
@@ -29,20 +112,39 @@ def encode_text_task(self, text: str, use_redis: bool = False) -> list:
     """
     通用向量计算任务：
     - 支持 chain（直接返回向量）
-    - 支持异步轮询（写入 Redis）
+    - 支持异步等待（写入 Redis 并推送通知，见 utils.vector_result）
     """
     try:
         logger.info(f"处理文本向量任务：{text}")
-        vec = model.encode(text, normalize_embeddings=True).tolist()
+        vec = encode_texts([text])[0]
 
         if use_redis:
             task_id = self.request.id
-            redis_key = f"vec_result:{task_id}"
-            redis_client.set(redis_key, json.dumps(vec), ex=3600)
-            logger.info(f"写入 Redis 结果: {redis_key}")
+            publish_vector_result(redis_client, task_id, vec)
+            logger.info(f"写入 Redis 结果并通知: {task_id}")
 
         return vec
 
     except Exception as e:
         logger.exception(f"向量化任务失败，文本: {text}，错误: {str(e)}")
+        raise e
+
+
+@celery_app.task(bind=True, name="encode_texts_task")
+def encode_texts_task(self, texts: list, use_redis: bool = False) -> list:
+    """
+    批量向量计算任务：一次编码多条文本，返回与 texts 等长的向量列表
+    - use_redis=True 时整组结果写入 Redis 并推送通知（wait_vector_result 取回的是向量列表）
+    """
+    try:
+        logger.info(f"处理批量文本向量任务：{len(texts)} 条")
+        vectors = encode_texts(texts)
+
+        if use_redis:
+            publish_vector_result(redis_client, self.request.id, vectors)
+
+        return vectors
+
+    except Exception as e:
+        logger.exception(f"批量向量化任务失败（{len(texts)} 条），错误: {str(e)}")
         raise e
\ No newline at end of file
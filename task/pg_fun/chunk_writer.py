@@ -1,11 +1,15 @@
 from datetime import datetime
-import psycopg2
 from psycopg2.extras import Json
-from config.settings import load_config
+from task.pg_fun.pg_pool import pg_connection
+from task.pg_fun.copy_writer import copy_rows
+
+CHUNK_COLUMNS = (
+    "zhisk_file_id", "content", "create_time", "create_by",
+    "update_time", "update_by", "wmx_id", "vector",
+    "ori_json", "code", "category", "uu_id",
+)
 
 def insert_chunk_to_pg(zhisk_file_id: str, uu_id: str, chunk_content: str, ori_json=None):
-    config = load_config()
-    db_cfg = config.wmx_database
     now = datetime.now()
 
     sql = """
@@ -16,13 +20,7 @@ def insert_chunk_to_pg(zhisk_file_id: str, uu_id: str, chunk_content: str, ori_j
         ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
     """
 
-    with psycopg2.connect(
-        dbname=db_cfg.DB_NAME,
-        user=db_cfg.DB_USER,
-        password=db_cfg.DB_PASSWORD,
-        host=db_cfg.DB_HOST,
-        port=db_cfg.DB_PORT
-    ) as conn:
+    with pg_connection() as conn:
         with conn.cursor() as cursor:
             cursor.execute(sql, (
                 zhisk_file_id, chunk_content, now, "system",
@@ -30,4 +28,53 @@ def insert_chunk_to_pg(zhisk_file_id: str, uu_id: str, chunk_content: str, ori_j
                 Json(ori_json) if ori_json else None,
                 "default", None, uu_id
             ))
-            conn.commit()
\ No newline at end of file
+            conn.commit()
+
+
+def insert_chunks_to_pg(zhisk_file_id: str, chunks) -> int:
+    """
+    一个文件的全部段落：单连接、单事务、COPY FROM STDIN 写入（字段取值与 insert_chunk_to_pg 相同）
+
+    :param chunks: [(uu_id, chunk_content, ori_json), ...]
+    :return: 写入条数
+    """
+    if not chunks:
+        return 0
+
+    now = datetime.now()
+
+    rows = (
+        (
+            zhisk_file_id, content, now, "system",
+            now, "system", None, None,
+            ori_json or None,
+            "default", None, uu_id,
+        )
+        for uu_id, content, ori_json in chunks
+    )
+
+    with pg_connection() as conn:
+        with conn.cursor() as cursor:
+            copy_rows(cursor, "m_zhisk_results", CHUNK_COLUMNS, rows)
+            conn.commit()
+
+    return len(chunks)
+
+
+def delete_chunks_from_pg(uu_ids) -> int:
+    """
+    按 uu_id 删除段落（流式解析中某批 ES 写入失败时，撤销该批已提交的 PG 段落）
+
+    :param uu_ids: 段落 uu_id 列表
+    :return: 删除条数
+    """
+    if not uu_ids:
+        return 0
+
+    with pg_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("DELETE FROM m_zhisk_results WHERE uu_id = ANY(%s)", (list(uu_ids),))
+            deleted = cursor.rowcount
+            conn.commit()
+
+    return deleted
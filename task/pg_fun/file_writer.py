@@ -2,12 +2,9 @@ import os
 import uuid
 from datetime import datetime
 from pathlib import Path
-import psycopg2
-from config.settings import load_config
+from task.pg_fun.pg_pool import pg_connection
 
 def insert_file_info(file_path: str, ext: str, file_es_index: str) -> str:
-    config = load_config()
-    db_cfg = config.wmx_database
 
     file = Path(file_path)
     original_name = file.name
@@ -27,13 +24,7 @@ def insert_file_info(file_path: str, ext: str, file_es_index: str) -> str:
         ) VALUES (%s, %s, %s, %s, %s, %s, NULL, NULL, NULL, %s, %s, %s, %s, %s, NULL, %s)
     """
 
-    with psycopg2.connect(
-        dbname=db_cfg.DB_NAME,
-        user=db_cfg.DB_USER,
-        password=db_cfg.DB_PASSWORD,
-        host=db_cfg.DB_HOST,
-        port=db_cfg.DB_PORT
-    ) as conn:
+    with pg_connection() as conn:
         with conn.cursor() as cursor:
             cursor.execute(sql, (
                 zhisk_file_id, file_name, original_name, file_suffix,
@@ -46,18 +37,10 @@ def insert_file_info(file_path: str, ext: str, file_es_index: str) -> str:
 
 
 def update_zhisk_rows(zhisk_file_id: str, row_count: int):
-    config = load_config()
-    db_cfg = config.wmx_database
 
     sql = "UPDATE m_zhisk_files SET zhisk_rows = %s WHERE zhisk_file_id = %s"
 
-    with psycopg2.connect(
-        dbname=db_cfg.DB_NAME,
-        user=db_cfg.DB_USER,
-        password=db_cfg.DB_PASSWORD,
-        host=db_cfg.DB_HOST,
-        port=db_cfg.DB_PORT
-    ) as conn:
+    with pg_connection() as conn:
         with conn.cursor() as cursor:
             cursor.execute(sql, (row_count, zhisk_file_id))
             conn.commit()
\ No newline at end of file
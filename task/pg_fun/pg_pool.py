@@ -0,0 +1,156 @@
+"""
+Celery worker 内的 psycopg2 连接池（API 侧用的是 db_service/pg_pool.py 的 asyncpg 池）
+
+生命周期由 task/celery_app.py 的 worker 信号管理：
+- prefork：每个子进程在 worker_process_init 时建池（大小 pg_pool.prefork_size），worker_process_shutdown 时关闭
+- threads / gevent / eventlet / solo：没有子进程，worker 主进程在 celeryd_after_setup 时按 concurrency 建池，worker_shutdown 时关闭
+- 在 worker 之外（脚本、API 进程里直接调用写入函数）首次 pg_connection() 时懒加载
+
+借出：
+- 连接全部借出时按 acquire_timeout 等待（ThreadedConnectionPool 本身不等待，满了直接抛 PoolError）
+- 空闲超过 health_check_idle_sec 或已断开的连接先 SELECT 1 探活，失败则丢弃重连
+- 等待时间 / 借出次数 / 在用连接数见 utils/metrics.py 的 pg_pool_* 指标
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
+
+from config.settings import settings
+from utils.logger_manager import get_logger
+from utils.metrics import PG_POOL_CHECKOUTS, PG_POOL_IN_USE, PG_POOL_WAIT_SECONDS
+
+logger = get_logger("pg_pool")
+
+_pool: Optional[ThreadedConnectionPool] = None
+_slots: Optional[threading.BoundedSemaphore] = None
+_last_used: Dict[int, float] = {}
+_lock = threading.Lock()
+
+# 以线程 / 协程跑任务的 worker 池（单进程内并发 = concurrency）
+IN_PROCESS_POOLS = ("threads", "gevent", "eventlet", "solo")
+
+
+class PGPoolTimeout(Exception):
+    """等待连接超时"""
+
+
+def pool_size_for(worker_pool: Optional[str] = None, concurrency: Optional[int] = None) -> int:
+    """
+    连接池大小：配置了 pg_pool.max_size 时直接用；
+    threads 等单进程池按 concurrency（每个并发任务最多同时持有一个连接），prefork 子进程一次只跑一个任务，用 prefork_size
+    """
+    cfg = settings.pg_pool
+    if cfg.max_size:
+        return cfg.max_size
+    if worker_pool and any(name in worker_pool for name in IN_PROCESS_POOLS):
+        return max(concurrency or 1, 1)
+    return cfg.prefork_size
+
+
+def init_pool(size: Optional[int] = None):
+    """建池（幂等）；size 为空时按 prefork 子进程的大小"""
+    global _pool, _slots
+    with _lock:
+        if _pool is not None:
+            return
+        cfg = settings.pg_pool
+        db = settings.wmx_database
+        size = size or pool_size_for()
+        _pool = ThreadedConnectionPool(
+            min(cfg.min_size, size),
+            size,
+            dbname=db.DB_NAME,
+            user=db.DB_USER,
+            password=db.DB_PASSWORD,
+            host=db.DB_HOST,
+            port=db.DB_PORT,
+            connect_timeout=cfg.connect_timeout,
+        )
+        _slots = threading.BoundedSemaphore(size)
+        logger.info(f"✅ PG 连接池已创建（size={size}）")
+
+
+def close_pool():
+    global _pool, _slots
+    with _lock:
+        if _pool is None:
+            return
+        _pool.closeall()
+        _pool, _slots = None, None
+        _last_used.clear()
+        logger.info("🧹 PG 连接池已关闭")
+
+
+def _healthy(conn) -> bool:
+    if conn.closed:
+        return False
+    idle = time.monotonic() - _last_used.get(id(conn), 0.0)
+    if idle < settings.pg_pool.health_check_idle_sec:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def _checkout():
+    if _pool is None:
+        init_pool()
+    pool, slots = _pool, _slots
+
+    t0 = time.perf_counter()
+    if not slots.acquire(timeout=settings.pg_pool.acquire_timeout):
+        PG_POOL_CHECKOUTS.labels("timeout").inc()
+        raise PGPoolTimeout(f"等待 PG 连接超过 {settings.pg_pool.acquire_timeout}s")
+    PG_POOL_WAIT_SECONDS.observe(time.perf_counter() - t0)
+
+    try:
+        conn = pool.getconn()
+        if not _healthy(conn):
+            PG_POOL_CHECKOUTS.labels("reconnect").inc()
+            _last_used.pop(id(conn), None)
+            pool.putconn(conn, close=True)
+            conn = pool.getconn()
+    except Exception:
+        slots.release()
+        raise
+
+    PG_POOL_CHECKOUTS.labels("ok").inc()
+    PG_POOL_IN_USE.inc()
+    return pool, slots, conn
+
+
+@contextmanager
+def pg_connection():
+    """
+    借出一个连接；正常退出时提交，异常时回滚，随后归还连接池
+
+        with pg_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(...)
+    """
+    pool, slots, conn = _checkout()
+    broken = False
+    try:
+        with conn:
+            yield conn
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True
+        raise
+    finally:
+        _last_used[id(conn)] = time.monotonic()
+        broken = broken or bool(conn.closed)
+        if broken:
+            _last_used.pop(id(conn), None)
+        try:
+            pool.putconn(conn, close=broken)
+        finally:
+            PG_POOL_IN_USE.dec()
+            slots.release()
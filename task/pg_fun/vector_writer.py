@@ -1,43 +1,62 @@
-import psycopg2
-from psycopg2.extras import execute_batch
 from task.celery_app import celery_app
 from utils.logger_manager import get_logger
-from config.settings import load_config
-from utils.vector_utils import vector_to_pgstring
+from task.pg_fun.pg_pool import pg_connection
+from task.pg_fun.copy_writer import copy_rows
 
 logger = get_logger("insert_ques_batch")
 
+_QUES_COLUMNS = ("ori_sent_id", "ori_ques_sent", "ques_vector")
+
+
+def _write_ques_rows(rows, replace: bool) -> int:
+    if not rows:
+        return 0
+
+    data = [(sid, q, list(v)) for sid, q, v in rows]
+
+    with pg_connection() as conn:
+        with conn.cursor() as cursor:
+            if replace:
+                cursor.execute(
+                    "DELETE FROM wmx_ques WHERE ori_sent_id = ANY(%s)",
+                    (list({sid for sid, _, _ in data}),),
+                )
+            copy_rows(cursor, "wmx_ques", _QUES_COLUMNS, data)
+            conn.commit()
+
+    return len(data)
+
+
+def insert_ques_rows(rows):
+    """
+    单事务批量写入问题向量（COPY FROM STDIN，ques_vector 为 pgvector 时走二进制格式），只追加
+
+    :param rows: [(ori_sent_id, ori_ques_sent, vector), ...]，ori_sent_id 为所属段落 uu_id
+    :return: 写入条数
+    """
+    return _write_ques_rows(rows, replace=False)
+
+
+def replace_ques_rows(rows):
+    """
+    同 insert_ques_rows，但在同一事务内先删除所涉段落已有的问题：
+    rows 须包含这些段落的全部问题，任务重试时整体替换，不会重复
+
+    :param rows: [(ori_sent_id, ori_ques_sent, vector), ...]
+    :return: 写入条数
+    """
+    return _write_ques_rows(rows, replace=True)
+
+
 @celery_app.task(name="insert.ques.batch", bind=True, autoretry_for=(Exception,), max_retries=3)
 def insert_ques_batch_task(self, vectors, *, questions, uu_id):
     try:
         if not isinstance(vectors[0], (list, tuple)):
             vectors = [vectors]
 
-        config = load_config()
-        db_cfg = config.wmx_database
-
-        sql = """
-            INSERT INTO wmx_ques (ori_sent_id, ori_ques_sent, ques_vector)
-            VALUES (%s, %s, %s)
-        """
-        data = [
-            (uu_id, q, vector_to_pgstring(v))
-            for q, v in zip(questions, vectors)
-        ]
-
-        with psycopg2.connect(
-            dbname=db_cfg.DB_NAME,
-            user=db_cfg.DB_USER,
-            password=db_cfg.DB_PASSWORD,
-            host=db_cfg.DB_HOST,
-            port=db_cfg.DB_PORT
-        ) as conn:
-            with conn.cursor() as cursor:
-                execute_batch(cursor, sql, data)
-                conn.commit()
-
-        logger.info(f"[{uu_id}] ✅ 成功写入 {len(data)} 条问题向量")
+        n = insert_ques_rows([(uu_id, q, v) for q, v in zip(questions, vectors)])
+        logger.info(f"[{uu_id}] ✅ 成功写入 {n} 条问题向量")
 
     except Exception as e:
         logger.exception(f"[{uu_id}] ❌ 向量入库失败: {e}")
-        raise self.retry(exc=e)
\ No newline at end of file
+        raise self.retry(exc=e)
@@ -8,7 +8,7 @@ from langchain.text_splitter import (
 )
 
 from pypdf.errors import PdfStreamError
-from typing import Callable, Dict
+from typing import Callable, Dict, Iterable, Iterator
 from langchain_core.documents import Document
 import pandas as pd
 import json
@@ -133,4 +133,109 @@ def load_json_with_auto_schema(path: str):
         jq_schema = "."
 
     # 使用动态 schema 加载文档
-    return JSONLoader(file_path=path, jq_schema=jq_schema).load()
\ No newline at end of file
+    return JSONLoader(file_path=path, jq_schema=jq_schema).load()
+
+
+# ===================== 流式加载 / 分段（task_defaults.ingest_streaming） =====================
+# loader 逐页 / 逐块产出 Document，分段器边读边切，整篇文档不会同时驻留内存。
+# docx / md / json 没有可用的增量解析，仍整体加载后逐个产出。
+
+def iter_text_file(path: str, block_chars: int = 20000) -> Iterator[Document]:
+    """按行累积到 block_chars 左右产出一块（不在行中间截断）"""
+    buf, size = [], 0
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        for line in f:
+            buf.append(line)
+            size += len(line)
+            if size >= block_chars:
+                yield Document(page_content="".join(buf), metadata={"source": path})
+                buf, size = [], 0
+    if buf:
+        yield Document(page_content="".join(buf), metadata={"source": path})
+
+
+def iter_excel_as_text(path: str, rows_per_doc: int = 200) -> Iterator[Document]:
+    """
+    逐个 Sheet 读取，大 Sheet 按 rows_per_doc 行一块（每块带表头）；跳过规则与 load_excel_as_text 相同
+    注意：按 Sheet 流式，单个 Sheet 仍整体读入 DataFrame，内存峰值取决于最大的 Sheet
+    """
+    xls = pd.ExcelFile(path, engine="openpyxl" if path.endswith(".xlsx") else "xlrd")
+    emitted = False
+    for name in xls.sheet_names:
+        name_lower = name.lower()
+        if any(kw in name_lower for kw in ["temp", "辅助", "hidden", "缓存", "系统"]):
+            logger.info(f"📄 Excel 跳过无用 Sheet：{name}")
+            continue
+
+        df = xls.parse(name)
+        df = df.dropna(how="all", axis=0).dropna(how="all", axis=1)
+        if df.empty or df.shape[0] < 3:
+            logger.info(f"📄 Excel 跳过空 Sheet：{name}")
+            continue
+
+        for start in range(0, df.shape[0], rows_per_doc):
+            part = df.iloc[start:start + rows_per_doc]
+            try:
+                markdown = part.to_markdown(index=False, tablefmt="grid")
+                yield Document(page_content=f"【Sheet: {name}】\n{markdown}", metadata={"sheet": name, "row": start})
+            except Exception as e:
+                logger.warning(f"⚠️ Sheet {name} 转换失败: {e}")
+                yield Document(page_content=f"⚠️ Sheet {name} 转换失败: {e}")
+            emitted = True
+        del df
+
+    if not emitted:
+        msg = "⚠️ 所有 Sheet 被跳过或无有效内容"
+        logger.warning(f"{path} - {msg}")
+        yield Document(page_content=msg)
+
+
+def safe_iter_loader(loader_func: Callable[[str], Iterable], path: str, ext: str) -> Iterator[Document]:
+    """safe_loader 的生成器版本：异常在迭代过程中抛出，分类与 safe_loader 一致"""
+    try:
+        yield from loader_func(path)
+    except PdfStreamError as e:
+        logger.error(f"❌ PDF 文件结构损坏，不重试: .{ext} - {path} - 错误: {e}")
+        raise NonRetryableLoaderError(f"PDF 文件结构损坏: {e}")
+    except Exception as e:
+        logger.exception(f"❌ 文件加载失败: .{ext} - {path} - 错误: {e}")
+        raise RuntimeError(f"文件加载失败: .{ext} - {e}")
+
+
+ITER_LOADER_MAP: Dict[str, Callable[[str], Iterator[Document]]] = {
+    "pdf": lambda path: safe_iter_loader(lambda p: PyPDFLoader(p).lazy_load(), path, "pdf"),
+    "txt": lambda path: safe_iter_loader(iter_text_file, path, "txt"),
+    "csv": lambda path: safe_iter_loader(lambda p: CSVLoader(file_path=p).lazy_load(), path, "csv"),
+    "xlsx": lambda path: safe_iter_loader(iter_excel_as_text, path, "xlsx"),
+    "xls": lambda path: safe_iter_loader(iter_excel_as_text, path, "xls"),
+    "docx": lambda path: iter(LOADER_MAP["docx"](path)),
+    "md": lambda path: iter(LOADER_MAP["md"](path)),
+    "json": lambda path: iter(LOADER_MAP["json"](path)),
+}
+
+# 连续文本类：相邻页之间的段落可能被页边界截断，切分时把上一页的末段并入下一页再切
+_CARRY_EXTS = {"pdf", "docx", "txt"}
+
+
+def iter_split(ext: str, docs: Iterable) -> Iterator:
+    """
+    增量分段：逐个 Document 调 smart_split；
+    pdf / docx / txt 保留每页最后一段与下一页拼接后再切，段落可以跨页，与整篇切分的结果基本一致
+    """
+    if ext not in _CARRY_EXTS:
+        for doc in docs:
+            yield from smart_split(ext, [doc])
+        return
+
+    carry = None
+    for doc in docs:
+        text = doc.page_content
+        if carry is not None:
+            text = carry.page_content + "\n" + text
+        pieces = smart_split(ext, [Document(page_content=text, metadata=getattr(doc, "metadata", {}) or {})])
+        if not pieces:
+            continue
+        yield from pieces[:-1]
+        carry = pieces[-1]
+    if carry is not None:
+        yield carry
@@ -0,0 +1,95 @@
+# test/bench_batch_search.py
+"""
+批量混合检索吞吐：/es_hybrid_search/batch 一次请求 vs 逐条调用 /es_hybrid_search N 次
+
+需要先启动 API（app.py / app2.py）与向量 worker。
+所有查询（两种方式、各轮之间）互不重复，避免结果缓存、向量缓存让后跑的一方占便宜，并交替先后顺序；
+若要比较纯检索开销，可在配置中关闭 search.result_cache_enable 与 vector_service.embed_cache_enable。
+
+用法：
+    python test/bench_batch_search.py --base-url http://127.0.0.1:8000 --n 8 32 64 --rounds 3
+"""
+import argparse
+import json
+import random
+import time
+
+import httpx
+
+from bench_common import synth_question
+
+
+def run_sequential(client: httpx.Client, base_url: str, queries, top_k: int) -> float:
+    t0 = time.perf_counter()
+    for q in queries:
+        resp = client.post(f"{base_url}/es_hybrid_search", json={"query": q, "top_k": top_k})
+        resp.raise_for_status()
+    return time.perf_counter() - t0
+
+
+def run_batch(client: httpx.Client, base_url: str, queries, top_k: int) -> float:
+    t0 = time.perf_counter()
+    resp = client.post(f"{base_url}/es_hybrid_search/batch", json={"queries": queries, "top_k": top_k})
+    resp.raise_for_status()
+    assert len(resp.json()) == len(queries)
+    return time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--base-url", default="http://127.0.0.1:8000")
+    ap.add_argument("--n", type=int, nargs="+", default=[8, 32, 64])
+    ap.add_argument("--rounds", type=int, default=3)
+    ap.add_argument("--top-k", type=int, default=10)
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--out", default=None)
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    need = 2 * sum(args.n) * args.rounds
+    pool = set()
+    for _ in range(need * 50):
+        if len(pool) >= need:
+            break
+        pool.add(synth_question(rng))
+    if len(pool) < need:
+        raise SystemExit(f"合成查询只有 {len(pool)} 条不重复，少于所需的 {need} 条，请减小 --n / --rounds")
+    pool = list(pool)
+    rng.shuffle(pool)
+
+    rows = []
+    with httpx.Client(timeout=120) as client:
+        for n in args.n:
+            seq_times, batch_times = [], []
+            for r in range(args.rounds):
+                # 每轮取 2N 条新查询，前一半逐条、后一半批量
+                seq_q, batch_q = pool[:n], pool[n:2 * n]
+                pool = pool[2 * n:]
+
+                if r % 2 == 0:
+                    seq_times.append(run_sequential(client, args.base_url, seq_q, args.top_k))
+                    batch_times.append(run_batch(client, args.base_url, batch_q, args.top_k))
+                else:
+                    batch_times.append(run_batch(client, args.base_url, batch_q, args.top_k))
+                    seq_times.append(run_sequential(client, args.base_url, seq_q, args.top_k))
+
+            seq, batch = min(seq_times), min(batch_times)
+            row = {
+                "n": n,
+                "sequential_sec": round(seq, 3),
+                "batch_sec": round(batch, 3),
+                "sequential_qps": round(n / seq, 1),
+                "batch_qps": round(n / batch, 1),
+                "speedup": round(seq / batch, 2) if batch else None,
+            }
+            rows.append(row)
+            print(f"n={n:<4} 逐条 {row['sequential_qps']:>8.1f} q/s   批量 {row['batch_qps']:>8.1f} q/s   "
+                  f"加速 {row['speedup']}x")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# test/bench_common.py
+"""
+基准测试公共工具：
+- 样本语料：优先读取文本文件（每行一条），否则按固定随机种子合成
+  “短问题（generate_questions_task 的输出）+ 500 字左右的段落”的混合语料
+- 计时 / 分位数 / 峰值 RSS
+"""
+import os
+import random
+import resource
+import sys
+import time
+from typing import List, Optional
+
+# 允许直接 python test/bench_xxx.py 运行
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+_TERMS = [
+    "物模型", "网关", "PLC", "传感器", "MQTT", "边缘计算", "设备接入", "数据采集",
+    "告警规则", "固件升级", "Modbus", "OPC UA", "温湿度", "能耗监测", "工单", "数字孪生",
+]
+_Q_TEMPLATES = [
+    "什么是{0}？",
+    "{0}和{1}有什么区别？",
+    "如何配置{0}的{1}？",
+    "{0}出现故障时应该怎么处理？",
+    "{0}支持哪些{1}协议？",
+]
+_SENT_TEMPLATES = [
+    "{0}通过{1}将现场数据上报到平台，平台根据{2}进行实时分析。",
+    "在部署{0}之前，需要确认{1}的参数配置以及{2}的网络连通性。",
+    "当{0}检测到异常时，系统会自动触发{1}并生成对应的{2}。",
+    "{0}的数据模型由属性、事件和服务三部分组成，可与{1}、{2}联动。",
+]
+
+
+def synth_question(rng: random.Random) -> str:
+    return rng.choice(_Q_TEMPLATES).format(*rng.sample(_TERMS, 2))
+
+
+def synth_chunk(rng: random.Random, target_chars: int = 500) -> str:
+    parts, size = [], 0
+    while size < target_chars:
+        s = rng.choice(_SENT_TEMPLATES).format(*rng.sample(_TERMS, 3))
+        parts.append(s)
+        size += len(s)
+    return "".join(parts)[:target_chars]
+
+
+def load_corpus(
+    path: Optional[str] = None,
+    n: int = 512,
+    chunk_ratio: float = 0.2,
+    chunk_chars: int = 500,
+    seed: int = 42,
+) -> List[str]:
+    """
+    :param path: 语料文件（每行一条）；不传则合成
+    :param n: 条数
+    :param chunk_ratio: 合成语料中长段落的占比，其余为短问题
+    """
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            lines = [l.strip() for l in f if l.strip()]
+        return (lines * (n // max(len(lines), 1) + 1))[:n]
+
+    rng = random.Random(seed)
+    return [
+        synth_chunk(rng, chunk_chars) if rng.random() < chunk_ratio else synth_question(rng)
+        for _ in range(n)
+    ]
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100.0
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def peak_rss_mb() -> float:
+    """当前进程峰值 RSS（MB）"""
+    r = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return r / (1024 * 1024) if sys.platform == "darwin" else r / 1024
+
+
+class Timer:
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
@@ -0,0 +1,95 @@
+# test/bench_embed_workers.py
+"""
+专用向量 worker 模式：吞吐 / 内存 随进程数变化
+
+与 WORKER_MODE=embedding 的做法一致：父进程先加载权重（不做推理），再 fork 出 P 个子进程，
+每个子进程 torch.set_num_threads(cores // P)，各自编码 1/P 的语料。
+内存使用 PSS（按共享页均摊），能直接看出写时复制共享权重的效果。
+
+用法：
+    python test/bench_embed_workers.py --procs 1 2 4 8 --n 2048
+"""
+import argparse
+import json
+import multiprocessing as mp
+import time
+
+from bench_common import load_corpus
+from config.settings import settings
+from task.embedding_worker import available_cores, plan_pool
+
+
+def _child(texts, threads, batch_size, start_evt, result_q):
+    import psutil
+    import torch
+    from task.gen_vector_chain import get_model
+
+    torch.set_num_threads(threads)
+    model = get_model()  # 权重已由父进程加载，这里只做预热
+    start_evt.wait()
+    t0 = time.perf_counter()
+    model.encode(texts, batch_size=batch_size)
+    elapsed = time.perf_counter() - t0
+    mem = psutil.Process().memory_full_info()
+    result_q.put({"elapsed": elapsed, "pss_mb": getattr(mem, "pss", mem.rss) / 2 ** 20})
+
+
+def run(procs, texts, batch_size, cores):
+    _, threads = plan_pool(cores, processes=procs)
+    ctx = mp.get_context("fork")
+    start_evt, result_q = ctx.Event(), ctx.Queue()
+    shards = [texts[i::procs] for i in range(procs)]
+    workers = [
+        ctx.Process(target=_child, args=(shard, threads, batch_size, start_evt, result_q))
+        for shard in shards
+    ]
+    for w in workers:
+        w.start()
+    time.sleep(1.0)  # 等子进程完成预热
+    t0 = time.perf_counter()
+    start_evt.set()
+    results = [result_q.get() for _ in workers]
+    wall = time.perf_counter() - t0
+    for w in workers:
+        w.join()
+
+    return {
+        "processes": procs,
+        "threads_per_process": threads,
+        "texts_per_sec": round(len(texts) / wall, 2),
+        "total_pss_mb": round(sum(r["pss_mb"] for r in results), 1),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--procs", type=int, nargs="+", default=[1, 2, 4])
+    ap.add_argument("--n", type=int, default=1024)
+    ap.add_argument("--batch-size", type=int, default=32)
+    ap.add_argument("--corpus", default=None)
+    ap.add_argument("--out", default=None)
+    args = ap.parse_args()
+
+    import torch
+    from task.gen_vector_chain import load_model_weights
+
+    cores = available_cores()
+    torch.set_num_threads(1)  # 父进程不建 OpenMP 线程池，避免带进 fork
+    load_model_weights()
+    texts = load_corpus(args.corpus, n=args.n)
+
+    results = []
+    for p in args.procs:
+        r = run(p, texts, args.batch_size, cores)
+        results.append(r)
+        print(f"procs={r['processes']:<3} threads={r['threads_per_process']:<3} "
+              f"{r['texts_per_sec']:>9.1f} texts/s  PSS {r['total_pss_mb']:>8.1f} MB")
+
+    summary = {"backend": settings.vector_service.backend, "cores": cores, "n": len(texts), "runs": results}
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
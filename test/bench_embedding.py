@@ -0,0 +1,176 @@
+# test/bench_embedding.py
+"""
+向量编码吞吐 / 延迟基准
+
+驱动 encode_text_task 使用的同一套模型加载与编码路径（load_backend + 按长度分桶），
+遍历以下维度的组合：
+    --backends      torch / onnx / onnx-int8
+    --threads       推理线程数
+    --batch-sizes   单次 encode 的条数
+    --dists         文本长度分布：questions（短问题）/ chunks（500 字段落）/ mixed（按 --chunk-ratio 混合）
+每个后端在独立子进程中运行，峰值 RSS 互不干扰。
+
+输出：texts/sec、单批延迟 p50/p95/p99（毫秒）、峰值 RSS，写入 JSON（含 git 提交、机器信息），
+可用 --baseline 指定上一次的 JSON 做对比。
+
+用法：
+    python test/bench_embedding.py --backends torch onnx-int8 --threads 4 8 \
+        --batch-sizes 1 8 32 --dists questions chunks mixed --out bench_embedding.json
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import platform
+import subprocess
+import time
+from datetime import datetime
+
+from bench_common import ROOT, load_corpus, peak_rss_mb, percentile
+
+DISTS = {
+    "questions": 0.0,
+    "chunks": 1.0,
+}
+
+
+def _backend_cfg(name: str):
+    from config.settings import settings
+
+    update = {"backend": "torch", "onnx_quantize": False}
+    if name.startswith("onnx"):
+        update = {"backend": "onnx", "onnx_quantize": name.endswith("int8")}
+    return settings.vector_service.model_copy(update=update)
+
+
+def _run_backend(name, args, result_q):
+    import torch
+    from task.embedding_backend import encode_bucketed, load_backend
+
+    cfg = _backend_cfg(name)
+    t0 = time.perf_counter()
+    backend = load_backend(cfg)
+    load_seconds = time.perf_counter() - t0
+    rows = []
+
+    for threads in args.threads:
+        torch.set_num_threads(threads)
+        if hasattr(backend, "session"):
+            # onnxruntime 线程数在会话创建时确定，需要重建
+            backend = load_backend(cfg.model_copy(update={"num_threads": threads}))
+
+        for dist in args.dists:
+            ratio = DISTS.get(dist, args.chunk_ratio)
+            texts = load_corpus(args.corpus, n=args.n, chunk_ratio=ratio, chunk_chars=args.chunk_chars)
+
+            for bs in args.batch_sizes:
+                encode = (
+                    (lambda b: encode_bucketed(backend, b, batch_size=bs)[0])
+                    if cfg.length_bucketing and bs > 1
+                    else (lambda b: backend.encode(b, batch_size=bs))
+                )
+                encode(texts[:bs])  # 预热
+
+                latencies = []
+                start = time.perf_counter()
+                for i in range(0, len(texts), bs):
+                    t = time.perf_counter()
+                    encode(texts[i:i + bs])
+                    latencies.append((time.perf_counter() - t) * 1000)
+                wall = time.perf_counter() - start
+
+                row = {
+                    "backend": name,
+                    "threads": threads,
+                    "dist": dist,
+                    "batch_size": bs,
+                    "n": len(texts),
+                    "texts_per_sec": round(len(texts) / wall, 2),
+                    "latency_ms": {
+                        "p50": round(percentile(latencies, 50), 2),
+                        "p95": round(percentile(latencies, 95), 2),
+                        "p99": round(percentile(latencies, 99), 2),
+                    },
+                }
+                rows.append(row)
+                print(f"{name:<10} threads={threads:<3} {dist:<9} bs={bs:<4} "
+                      f"{row['texts_per_sec']:>9.1f} texts/s  p50={row['latency_ms']['p50']:.1f}ms "
+                      f"p99={row['latency_ms']['p99']:.1f}ms", flush=True)
+
+    result_q.put({
+        "backend": name,
+        "load_seconds": round(load_seconds, 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "rows": rows,
+    })
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def _compare(results, baseline_path):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        base = json.load(f)
+
+    def key(r):
+        return (r["backend"], r["threads"], r["dist"], r["batch_size"])
+
+    old = {key(r): r for b in base["backends"] for r in b["rows"]}
+    print(f"\n对比基线 {baseline_path}（commit {base.get('git_commit')}）：")
+    for b in results:
+        for r in b["rows"]:
+            o = old.get(key(r))
+            if o:
+                ratio = r["texts_per_sec"] / o["texts_per_sec"] if o["texts_per_sec"] else 0.0
+                print(f"  {key(r)}: {o['texts_per_sec']:.1f} -> {r['texts_per_sec']:.1f} texts/s ({ratio:.2f}x)")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--backends", nargs="+", default=["torch"], help="torch / onnx / onnx-int8")
+    ap.add_argument("--threads", type=int, nargs="+", default=[os.cpu_count() or 1])
+    ap.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32])
+    ap.add_argument("--dists", nargs="+", default=["questions", "chunks", "mixed"])
+    ap.add_argument("--chunk-ratio", type=float, default=0.2, help="mixed 分布中长段落占比")
+    ap.add_argument("--chunk-chars", type=int, default=500)
+    ap.add_argument("--n", type=int, default=256)
+    ap.add_argument("--corpus", default=None, help="语料文件（每行一条），指定后忽略合成分布")
+    ap.add_argument("--out", default="bench_embedding.json")
+    ap.add_argument("--baseline", default=None, help="上一次结果 JSON，用于对比")
+    args = ap.parse_args()
+
+    ctx = mp.get_context("spawn")
+    results = []
+    for name in args.backends:
+        q = ctx.Queue()
+        p = ctx.Process(target=_run_backend, args=(name, args, q))
+        p.start()
+        results.append(q.get())
+        p.join()
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "machine": {
+            "hostname": platform.node(),
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+        },
+        "params": vars(args),
+        "backends": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已写入 {args.out}")
+
+    if args.baseline:
+        _compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
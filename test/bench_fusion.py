@@ -0,0 +1,180 @@
+# test/bench_fusion.py
+"""
+融合引擎微基准 + 与旧 merge_results 的结果一致性校验
+
+- 一致性：随机生成 BM25 / 向量两路命中（含同 id 多次命中、两路部分重叠），
+  对多个 alpha 比较 fusion.fuse(strategy="legacy") 与旧实现（下方 _legacy_merge，逐行照搬）的
+  分数序列、id 集合、score_detail、source；不一致时退出码非 0
+- 性能：每路 N 个候选，各策略单次融合耗时 p50 / p99（微秒），并与旧实现对比；
+  每路 --target-n 个候选时各策略 p50 须低于 --target-us（默认 1000 个候选 < 1000us），否则退出码非 0
+
+用法：
+    python test/bench_fusion.py --sizes 10 100 1000 5000 --repeat 200
+"""
+import argparse
+import random
+import sys
+import time
+
+from bench_common import percentile
+from task.es_fun.fusion import STRATEGIES, fuse
+
+
+# ===== 旧实现（search_engine.merge_results 重构前的版本，仅用于对照） =====
+
+def _aggregate_max_by_id(results):
+    merged = {}
+    for r in results:
+        if r["id"] not in merged or r["score"] > merged[r["id"]]["score"]:
+            merged[r["id"]] = r
+    return list(merged.values())
+
+
+def _legacy_merge(bm25_results, vector_results, alpha=0.6, top_k=10):
+    def normalize(results, epsilon=1e-5):
+        if not results: return {}
+        scores = [r["score"] for r in results]
+        min_s, max_s = min(scores), max(scores)
+        if max_s == min_s:
+            return {r["id"]: 1.0 for r in results}
+        return {
+            r["id"]: (r["score"] - min_s + epsilon) / (max_s - min_s + epsilon)
+            for r in results
+        }
+
+    bm25_results = _aggregate_max_by_id(bm25_results)
+    vector_results = _aggregate_max_by_id(vector_results)
+
+    bm25_norm = normalize(bm25_results)
+    vector_raw = {r["id"]: r["score"] for r in vector_results}
+    all_ids = set(bm25_norm) | set(vector_raw)
+
+    id_to_text = {
+        **{r["id"]: r["text"] for r in bm25_results},
+        **{r["id"]: r["text"] for r in vector_results}
+    }
+
+    merged = []
+    for _id in all_ids:
+        b_score = bm25_norm.get(_id, 0.0)
+        v_score = vector_raw.get(_id, 0.0)
+        final_score = alpha * b_score + (1 - alpha) * v_score
+        if b_score > 0 and v_score > 0:
+            source = "hybrid"
+        elif b_score > 0:
+            source = "bm25"
+        else:
+            source = "vector"
+        merged.append({
+            "id": _id,
+            "content": id_to_text.get(_id, ""),
+            "score": round(final_score, 4),
+            "score_detail": {"bm25": round(b_score, 4), "vector": round(v_score, 4)},
+            "source": source
+        })
+    return sorted(merged, key=lambda x: x["score"], reverse=True)[:top_k]
+
+
+# ===== 数据 =====
+
+def make_hits(rng: random.Random, n: int, overlap: float = 0.3):
+    """BM25 分数 0~30，向量分数 0.5~1.0（ES cosine 的 (1+cos)/2）；向量侧约 1/4 为同段落的重复命中"""
+    bm25 = [{"id": f"c{i}", "score": rng.uniform(0, 30), "text": f"段落{i}"} for i in range(n)]
+    shared = int(n * overlap)
+    vector = []
+    for i in range(n):
+        cid = f"c{rng.randrange(shared)}" if i < shared and shared else f"v{i}"
+        if i % 4 == 0 and vector:
+            cid = vector[rng.randrange(len(vector))]["id"]
+        vector.append({"id": cid, "score": rng.uniform(0.5, 1.0), "text": f"段落{cid[1:]}"})
+    return bm25, vector
+
+
+def _by_score(results):
+    out = {}
+    for r in results:
+        out.setdefault(r["score"], {})[r["id"]] = (r["score_detail"], r["source"], r["content"])
+    return out
+
+
+def check_equivalence(rng: random.Random, trials: int) -> int:
+    failures = 0
+    for t in range(trials):
+        n = rng.choice([0, 1, 3, 10, 50, 200])
+        bm25, vector = make_hits(rng, n)
+        if t % 5 == 1:
+            bm25 = []
+        elif t % 5 == 2:
+            vector = []
+        alpha = rng.choice([0.0, 0.3, 0.5, 0.6, 1.0])
+        top_k = rng.choice([1, 10, 50])
+
+        # 同分条目的先后顺序在旧实现里取决于 set 遍历顺序，因此按分数分组比较
+        full_old = _legacy_merge(bm25, vector, alpha=alpha, top_k=None)
+        full_new = fuse(bm25, vector, alpha=alpha, top_k=None, strategy="legacy")
+        ok = [r["score"] for r in full_old] == [r["score"] for r in full_new]
+        ok = ok and _by_score(full_old) == _by_score(full_new)
+
+        # 截断后：分数序列一致，且每条都与旧实现同分组中的条目完全相同
+        old = _legacy_merge(bm25, vector, alpha=alpha, top_k=top_k)
+        new = fuse(bm25, vector, alpha=alpha, top_k=top_k, strategy="legacy")
+        ok = ok and [r["score"] for r in old] == [r["score"] for r in new]
+        groups = _by_score(full_old)
+        ok = ok and all(
+            groups.get(r["score"], {}).get(r["id"]) == (r["score_detail"], r["source"], r["content"])
+            for r in new
+        )
+
+        if not ok:
+            failures += 1
+            print(f"❌ 不一致：n={n} alpha={alpha} top_k={top_k}")
+    return failures
+
+
+# ===== 性能 =====
+
+def bench(fn, repeat: int):
+    fn()
+    samples = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t) * 1e6)
+    return percentile(samples, 50), percentile(samples, 99)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    ap.add_argument("--repeat", type=int, default=200)
+    ap.add_argument("--top-k", type=int, default=10)
+    ap.add_argument("--trials", type=int, default=500)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--target-n", type=int, default=1000, help="延迟目标对应的每路候选数")
+    ap.add_argument("--target-us", type=float, default=1000.0, help="--target-n 下单次融合 p50 上限（微秒）")
+    args = ap.parse_args()
+    rng = random.Random(args.seed)
+
+    failures = check_equivalence(rng, args.trials)
+    print(f"一致性校验：{args.trials} 组，失败 {failures} 组")
+
+    sizes = sorted(set(args.sizes) | {args.target_n})
+    slow = []
+    print(f"\n{'每路候选':>8} {'实现':<12} {'p50(us)':>10} {'p99(us)':>10}")
+    for n in sizes:
+        bm25, vector = make_hits(rng, n)
+        p50, p99 = bench(lambda: _legacy_merge(bm25, vector, 0.6, args.top_k), args.repeat)
+        print(f"{n:>8} {'old-merge':<12} {p50:>10.1f} {p99:>10.1f}")
+        for strategy in STRATEGIES:
+            p50, p99 = bench(lambda: fuse(bm25, vector, 0.6, args.top_k, strategy), args.repeat)
+            print(f"{n:>8} {strategy:<12} {p50:>10.1f} {p99:>10.1f}")
+            if n == args.target_n and p50 > args.target_us:
+                slow.append(f"{strategy} p50={p50:.1f}us")
+
+    verdict = "✅ 达标" if not slow else "❌ 未达标：" + "，".join(slow)
+    print(f"\n延迟目标：每路 {args.target_n} 个候选 p50 < {args.target_us:.0f}us —— {verdict}")
+    sys.exit(1 if failures or slow else 0)
+
+
+if __name__ == "__main__":
+    main()
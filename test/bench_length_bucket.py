@@ -0,0 +1,97 @@
+# test/bench_length_bucket.py
+"""
+按 token 长度分桶的收益：padding 比例 + 吞吐
+
+语料为 generate_questions_task 风格的短问题与 500 字段落的混合（或 --corpus 指定文件）。
+对比三种组批方式：
+    - arrival ：按到达顺序切批（无排序，ONNX 后端的默认行为）
+    - default ：backend.encode 自身行为（SentenceTransformer 内部按字符长度排序）
+    - bucketed：encode_bucketed 按 token 长度分桶
+
+用法：
+    python test/bench_length_bucket.py --n 1024 --chunk-ratio 0.2 --backend onnx
+"""
+import argparse
+import json
+
+import numpy as np
+
+from bench_common import Timer, load_corpus
+from config.settings import settings
+from task.embedding_backend import (
+    bucket_by_length,
+    encode_bucketed,
+    load_backend,
+    padding_ratio,
+    token_lengths,
+)
+
+
+def encode_arrival(backend, texts, batch_size):
+    """按到达顺序逐批编码，批内不排序"""
+    out = []
+    for i in range(0, len(texts), batch_size):
+        batch = texts[i:i + batch_size]
+        out.append(backend.encode(batch, batch_size=len(batch)))
+    return np.concatenate(out, axis=0)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--corpus", default=None)
+    ap.add_argument("--n", type=int, default=1024)
+    ap.add_argument("--chunk-ratio", type=float, default=0.2, help="长段落占比")
+    ap.add_argument("--batch-size", type=int, default=32)
+    ap.add_argument("--backend", default=None, help="torch / onnx，默认取配置")
+    ap.add_argument("--out", default=None)
+    args = ap.parse_args()
+
+    cfg = settings.vector_service
+    if args.backend:
+        cfg = cfg.model_copy(update={"backend": args.backend})
+    backend = load_backend(cfg)
+    texts = load_corpus(args.corpus, n=args.n, chunk_ratio=args.chunk_ratio)
+    bs = args.batch_size
+
+    lengths = token_lengths(backend, texts)
+    arrival_batches = [list(range(i, min(i + bs, len(texts)))) for i in range(0, len(texts), bs)]
+    char_order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+    char_batches = [char_order[i:i + bs] for i in range(0, len(char_order), bs)]
+    token_batches = bucket_by_length(lengths, bs)
+
+    backend.encode(texts[:bs], batch_size=bs)  # 预热
+
+    timings = {}
+    with Timer() as t:
+        ref = encode_arrival(backend, texts, bs)
+    timings["arrival"] = t.elapsed
+    with Timer() as t:
+        backend.encode(texts, batch_size=bs)
+    timings["default"] = t.elapsed
+    with Timer() as t:
+        got, _ = encode_bucketed(backend, texts, batch_size=bs)
+    timings["bucketed"] = t.elapsed
+
+    result = {
+        "backend": backend.name,
+        "n": len(texts),
+        "batch_size": bs,
+        "mean_tokens": round(float(np.mean(lengths)), 1),
+        "padding_ratio": {
+            "arrival": round(padding_ratio(lengths, arrival_batches), 4),
+            "default": round(padding_ratio(lengths, char_batches), 4),
+            "bucketed": round(padding_ratio(lengths, token_batches), 4),
+        },
+        "texts_per_sec": {k: round(len(texts) / v, 2) for k, v in timings.items()},
+        "speedup_vs_arrival": round(timings["arrival"] / timings["bucketed"], 2),
+        # 顺序恢复正确性：分桶结果应与逐条顺序结果一致
+        "min_cosine_vs_arrival": round(float((ref * got).sum(axis=1).min()), 6),
+    }
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
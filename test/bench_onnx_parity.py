@@ -0,0 +1,81 @@
+# test/bench_onnx_parity.py
+"""
+ONNX / int8 后端与 PyTorch fp32 的一致性 + 吞吐对比
+
+用法：
+    python test/bench_onnx_parity.py --n 512
+    python test/bench_onnx_parity.py --corpus samples.txt --quantize
+输出：
+    - 逐条余弦相似度（min / mean / p1），以及“以 fp32 为基准的 top-1 近邻一致率”
+    - 各后端 texts/sec
+"""
+import argparse
+import json
+
+import numpy as np
+
+from bench_common import Timer, load_corpus, percentile
+from config.settings import settings
+from task.embedding_backend import (
+    OnnxBackend,
+    TorchBackend,
+    export_onnx,
+    resolve_model_path,
+    resolve_onnx_path,
+)
+
+
+def run(backend, texts, batch_size):
+    backend.encode(texts[:batch_size], batch_size=batch_size)  # 预热
+    with Timer() as t:
+        vecs = backend.encode(texts, batch_size=batch_size)
+    return vecs, len(texts) / t.elapsed
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--corpus", default=None, help="语料文件，每行一条；不传则合成")
+    ap.add_argument("--n", type=int, default=512)
+    ap.add_argument("--batch-size", type=int, default=32)
+    ap.add_argument("--threads", type=int, default=None)
+    ap.add_argument("--quantize", action="store_true", help="对比 int8 动态量化模型")
+    ap.add_argument("--out", default=None, help="结果 JSON 输出路径")
+    args = ap.parse_args()
+
+    cfg = settings.vector_service.model_copy(update={"onnx_quantize": args.quantize, "onnx_path": None})
+    model_path = resolve_model_path(cfg)
+    onnx_path = export_onnx(model_path, resolve_onnx_path(cfg), quantize=args.quantize)
+    texts = load_corpus(args.corpus, n=args.n)
+
+    ref, ref_tps = run(TorchBackend(model_path, num_threads=args.threads), texts, args.batch_size)
+    got, onnx_tps = run(OnnxBackend(model_path, onnx_path, num_threads=args.threads), texts, args.batch_size)
+
+    cos = (ref * got).sum(axis=1).tolist()
+    # 检索一致性：每条向量在语料内的最近邻（排除自身）是否相同
+    ref_sim, got_sim = ref @ ref.T, got @ got.T
+    np.fill_diagonal(ref_sim, -1)
+    np.fill_diagonal(got_sim, -1)
+    top1_agree = float((ref_sim.argmax(axis=1) == got_sim.argmax(axis=1)).mean())
+
+    result = {
+        "onnx_path": onnx_path,
+        "quantized": args.quantize,
+        "n": len(texts),
+        "batch_size": args.batch_size,
+        "cosine": {
+            "min": round(min(cos), 6),
+            "mean": round(float(np.mean(cos)), 6),
+            "p1": round(percentile(cos, 1), 6),
+        },
+        "top1_neighbor_agreement": round(top1_agree, 4),
+        "texts_per_sec": {"torch_fp32": round(ref_tps, 2), "onnx": round(onnx_tps, 2)},
+        "speedup": round(onnx_tps / ref_tps, 2),
+    }
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+# test/bench_pg_copy.py
+"""
+PG 批量写入：逐行（每行新建连接 + INSERT + commit，即 insert_chunk_to_pg / 旧的逐问题写入）
+vs 单事务 COPY FROM STDIN（task/pg_fun/copy_writer.copy_rows）
+
+在 m_zhisk_results / wmx_ques 旁建两张同结构的临时表（LIKE ... INCLUDING DEFAULTS），结束后删除，不碰业务数据。
+COPY 的格式按临时表的列类型自动选择（全部可二进制编码时为 binary），--text 强制文本格式做对照。
+
+用法：
+    python test/bench_pg_copy.py --n 100 1000 5000 --dim 1024
+"""
+import argparse
+import json
+import random
+import time
+import uuid
+from datetime import datetime
+from typing import Tuple
+
+import psycopg2
+
+from bench_common import synth_chunk, synth_question
+from config.settings import settings
+from task.pg_fun.chunk_writer import CHUNK_COLUMNS
+from task.pg_fun.copy_writer import copy_rows
+from utils.vector_utils import vector_to_pgstring
+
+CHUNK_TABLE = "bench_copy_zhisk_results"
+QUES_TABLE = "bench_copy_wmx_ques"
+QUES_COLUMNS = ("ori_sent_id", "ori_ques_sent", "ques_vector")
+
+
+def connect():
+    db = settings.wmx_database
+    return psycopg2.connect(
+        dbname=db.DB_NAME, user=db.DB_USER, password=db.DB_PASSWORD, host=db.DB_HOST, port=db.DB_PORT
+    )
+
+
+def setup():
+    with connect() as conn, conn.cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {CHUNK_TABLE}, {QUES_TABLE}")
+        cur.execute(f"CREATE TABLE {CHUNK_TABLE} (LIKE m_zhisk_results INCLUDING DEFAULTS)")
+        cur.execute(f"CREATE TABLE {QUES_TABLE} (LIKE wmx_ques INCLUDING DEFAULTS)")
+        conn.commit()
+
+
+def teardown():
+    with connect() as conn, conn.cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {CHUNK_TABLE}, {QUES_TABLE}")
+        conn.commit()
+
+
+def truncate():
+    with connect() as conn, conn.cursor() as cur:
+        cur.execute(f"TRUNCATE {CHUNK_TABLE}, {QUES_TABLE}")
+        conn.commit()
+
+
+def chunk_rows(rng: random.Random, n: int):
+    now = datetime.now()
+    file_id = str(uuid.uuid4())
+    return [
+        (file_id, synth_chunk(rng), now, "system", now, "system", None, None,
+         {"source": "bench", "page": i}, "default", None, str(uuid.uuid4()))
+        for i in range(n)
+    ]
+
+
+def ques_rows(rng: random.Random, n: int, dim: int):
+    chunk_id = str(uuid.uuid4())
+    return [(chunk_id, synth_question(rng), [rng.uniform(-1, 1) for _ in range(dim)]) for _ in range(n)]
+
+
+def per_row(table: str, columns, rows) -> float:
+    # 与旧路径一致：每行一个连接、一次 INSERT、一次 commit
+    placeholders = ", ".join(["%s"] * len(columns))
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+    t0 = time.perf_counter()
+    for row in rows:
+        row = tuple(
+            json.dumps(v, ensure_ascii=False) if isinstance(v, dict)
+            else vector_to_pgstring(v) if isinstance(v, list) else v
+            for v in row
+        )
+        with connect() as conn, conn.cursor() as cur:
+            cur.execute(sql, row)
+            conn.commit()
+    return time.perf_counter() - t0
+
+
+def copy(table: str, columns, rows, binary) -> Tuple[float, str]:
+    t0 = time.perf_counter()
+    with connect() as conn, conn.cursor() as cur:
+        fmt = copy_rows(cur, table, columns, rows, binary=binary)
+        conn.commit()
+    return time.perf_counter() - t0, fmt
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, nargs="+", default=[100, 1000, 5000])
+    ap.add_argument("--dim", type=int, default=1024)
+    ap.add_argument("--per-row-max", type=int, default=1000, help="逐行路径最多跑这么多行（太慢），超过则跳过")
+    ap.add_argument("--text", action="store_true", help="COPY 强制文本格式")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--out", default=None)
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    binary = False if args.text else None
+    results = []
+    setup()
+    try:
+        for n in args.n:
+            for kind, table, columns, rows in (
+                ("chunks", CHUNK_TABLE, CHUNK_COLUMNS, chunk_rows(rng, n)),
+                ("questions", QUES_TABLE, QUES_COLUMNS, ques_rows(rng, n, args.dim)),
+            ):
+                truncate()
+                row_sec = per_row(table, columns, rows) if n <= args.per_row_max else None
+                truncate()
+                copy_sec, fmt = copy(table, columns, rows, binary)
+                row = {
+                    "kind": kind,
+                    "n": n,
+                    "format": fmt,
+                    "per_row_sec": round(row_sec, 3) if row_sec is not None else None,
+                    "copy_sec": round(copy_sec, 3),
+                    "per_row_rows_per_sec": round(n / row_sec, 1) if row_sec else None,
+                    "copy_rows_per_sec": round(n / copy_sec, 1),
+                    "speedup": round(row_sec / copy_sec, 1) if row_sec else None,
+                }
+                results.append(row)
+                per_row_txt = f"{row['per_row_rows_per_sec']:>9.1f}" if row_sec else "     跳过"
+                print(f"{kind:<10} n={n:<6} 逐行 {per_row_txt} 行/s   COPY({fmt}) {row['copy_rows_per_sec']:>10.1f} 行/s   "
+                      f"加速 {row['speedup']}x")
+    finally:
+        teardown()
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
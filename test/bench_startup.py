@@ -0,0 +1,73 @@
+# test/bench_startup.py
+"""
+启动耗时 / RSS 对比：懒加载（当前行为） vs 立即加载模型（旧行为）
+
+每种场景在独立子进程中执行，互不影响：
+    - lazy  ：仅 import 模块（API 进程的真实情况）
+    - eager ：import 后立即加载并预热模型（等价于旧版 import 即加载）
+
+用法：
+    python test/bench_startup.py                      # 默认测 task.gen_vector_chain
+    python test/bench_startup.py --module app --module task.es_fun.search_engine
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from bench_common import ROOT
+
+_CHILD = r"""
+import json, sys, time
+sys.path.insert(0, {root!r})
+from bench_common import peak_rss_mb
+t0 = time.perf_counter()
+import importlib
+importlib.import_module({module!r})
+t_import = time.perf_counter() - t0
+if {eager!r}:
+    from task.gen_vector_chain import warmup
+    warmup()
+print(json.dumps({{
+    "module": {module!r},
+    "mode": "eager" if {eager!r} else "lazy",
+    "seconds": round(time.perf_counter() - t0, 3),
+    "import_seconds": round(t_import, 3),
+    "peak_rss_mb": round(peak_rss_mb(), 1),
+    "torch_loaded": "torch" in sys.modules,
+}}))
+"""
+
+
+def measure(module: str, eager: bool) -> dict:
+    code = _CHILD.format(root=ROOT, module=module, eager=eager)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([ROOT, os.path.join(ROOT, "test")]))
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--module", action="append", default=None)
+    ap.add_argument("--out", default=None, help="结果 JSON 输出路径")
+    args = ap.parse_args()
+
+    results = []
+    for module in args.module or ["task.gen_vector_chain"]:
+        for eager in (False, True):
+            r = measure(module, eager)
+            results.append(r)
+            print(f"{r['module']:<32} {r['mode']:<6} {r['seconds']:>8.2f}s  "
+                  f"RSS {r['peak_rss_mb']:>8.1f} MB  torch={r['torch_loaded']}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
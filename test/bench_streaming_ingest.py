@@ -0,0 +1,113 @@
+# test/bench_streaming_ingest.py
+"""
+大文件解析：整篇加载 + 整篇分段（LOADER_MAP / SPLITTER_MAP）vs 流式（ITER_LOADER_MAP + iter_split，按批消费）
+
+每种模式在独立子进程里跑，比较子进程峰值 RSS、总耗时、首批段落产出时间（流式模式下即首批可写入 / 可检索的时间）。
+只测解析与分段，不写 PG / ES。
+
+用法：
+    python test/bench_streaming_ingest.py --mb 50                 # 生成 50MB 的 txt
+    python test/bench_streaming_ingest.py --file ./big.pdf --batch 200
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_common import peak_rss_mb, synth_chunk
+
+
+def make_txt(path: str, mb: int, seed: int):
+    rng = random.Random(seed)
+    target = mb * 1024 * 1024
+    size = 0
+    with open(path, "w", encoding="utf-8") as f:
+        while size < target:
+            para = synth_chunk(rng, target_chars=800) + "\n\n"
+            f.write(para)
+            size += len(para.encode("utf-8"))
+
+
+def run_child(mode: str, path: str, batch: int):
+    from task.splitter_loader import ITER_LOADER_MAP, LOADER_MAP, SPLITTER_MAP, iter_split
+
+    ext = os.path.splitext(path)[1].lower().strip(".")
+    t0 = time.perf_counter()
+    first_batch = None
+    total = 0
+    if mode == "full":
+        chunks = SPLITTER_MAP[ext](LOADER_MAP[ext](path))
+        first_batch = time.perf_counter() - t0
+        total = len(chunks)
+    else:
+        pending = 0
+        for _ in iter_split(ext, ITER_LOADER_MAP[ext](path)):
+            pending += 1
+            if pending >= batch:
+                total += pending
+                pending = 0
+                if first_batch is None:
+                    first_batch = time.perf_counter() - t0
+        total += pending
+        if first_batch is None:
+            first_batch = time.perf_counter() - t0
+    print(json.dumps({
+        "mode": mode,
+        "chunks": total,
+        "total_sec": round(time.perf_counter() - t0, 3),
+        "first_batch_sec": round(first_batch, 3),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--file", default=None, help="待解析文件（不填则生成 txt）")
+    ap.add_argument("--mb", type=int, default=50, help="生成 txt 的大小（MB）")
+    ap.add_argument("--batch", type=int, default=200, help="流式模式每批段落数（对应 stream_batch_chunks）")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--out", default=None)
+    ap.add_argument("--child", choices=["full", "stream"], default=None, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        run_child(args.child, args.file, args.batch)
+        return
+
+    tmp = None
+    path = args.file
+    if not path:
+        fd, tmp = tempfile.mkstemp(suffix=".txt")
+        os.close(fd)
+        make_txt(tmp, args.mb, args.seed)
+        path = tmp
+
+    results = []
+    try:
+        print(f"文件：{path}（{os.path.getsize(path) / 1024 / 1024:.1f} MB）")
+        for mode in ("full", "stream"):
+            out = subprocess.run(
+                [sys.executable, __file__, "--child", mode, "--file", path, "--batch", str(args.batch)],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            row = json.loads(out.strip().splitlines()[-1])
+            results.append(row)
+            print(f"{mode:<7} 段落 {row['chunks']:>8}   总耗时 {row['total_sec']:>8.2f}s   "
+                  f"首批 {row['first_batch_sec']:>8.2f}s   峰值 RSS {row['peak_rss_mb']:>8.1f} MB")
+    finally:
+        if tmp:
+            os.remove(tmp)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
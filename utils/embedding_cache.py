@@ -0,0 +1,212 @@
+# utils/embedding_cache.py
+"""
+共享向量缓存（内容寻址 + 模型版本）：
+- key = emb:{model_id}:{sha1(规范化文本)}，规范化包括 NFKC、去首尾空白、合并连续空白、转小写
+  → 空白/大小写差异命中同一条缓存；更换模型（model_id 变化）自然失效
+- value 为打包后的 float32 / float16 字节串（1024 维 float32 = 4KB，远小于 JSON）
+- 两级淘汰：进程内 LRU（容量 local_size）+ Redis 滑动 TTL（命中即续期，长期不用的自动过期）
+- 命中/未命中计数：进程内计数 + Redis 哈希 emb:stats:{model_id}（多进程汇总）
+- 同时提供同步（Celery worker）与异步（API 协程）两套读写接口
+"""
+import hashlib
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import List, Optional, Sequence
+
+import numpy as np
+from redis import Redis
+import redis.asyncio as aioredis
+
+from config.settings import settings, VectorConfig
+
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text or "")
+    return _WS_RE.sub(" ", text).strip().lower()
+
+
+def embedding_model_id(cfg: VectorConfig) -> str:
+    """模型身份标识：优先使用配置的 model_id，否则取模型目录名（非 torch 后端追加后端标记）"""
+    if cfg.model_id:
+        return cfg.model_id
+    model_id = os.path.basename(os.path.normpath(cfg.model_path))
+    if cfg.backend == "onnx":
+        model_id += "@onnx-int8" if cfg.onnx_quantize else "@onnx"
+    return model_id
+
+
+class EmbeddingCache:
+    def __init__(
+        self,
+        redis_url: str,
+        model_id: str,
+        ttl: int = 7 * 86400,
+        dtype: str = "float32",
+        local_size: int = 10000,
+    ):
+        self.model_id = model_id
+        self.ttl = ttl
+        self.dtype = np.dtype("<f2" if dtype == "float16" else "<f4")
+        self.local_size = local_size
+        self._redis_url = redis_url
+        self._sync: Optional[Redis] = None
+        self._async: Optional[aioredis.Redis] = None
+
+        self._local: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # ===================== key / 编解码 =====================
+
+    def key(self, text: str) -> str:
+        digest = hashlib.sha1(normalize_text(text).encode("utf-8")).hexdigest()
+        return f"emb:{self.model_id}:{digest}"
+
+    @property
+    def stats_key(self) -> str:
+        return f"emb:stats:{self.model_id}"
+
+    def pack(self, vec) -> bytes:
+        return np.asarray(vec, dtype=self.dtype).tobytes()
+
+    def unpack(self, raw: bytes) -> list:
+        return np.frombuffer(raw, dtype=self.dtype).astype(np.float32).tolist()
+
+    # ===================== 进程内 LRU =====================
+
+    def _local_get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            raw = self._local.get(key)
+            if raw is not None:
+                self._local.move_to_end(key)
+            return raw
+
+    def _local_put(self, key: str, raw: bytes):
+        if self.local_size <= 0:
+            return
+        with self._lock:
+            self._local[key] = raw
+            self._local.move_to_end(key)
+            while len(self._local) > self.local_size:
+                self._local.popitem(last=False)
+
+    def _count(self, hits: int, misses: int):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "model_id": self.model_id,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "local_entries": len(self._local),
+        }
+
+    # ===================== 同步接口（worker） =====================
+
+    @property
+    def sync_client(self) -> Redis:
+        if self._sync is None:
+            self._sync = Redis.from_url(self._redis_url)
+        return self._sync
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[list]]:
+        keys = [self.key(t) for t in texts]
+        raws = [self._local_get(k) for k in keys]
+        remote = [i for i, r in enumerate(raws) if r is None]
+
+        if remote:
+            pipe = self.sync_client.pipeline(transaction=False)
+            for i in remote:
+                pipe.getex(keys[i], ex=self.ttl)
+            for i, raw in zip(remote, pipe.execute()):
+                if raw:
+                    raws[i] = raw
+                    self._local_put(keys[i], raw)
+
+        hits = sum(1 for r in raws if r is not None)
+        self._count(hits, len(raws) - hits)
+        pipe = self.sync_client.pipeline(transaction=False)
+        pipe.hincrby(self.stats_key, "hits", hits)
+        pipe.hincrby(self.stats_key, "misses", len(raws) - hits)
+        pipe.execute()
+
+        return [self.unpack(r) if r is not None else None for r in raws]
+
+    def set_many(self, texts: Sequence[str], vectors: Sequence):
+        if not texts:
+            return
+        pipe = self.sync_client.pipeline(transaction=False)
+        for text, vec in zip(texts, vectors):
+            k, raw = self.key(text), self.pack(vec)
+            self._local_put(k, raw)
+            pipe.set(k, raw, ex=self.ttl)
+        pipe.execute()
+
+    # ===================== 异步接口（API） =====================
+
+    @property
+    def async_client(self) -> aioredis.Redis:
+        if self._async is None:
+            self._async = aioredis.Redis.from_url(self._redis_url)
+        return self._async
+
+    async def aget_many(self, texts: Sequence[str]) -> List[Optional[list]]:
+        keys = [self.key(t) for t in texts]
+        raws = [self._local_get(k) for k in keys]
+        remote = [i for i, r in enumerate(raws) if r is None]
+
+        if remote:
+            pipe = self.async_client.pipeline(transaction=False)
+            for i in remote:
+                pipe.getex(keys[i], ex=self.ttl)
+            for i, raw in zip(remote, await pipe.execute()):
+                if raw:
+                    raws[i] = raw
+                    self._local_put(keys[i], raw)
+
+        hits = sum(1 for r in raws if r is not None)
+        self._count(hits, len(raws) - hits)
+        pipe = self.async_client.pipeline(transaction=False)
+        pipe.hincrby(self.stats_key, "hits", hits)
+        pipe.hincrby(self.stats_key, "misses", len(raws) - hits)
+        await pipe.execute()
+
+        return [self.unpack(r) if r is not None else None for r in raws]
+
+    async def aset_many(self, texts: Sequence[str], vectors: Sequence):
+        if not texts:
+            return
+        pipe = self.async_client.pipeline(transaction=False)
+        for text, vec in zip(texts, vectors):
+            k, raw = self.key(text), self.pack(vec)
+            self._local_put(k, raw)
+            pipe.set(k, raw, ex=self.ttl)
+        await pipe.execute()
+
+
+_cache: Optional[EmbeddingCache] = None
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """进程级单例"""
+    global _cache
+    if _cache is None:
+        cfg = settings.vector_service
+        _cache = EmbeddingCache(
+            redis_url=cfg.redis_backend,
+            model_id=embedding_model_id(cfg),
+            ttl=cfg.embed_cache_ttl,
+            dtype=cfg.embed_cache_dtype,
+            local_size=cfg.embed_cache_local_size,
+        )
+    return _cache
@@ -40,7 +40,9 @@ def build_chunk_doc(
     zhisk_file_id: str,
     content: str,
     uu_id: str,
-    create_by: str = None
+    create_by: str = None,
+    file_type: str = None,
+    create_time: str = None,
 ) -> dict:
     """
     构造段落写入 ES 的文档结构（符合 zhisk_results mapping）
@@ -49,23 +51,37 @@ def build_chunk_doc(
     :param content: 段落文本
     :param uu_id: 段落唯一 ID（由外部生成）
     :param create_by: 创建人 ID，可选
+    :param file_type: 文件类型（冗余自文件元信息，用于检索过滤），可选
+    :param create_time: 创建时间，默认当前时间；由调用方传入时与该段落下的问题文档保持一致
     :return: 用于 ES 写入的文档 dict
     """
     doc = {
         "zhisk_file_id": zhisk_file_id,
         "uu_id": uu_id,
         "content": content,
-        "create_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        "create_time": create_time or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     }
     if create_by:
         doc["create_by"] = create_by
+    if file_type:
+        doc["file_type"] = file_type
     return doc
 
 
+def question_id(ori_sent_id: str, ori_ques_sent: str) -> str:
+    """问题文档 ID：由 (段落 ID, 问题文本) 确定性生成，任务重试时重复写入会覆盖而不是新增"""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{ori_sent_id}\n{ori_ques_sent}"))
+
+
 def build_question_vector_doc(
     ori_sent_id: str,
     ori_ques_sent: str,
-    vector: list
+    vector: list,
+    zhisk_file_id: str = None,
+    create_by: str = None,
+    file_type: str = None,
+    create_time: str = None,
+    q_id: str = None
 ) -> dict:
     """
     构造符合 wmx_ques mapping 的 ES 问题向量文档结构
@@ -73,11 +89,22 @@ def build_question_vector_doc(
     :param ori_sent_id: 原始段落 ID，用于反查
     :param ori_ques_sent: 原始生成的问题文本
     :param vector: 问题向量（长度应为 1024）
+    :param zhisk_file_id / create_by / file_type / create_time: 冗余自所属段落与文件，
+           供 knn 的 filter 使用（knn 只能过滤问题文档自身的字段）
+    :param q_id: 文档 ID，不传时按 question_id(ori_sent_id, ori_ques_sent) 生成
     :return: 可用于 insert_question_vector_to_es 的 dict
     """
-    return {
-        "id": str(uuid.uuid4()),
+    doc = {
+        "id": q_id or question_id(ori_sent_id, ori_ques_sent),
         "ori_sent_id": ori_sent_id,
         "ori_ques_sent": ori_ques_sent,
         "ques_vector": vector
-    }
\ No newline at end of file
+    }
+    if zhisk_file_id:
+        doc["zhisk_file_id"] = zhisk_file_id
+    if create_by:
+        doc["create_by"] = create_by
+    if file_type:
+        doc["file_type"] = file_type
+    doc["create_time"] = create_time or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return doc
\ No newline at end of file
@@ -0,0 +1,167 @@
+# utils/metrics.py
+"""
+检索链路的 Prometheus 指标
+
+- search_stage_seconds{stage}：各阶段耗时（embed_wait / msearch / bm25 / knn / mget / fusion / rerank / serialization），
+  msearch 模式下 bm25 / knn 取子响应里 ES 自报的 took（服务端耗时），split 模式下为客户端实测
+- search_cache_lookups_total{cache, result}：结果缓存 / 向量缓存 / 重排缓存的命中与未命中次数，命中率在 PromQL 里算
+- search_es_errors_total{op}：ES 调用失败次数（含 msearch 单个子查询失败）
+- search_in_flight_requests{endpoint}：正在处理的检索请求数
+
+单次请求的分阶段耗时另外记在 contextvar 里（start_timings 开启），可通过响应头 X-Stage-Timings 返回，便于线上排查慢查询。
+
+多进程部署（gunicorn / uvicorn --workers）时设置环境变量 PROMETHEUS_MULTIPROC_DIR 指向一个每次启动前清空的目录，
+/metrics 会聚合所有 worker 的数据；未设置时只导出当前进程。
+Celery worker 的指标（PG 连接池等）在设置 WORKER_METRICS_PORT 时由 worker 主进程在该端口导出。
+"""
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+
+_STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+STAGE_SECONDS = Histogram(
+    "search_stage_seconds",
+    "检索各阶段耗时（秒）",
+    ["stage"],
+    buckets=_STAGE_BUCKETS,
+)
+REQUEST_SECONDS = Histogram(
+    "search_request_seconds",
+    "检索请求总耗时（秒）",
+    ["endpoint"],
+    buckets=_STAGE_BUCKETS,
+)
+CACHE_LOOKUPS = Counter(
+    "search_cache_lookups_total",
+    "检索相关缓存的查找次数",
+    ["cache", "result"],
+)
+ES_ERRORS = Counter(
+    "search_es_errors_total",
+    "ES 调用失败次数",
+    ["op"],
+)
+IN_FLIGHT = Gauge(
+    "search_in_flight_requests",
+    "正在处理的检索请求数",
+    ["endpoint"],
+    multiprocess_mode="livesum",
+)
+
+# Celery worker 的 PG 连接池（task/pg_fun/pg_pool.py）
+PG_POOL_WAIT_SECONDS = Histogram(
+    "pg_pool_wait_seconds",
+    "从连接池借出连接的等待时间（秒）",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0),
+)
+PG_POOL_CHECKOUTS = Counter(
+    "pg_pool_checkouts_total",
+    "连接池借出次数（result: ok / timeout / reconnect）",
+    ["result"],
+)
+PG_POOL_IN_USE = Gauge(
+    "pg_pool_connections_in_use",
+    "已借出的连接数",
+    multiprocess_mode="livesum",
+)
+
+# 当前请求的分阶段耗时（毫秒）；None 表示未开启
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("search_stage_timings", default=None)
+
+
+def start_timings() -> Dict[str, float]:
+    """
+    为当前请求开启分阶段耗时记录；须在 handler 里、派生子任务之前调用。
+    asyncio.gather / to_thread 复制的是同一个 dict 引用，子任务里记录的阶段也会汇总到这里。
+    """
+    timings: Dict[str, float] = {}
+    _timings.set(timings)
+    return timings
+
+
+def record_stage(stage: str, seconds: float):
+    STAGE_SECONDS.labels(stage).observe(seconds)
+    timings = _timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds * 1000
+
+
+@contextmanager
+def stage(name: str):
+    """记录一个阶段的耗时（sync / async 代码里都可直接 with）"""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - t0)
+
+
+@contextmanager
+def es_call(op: str):
+    """ES 调用：记录耗时，异常时累加错误计数后原样抛出"""
+    t0 = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        ES_ERRORS.labels(op).inc()
+        raise
+    finally:
+        record_stage(op, time.perf_counter() - t0)
+
+
+def record_cache(cache: str, hits: int = 0, misses: int = 0):
+    if hits:
+        CACHE_LOOKUPS.labels(cache, "hit").inc(hits)
+    if misses:
+        CACHE_LOOKUPS.labels(cache, "miss").inc(misses)
+
+
+def format_timings(timings: Dict[str, float]) -> str:
+    """X-Stage-Timings 响应头：embed_wait=12.3, msearch=41.0, ...（毫秒）"""
+    return ", ".join(f"{k}={v:.1f}" for k, v in timings.items())
+
+
+def _registry():
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def render_metrics():
+    """返回 (body, content_type)；多进程模式下聚合 PROMETHEUS_MULTIPROC_DIR 里所有进程的数据"""
+    return generate_latest(_registry()), CONTENT_TYPE_LATEST
+
+
+def start_metrics_server(port: int):
+    """
+    Celery worker 没有 HTTP 服务，单独起一个导出端口（在 worker 主进程里调用一次）；
+    prefork 子进程的指标需要 PROMETHEUS_MULTIPROC_DIR 才能汇总到这里
+    """
+    from prometheus_client import start_http_server
+
+    start_http_server(port, registry=_registry())
+
+
+def mark_process_dead(pid: int):
+    """多进程模式下进程退出时清理 livesum 类 gauge 的残留值"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,184 @@
+# utils/search_cache.py
+"""
+/es_hybrid_search 结果缓存（按索引代际版本失效）
+
+- key = hsr:{gen}:{fingerprint}，fingerprint = sha1(规范化查询 + 检索参数)，gen 为 Redis 中的索引代际计数 search:index_gen
+- 所有写路径（文件解析入库、问题向量写入、chunk / 问题更新、删除接口）在写入生效后递增 gen，
+  之后的查询自然落到新 key 上，旧结果不会再被读到
+- 查询开始前读取 gen，结果写回该 gen 对应的 key：若检索期间发生写入，结果只会写到已过期的旧 gen 下
+- API 写路径在递增前等待 ES refresh（refresh=wait_for / True），保证新 gen 下算出的结果已包含本次变更
+- 入库的高频写入（每批问题向量、流式解析的每批段落）不等待 refresh，走 request_index_generation_bump：
+  写入只登记一次延迟递增（search.gen_bump_interval_sec 后执行，窗口内的写入合并为一次），
+  执行时若最近 gen_bump_min_delay_sec 内仍有写入（可能尚未 refresh），再补一次延迟递增，直到写入停止；
+  因此每次写入之后、且已过 refresh 间隔，必有一次递增，避免入库期间结果缓存持续失效又不会长期读到旧结果
+
+- 缓存值为 {"depth": 召回深度, "results": 融合后的完整列表}，翻页直接切片；
+  cursor 为 base64(fingerprint + offset)，只能用于同一组查询参数
+
+同步接口供 Celery worker 使用，异步接口供 API 使用。
+"""
+import base64
+import binascii
+import hashlib
+import json
+import math
+import time
+from typing import Optional
+
+from redis import Redis
+import redis.asyncio as aioredis
+
+from config.settings import settings
+from utils.embedding_cache import normalize_text
+from utils.logger_manager import get_logger
+
+logger = get_logger("search_cache")
+
+GEN_KEY = "search:index_gen"
+BUMP_PENDING_KEY = "search:index_gen_bump_pending"
+BUMP_LAST_WRITE_KEY = "search:index_gen_last_write"
+
+_sync_client: Optional[Redis] = None
+_async_client: Optional[aioredis.Redis] = None
+
+
+def _sync() -> Redis:
+    global _sync_client
+    if _sync_client is None:
+        _sync_client = Redis.from_url(settings.vector_service.redis_backend)
+    return _sync_client
+
+
+def _async() -> aioredis.Redis:
+    global _async_client
+    if _async_client is None:
+        _async_client = aioredis.Redis.from_url(settings.vector_service.redis_backend)
+    return _async_client
+
+
+# ===================== 代际计数 =====================
+
+def bump_index_generation(reason: str = "") -> int:
+    """写路径（worker 端）调用：索引内容已变化"""
+    try:
+        gen = _sync().incr(GEN_KEY)
+        logger.debug(f"index generation -> {gen} ({reason})")
+        return gen
+    except Exception as e:
+        # 缓存失效失败不能影响写入本身，但要留痕
+        logger.error(f"index generation 递增失败（{reason}）: {e}")
+        return -1
+
+
+def _bump_delay() -> float:
+    cfg = settings.search
+    return max(cfg.gen_bump_interval_sec, cfg.gen_bump_min_delay_sec)
+
+
+def _register_pending(client, delay: float) -> Optional[float]:
+    # 登记 TTL 留足余量：延迟任务排队时登记不应提前过期（过期只会导致多递增一次）
+    if client.set(BUMP_PENDING_KEY, 1, nx=True, ex=max(int(math.ceil(delay)) * 4, 10)):
+        return delay
+    return None
+
+
+def request_index_generation_bump(reason: str = "") -> Optional[float]:
+    """
+    写入后的延迟递增（worker 端高频写入用）：记录最近写入时间，并登记一次延迟递增；
+    返回延迟秒数，由调用方安排执行 flush_pending_generation_bump；已有待执行的登记时返回 None（由它覆盖本次写入）
+    """
+    delay = _bump_delay()
+    try:
+        client = _sync()
+        client.set(BUMP_LAST_WRITE_KEY, time.time(), ex=max(int(math.ceil(delay)) * 4, 10))
+        return _register_pending(client, delay)
+    except Exception as e:
+        logger.error(f"index generation 延迟递增登记失败，直接递增（{reason}）: {e}")
+        bump_index_generation(reason)
+        return None
+
+
+def flush_pending_generation_bump(reason: str = "") -> Optional[float]:
+    """
+    执行登记过的延迟递增：先清登记再递增；
+    若最近 gen_bump_min_delay_sec 内还有写入（可能尚未 refresh，本次递增后算出的结果仍可能缺它），
+    再登记一次，返回延迟秒数由调用方重新安排；否则返回 None
+    """
+    min_delay = settings.search.gen_bump_min_delay_sec
+    try:
+        client = _sync()
+        client.delete(BUMP_PENDING_KEY)
+        bump_index_generation(reason)
+        last = client.get(BUMP_LAST_WRITE_KEY)
+        if last and time.time() - float(last) < min_delay:
+            return _register_pending(client, min_delay)
+        return None
+    except Exception as e:
+        logger.error(f"延迟递增执行失败（{reason}）: {e}")
+        bump_index_generation(reason)
+        return None
+
+
+async def abump_index_generation(reason: str = "") -> int:
+    """写路径（API 端）调用"""
+    try:
+        gen = await _async().incr(GEN_KEY)
+        logger.debug(f"index generation -> {gen} ({reason})")
+        return gen
+    except Exception as e:
+        logger.error(f"index generation 递增失败（{reason}）: {e}")
+        return -1
+
+
+async def get_index_generation() -> int:
+    raw = await _async().get(GEN_KEY)
+    return int(raw) if raw else 0
+
+
+# ===================== 结果缓存 =====================
+
+def query_fingerprint(query: str, **params) -> str:
+    """规范化查询 + 影响结果的检索参数（不含分页参数）"""
+    payload = json.dumps({"q": normalize_text(query), **params}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def result_cache_key(gen: int, fingerprint: str) -> str:
+    return f"hsr:{gen}:{fingerprint}"
+
+
+async def get_cached_results(key: str) -> Optional[dict]:
+    """返回 {"depth": int, "results": list}；未命中返回 None"""
+    raw = await _async().get(key)
+    return json.loads(raw) if raw else None
+
+
+async def set_cached_results(key: str, results: list, depth: int):
+    payload = json.dumps({"depth": depth, "results": results}, ensure_ascii=False)
+    await _async().set(key, payload, ex=settings.search.result_cache_ttl)
+
+
+def covers(entry: Optional[dict], end: int) -> bool:
+    """缓存的融合列表能否直接切出 [.., end)：深度足够，或结果本身已不足深度（没有更多了）"""
+    if not entry:
+        return False
+    return entry["depth"] >= end or len(entry["results"]) < entry["depth"]
+
+
+# ===================== 分页游标 =====================
+
+def encode_cursor(fingerprint: str, offset: int) -> str:
+    raw = json.dumps({"f": fingerprint, "o": offset}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str, fingerprint: str) -> int:
+    """解析游标得到 offset；游标损坏或与当前查询参数不匹配时抛 ValueError"""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        offset = int(data["o"])
+    except (binascii.Error, ValueError, KeyError, TypeError, UnicodeError) as e:
+        raise ValueError(f"无效的 cursor: {e}")
+    if data.get("f") != fingerprint or offset < 0:
+        raise ValueError("cursor 与当前查询参数不匹配")
+    return offset
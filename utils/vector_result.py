@@ -0,0 +1,71 @@
+# utils/vector_result.py
+"""
+向量任务结果投递（推送式，替代轮询）：
+- worker 端：结果写入 vec_result:{task_id}（供老的轮询方读取），同时 RPUSH 到 vec_notify:{task_id}
+- 等待端：先 GET 一次（结果可能已就绪），否则 BLPOP 阻塞等待，worker 一写入即被唤醒
+- BLPOP 会消费掉通知，取到后再原样推回，保证同一 task 的多个等待方都能被唤醒
+"""
+import json
+from typing import Optional
+
+import redis.asyncio as aioredis
+from config.settings import settings
+
+RESULT_TTL = 3600
+
+_async_client = None
+
+
+def result_key(task_id: str) -> str:
+    return f"vec_result:{task_id}"
+
+
+def notify_key(task_id: str) -> str:
+    return f"vec_notify:{task_id}"
+
+
+def publish_vector_result(client, task_id: str, vec, ttl: int = RESULT_TTL):
+    """worker 端：写入结果并唤醒等待方（同步 Redis 客户端）"""
+    payload = json.dumps(vec)
+    pipe = client.pipeline()
+    pipe.set(result_key(task_id), payload, ex=ttl)
+    pipe.rpush(notify_key(task_id), payload)
+    pipe.expire(notify_key(task_id), ttl)
+    pipe.execute()
+
+
+def get_async_result_client() -> aioredis.Redis:
+    global _async_client
+    if _async_client is None:
+        _async_client = aioredis.Redis.from_url(settings.vector_service.redis_backend)
+    return _async_client
+
+
+async def wait_vector_result(task_id: str, timeout: float = 5.0) -> Optional[list]:
+    """
+    等待端：异步阻塞等待向量结果，不占用事件循环
+
+    :param task_id: encode_text_task 的任务 ID
+    :param timeout: 最长等待秒数；<= 0 时只查一次不等待（BLPOP 的 timeout=0 表示永久阻塞，不能直接透传）
+    :return: 向量；超时返回 None
+    """
+    client = get_async_result_client()
+
+    raw = await client.get(result_key(task_id))
+    if raw:
+        return json.loads(raw)
+    if timeout <= 0:
+        return None
+
+    item = await client.blpop([notify_key(task_id)], timeout=timeout)
+    if item is None:
+        # 兜底：通知可能已被其他等待方取走又未推回
+        raw = await client.get(result_key(task_id))
+        return json.loads(raw) if raw else None
+
+    _, raw = item
+    pipe = client.pipeline()
+    pipe.rpush(notify_key(task_id), raw)
+    pipe.expire(notify_key(task_id), RESULT_TTL)
+    await pipe.execute()
+    return json.loads(raw)